@@ -4,4 +4,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Talentum.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up: the stream touches models.
+from apps.companies.streams import STREAM_PATH, review_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Long-lived streams bypass Django's request cycle, so an idle
+    # connection holds no thread or middleware state.
+    if scope["type"] == "http" and scope["path"] == STREAM_PATH:
+        await review_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -1,6 +1,6 @@
 from pathlib import Path
 
-from decouple import config
+from decouple import Csv, config
 
 import os
 
@@ -28,12 +28,18 @@ INSTALLED_APPS = [
     "rest_framework_simplejwt.token_blacklist",
     "corsheaders",
     # Local apps
+    "apps.core",
     "apps.accounts",
     "apps.companies",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "apps.companies.sharding.ShardMiddleware",
+    "apps.core.metrics.MetricsMiddleware",
+    "apps.core.profiling.RequestProfilingMiddleware",
+    "apps.core.nplusone.NPlusOneMiddleware",
+    "apps.core.throttling.ConcurrencyReleaseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -41,6 +47,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "apps.core.sqlite.SQLiteWriteGateMiddleware",
 ]
 
 ROOT_URLCONF = "Talentum.urls"
@@ -61,6 +68,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "Talentum.wsgi.application"
+ASGI_APPLICATION = "Talentum.asgi.application"
 
 
 # Database Configuration
@@ -70,6 +78,9 @@ DB_USER = config("DB_USER", default=None)
 DB_PASSWORD = config("DB_PASSWORD", default=None)
 DB_HOST = config("DB_HOST", default=None)
 DB_PORT = config("DB_PORT", default="5432")
+# Single-node SQLite tuning for high write concurrency, see SQLITE below.
+# Opt-in: it serializes writes per worker process.
+SQLITE_PROFILE = config("SQLITE_PROFILE", default=False, cast=bool)
 
 if all([DB_NAME, DB_USER, DB_PASSWORD, DB_HOST]):
     DATABASES = {
@@ -86,10 +97,30 @@ else:
     DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
-            "NAME": BASE_DIR / "db.sqlite3",
+            "NAME": config("SQLITE_PATH", default=str(BASE_DIR / "db.sqlite3")),
+            # Take the write lock when a transaction starts: a deferred
+            # transaction that later writes fails at once with "database is
+            # locked" instead of waiting out the busy timeout.
+            "OPTIONS": {"transaction_mode": "IMMEDIATE"} if SQLITE_PROFILE else {},
+            "CONN_MAX_AGE": config("SQLITE_CONN_MAX_AGE", default=600, cast=int)
+            if SQLITE_PROFILE
+            else 0,
         }
     }
 
+# Company shards: extra databases, each holding the companies mapped to it
+# (see SHARDING below), configured like the default one
+SHARDS = config("SHARDS", default="", cast=Csv())
+for alias in SHARDS:
+    if DATABASES["default"]["ENGINE"].endswith("postgresql"):
+        name = f"{DB_NAME}_{alias}"
+    else:
+        default_path = Path(DATABASES["default"]["NAME"])
+        name = str(default_path.with_name(f"{default_path.stem}-{alias}{default_path.suffix}"))
+    DATABASES[alias] = {**DATABASES["default"], "NAME": name}
+if SHARDS:
+    DATABASE_ROUTERS = ["apps.companies.sharding.ShardRouter"]
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -110,12 +141,26 @@ AUTH_PASSWORD_VALIDATORS = [
 # REST Framework Configuration
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "apps.accounts.authentication.JWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
     "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
+    "EXCEPTION_HANDLER": "apps.companies.views.exception_handler",
+    "DEFAULT_THROTTLE_CLASSES": (
+        "apps.core.throttling.RateThrottle",
+        "apps.core.throttling.ConcurrencyThrottle",
+    ),
+    # Per throttle_scope; "search" applies whenever ?search= is used
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "100/min",
+        "user": "1000/min",
+        "detail": "2000/min",
+        "search": "60/min",
+        "auth": "20/min",
+        "batch": "120/min",
+    },
 }
 
 LANGUAGE_CODE = "en-us"
@@ -140,6 +185,126 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
 }
 
+# Request profiling (sampled Server-Timing and slow request capture)
+PROFILING = {
+    "SAMPLE_RATE": config("PROFILING_SAMPLE_RATE", default=0.01, cast=float),
+    "SLOW_REQUEST_MS": config("PROFILING_SLOW_REQUEST_MS", default=500, cast=int),
+    "TOP_N": 20,
+    "MAX_LOGGED_QUERIES": 20,
+}
+
+# Prometheus metrics, aggregated across worker processes through DIRECTORY
+METRICS = {
+    # Shared by the worker processes of one host, e.g. /tmp/talentum-metrics;
+    # unset, /metrics reports the serving process only.
+    "DIRECTORY": config("METRICS_DIR", default=None),
+    "FLUSH_INTERVAL": config("METRICS_FLUSH_INTERVAL", default=5.0, cast=float),
+    "TOKEN": config("METRICS_TOKEN", default=None),
+}
+
+# N+1 query detection: "off", "log" (sampled, for staging) or "raise" (tests)
+NPLUSONE = {
+    "MODE": config("NPLUSONE_MODE", default="off"),
+    "THRESHOLD": config("NPLUSONE_THRESHOLD", default=5, cast=int),
+    "SAMPLE_RATE": config("NPLUSONE_SAMPLE_RATE", default=0.05, cast=float),
+    "REPORT_FILE": os.path.join(BASE_DIR, "logs", "nplusone.jsonl"),
+}
+
+# Outbox delivery to downstream systems (python manage.py dispatch_outbox);
+# events are only logged until a webhook URL is configured
+OUTBOX_WEBHOOK_URL = config("OUTBOX_WEBHOOK_URL", default="")
+OUTBOX = {
+    "SINK": "apps.companies.outbox.WebhookSink"
+    if OUTBOX_WEBHOOK_URL
+    else "apps.companies.outbox.LoggingSink",
+    "SINK_OPTIONS": {
+        "url": OUTBOX_WEBHOOK_URL,
+        "secret": config("OUTBOX_WEBHOOK_SECRET", default=None),
+    }
+    if OUTBOX_WEBHOOK_URL
+    else {},
+    "BATCH_SIZE": config("OUTBOX_BATCH_SIZE", default=100, cast=int),
+    "RETENTION_DAYS": 7,
+}
+
+# Server-sent review stage changes, served by Talentum.asgi
+REVIEW_STREAM = {
+    "POLL_INTERVAL": config("REVIEW_STREAM_POLL_INTERVAL", default=1.0, cast=float),
+    "QUEUE_SIZE": 100,
+    "HEARTBEAT_INTERVAL": 20.0,
+    "MAX_BACKLOG": 500,
+}
+
+# /api/v1/batch/ limits
+BATCH = {
+    "MAX_REQUESTS": config("BATCH_MAX_REQUESTS", default=20, cast=int),
+    "MAX_SECONDS": config("BATCH_MAX_SECONDS", default=5.0, cast=float),
+}
+
+# Throttle counters must live in a cache shared by all workers (e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache) to be global
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default=""),
+    }
+}
+
+# Seconds a cached /employees/workspace/ response may live; signals
+# invalidate it sooner when the underlying rows change
+WORKSPACE_CACHE_TIMEOUT = 300
+
+# Incremental sync feeds (/<collection>/changes/): changes younger than
+# this are held back until writers that stamped them have committed
+CHANGE_FEED = {
+    "SETTLE_SECONDS": config("CHANGE_FEED_SETTLE_SECONDS", default=5, cast=int),
+    # python manage.py purge_tombstones drops older deletes; clients whose
+    # cursor is older must run a full sync
+    "TOMBSTONE_RETENTION_DAYS": config("TOMBSTONE_RETENTION_DAYS", default=30, cast=int),
+}
+
+# Seconds a cached /companies/<id>/dashboard/ response may live; signals
+# invalidate it sooner when the underlying rows change
+DASHBOARD_CACHE_TIMEOUT = 60
+
+# In-flight request caps per throttle scope
+THROTTLING = {
+    "CACHE": "default",
+    "CONCURRENCY": {"search": 2, "batch": 4},
+}
+
+# Background company/department deletion (python manage.py run_deletion_jobs)
+DELETION = {
+    "BATCH_SIZE": config("DELETION_BATCH_SIZE", default=1000, cast=int),
+}
+
+# Finished reviews older than the horizon move to the archive tier
+# (python manage.py archive_reviews)
+REVIEW_ARCHIVE = {
+    "HORIZON_DAYS": config("REVIEW_ARCHIVE_HORIZON_DAYS", default=730, cast=int),
+    "BATCH_SIZE": 1000,
+}
+
+# SQLite profile for single-node installs: pragmas applied to each new
+# connection, and unsafe requests serialized per worker process
+SQLITE = {
+    "ENABLED": SQLITE_PROFILE,
+    "MMAP_SIZE": config("SQLITE_MMAP_SIZE", default=256 * 1024 * 1024, cast=int),
+    "CACHE_SIZE": config("SQLITE_CACHE_SIZE", default=-64000, cast=int),
+    "BUSY_TIMEOUT_MS": config("SQLITE_BUSY_TIMEOUT_MS", default=5000, cast=int),
+    "WRITE_GATE": config("SQLITE_WRITE_GATE", default=True, cast=bool),
+}
+
+# Company sharding across DATABASES (python manage.py move_company)
+SHARDING = {
+    "SHARDS": SHARDS,
+    "DIRECTORY": "default",
+    "NEW_COMPANIES": config("SHARD_NEW_COMPANIES", default="default"),
+    "MAP_CACHE_TIMEOUT": config("SHARD_MAP_CACHE_TIMEOUT", default=30, cast=int),
+}
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
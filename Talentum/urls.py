@@ -1,8 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from apps.core.views import BatchView, metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path("api/v1/batch/", BatchView.as_view(), name="batch"),
     path("api/v1/", include("apps.accounts.urls")),
     path("api/v1/", include("apps.companies.urls")),
 ]
@@ -0,0 +1,114 @@
+from functools import cached_property
+
+from . import hierarchy
+from .models import Employee
+
+
+class AccessContext:
+    """
+    Role and organisational position of a user.
+
+    Resolved once per user object from the employee profile loaded at
+    authentication. scope() narrows a queryset to the rows the role may
+    see; list and detail views share it, so visibility is decided inside
+    the fetch query.
+    """
+
+    # Scope name -> (lookup restricting employees to their company,
+    #                lookup restricting managers to their department's subtree)
+    SCOPES = {
+        "departments": ("company_id", None),
+        "employees": ("company_id", "department_id"),
+        "projects": ("company_id", "department_id"),
+        "assignments": ("project__company_id", "project__department_id"),
+        "reviews": ("employee__company_id", "employee__department_id"),
+        "stage_transitions": ("company_id", "department_id"),
+        "stage_durations": ("company_id", "department_id"),
+    }
+
+    def __init__(self, user):
+        self.user_id = user.pk
+        self.role = getattr(user, "role", None)
+        try:
+            profile = user.employee_profile
+        except Employee.DoesNotExist:
+            profile = None
+        self.employee_id = profile.pk if profile else None
+        self.company_id = profile.company_id if profile else None
+        self.department_id = profile.department_id if profile else None
+
+    @property
+    def is_admin(self):
+        return self.role == "admin"
+
+    @property
+    def has_profile(self):
+        return self.employee_id is not None
+
+    def _by_role(self, queryset, company_lookup, department_lookup):
+        if not self.has_profile:
+            return queryset
+        if self.role == "employee" and company_lookup:
+            return queryset.filter(**{company_lookup: self.company_id})
+        if self.role == "manager" and department_lookup:
+            return queryset.filter(
+                **{f"{department_lookup}__in": hierarchy.subtree(self.department_id)}
+            )
+        return queryset
+
+    @cached_property
+    def subtree_ids(self):
+        """
+        Ids of the user's department and every department below it.
+        """
+        return frozenset(
+            hierarchy.subtree(self.department_id).values_list("descendant_id", flat=True)
+        )
+
+    def manages(self, department_id):
+        """
+        Whether ``department_id`` is the user's department or below it; the
+        subtree is only loaded for departments other than their own.
+        """
+        if department_id is None or self.department_id is None:
+            return False
+        return department_id == self.department_id or department_id in self.subtree_ids
+
+    def scope(self, name, queryset):
+        return self._by_role(queryset, *self.SCOPES[name])
+
+    def permits(self, name, company_id, department_id):
+        """
+        In-memory counterpart of scope() for a row known by its company and
+        department ids.
+        """
+        company_lookup, department_lookup = self.SCOPES[name]
+        if not self.has_profile:
+            return True
+        if self.role == "employee" and company_lookup:
+            return company_id == self.company_id
+        if self.role == "manager" and department_lookup:
+            return self.manages(department_id)
+        return True
+
+    def scope_tombstones(self, name, queryset):
+        """
+        Apply scope ``name`` to Tombstone rows, which store the ids directly.
+        """
+        company_lookup, department_lookup = self.SCOPES[name]
+        return self._by_role(
+            queryset,
+            "company_id" if company_lookup else None,
+            "department_id" if department_lookup else None,
+        )
+
+
+def get_access_context(user):
+    """
+    Return the user's AccessContext, building it on first use.
+    """
+    context = getattr(user, "_access_context", None)
+    if context is None or context.user_id != user.pk:
+        context = AccessContext(user)
+        user._access_context = context
+    return context
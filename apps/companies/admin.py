@@ -1,57 +1,198 @@
-from django.contrib import admin
-from .models import Company, Department, Employee, Project, PerformanceReview
+from django.contrib import admin, messages
+from django.db import router, transaction
+from django.db.models import F
+from django.http import HttpResponseRedirect
+from django.urls import reverse
+from django.utils import timezone
+from apps.core.cache import bump_versions
+from . import outbox, stage_history
+from .deletion import enqueue_deletion
+from .admin_filters import (
+    AutocompleteFilter,
+    AutocompleteFilterMediaMixin,
+    EstimatedCountPaginator,
+)
+from .models import (
+    ArchivedPerformanceReview,
+    Company,
+    DeletionJob,
+    Department,
+    Employee,
+    OutboxEvent,
+    PerformanceReview,
+    Project,
+    ProjectAssignment,
+)
+
+
+class LargeTableAdmin(AutocompleteFilterMediaMixin, admin.ModelAdmin):
+    """
+    Changelist defaults for tables too large to count or list exhaustively.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class BackgroundDeletionAdmin(LargeTableAdmin):
+    """
+    Hand deletions to a DeletionJob instead of collecting every dependent
+    row for the confirmation page and the cascade.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        opts = self.model._meta
+        to_delete = [
+            f"{opts.verbose_name.capitalize()}: {obj} and everything in it (deleted in the background)"
+            for obj in objs
+        ]
+        perms_needed = set() if self.has_delete_permission(request) else {opts.verbose_name}
+        return to_delete, {}, perms_needed, []
+
+    def delete_model(self, request, obj):
+        enqueue_deletion(obj, request.user)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            enqueue_deletion(obj, request.user)
+
+    def response_delete(self, request, obj_display, obj_id):
+        self.message_user(
+            request, f"“{obj_display}” is being deleted in the background.", messages.SUCCESS
+        )
+        opts = self.model._meta
+        return HttpResponseRedirect(
+            reverse(f"admin:{opts.app_label}_{opts.model_name}_changelist")
+        )
 
 
 @admin.register(Company)
-class CompanyAdmin(admin.ModelAdmin):
+class CompanyAdmin(BackgroundDeletionAdmin):
     list_display = ['name', 'number_of_departments', 'number_of_employees', 'number_of_projects', 'created_at']
     list_filter = ['created_at']
     search_fields = ['name']
     readonly_fields = ['number_of_departments', 'number_of_employees', 'number_of_projects', 'created_at', 'updated_at']
     ordering = ['name']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_counts()
+
 
 @admin.register(Department)
-class DepartmentAdmin(admin.ModelAdmin):
-    list_display = ['name', 'company', 'number_of_employees', 'number_of_projects', 'created_at']
-    list_filter = ['company', 'created_at']
+class DepartmentAdmin(BackgroundDeletionAdmin):
+    list_display = ['name', 'company', 'parent', 'number_of_employees', 'number_of_projects', 'created_at']
+    list_filter = [('company', AutocompleteFilter), 'created_at']
+    list_select_related = ['company', 'parent__company']
     search_fields = ['name', 'company__name']
     readonly_fields = ['number_of_employees', 'number_of_projects', 'created_at', 'updated_at']
     ordering = ['company__name', 'name']
+    autocomplete_fields = ['company', 'parent']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_counts()
 
 
 @admin.register(Employee)
-class EmployeeAdmin(admin.ModelAdmin):
+class EmployeeAdmin(LargeTableAdmin):
     list_display = ['name', 'email', 'company', 'department', 'designation', 'hired_on', 'days_employed', 'created_at']
-    list_filter = ['company', 'department', 'designation', 'hired_on', 'created_at']
+    # Designation is matched through search_fields instead of a sidebar of every distinct value.
+    list_filter = [('company', AutocompleteFilter), ('department', AutocompleteFilter), 'hired_on', 'created_at']
+    list_select_related = ['company', 'department__company']
     search_fields = ['name', 'email', 'designation']
     readonly_fields = ['days_employed', 'created_at', 'updated_at']
     ordering = ['company__name', 'department__name', 'name']
     raw_id_fields = ['user']
+    autocomplete_fields = ['company', 'department']
+
+
+class ProjectAssignmentInline(admin.TabularInline):
+    model = ProjectAssignment
+    fields = ['employee', 'allocation', 'start_date', 'end_date']
+    autocomplete_fields = ['employee']
+    extra = 0
 
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(LargeTableAdmin):
     list_display = ['name', 'company', 'department', 'start_date', 'end_date', 'assigned_employees_count', 'created_at']
-    list_filter = ['company', 'department', 'start_date', 'end_date', 'created_at']
+    list_filter = [('company', AutocompleteFilter), ('department', AutocompleteFilter), 'start_date', 'end_date', 'created_at']
+    list_select_related = ['company', 'department__company']
     search_fields = ['name', 'description', 'company__name', 'department__name']
     readonly_fields = ['assigned_employees_count', 'created_at', 'updated_at']
     ordering = ['company__name', 'department__name', 'start_date']
-    filter_horizontal = ['assigned_employees']
-    
+    autocomplete_fields = ['company', 'department']
+    inlines = [ProjectAssignmentInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_counts()
+
+    @admin.display(description='Assigned Employees', ordering='assigned_employees_count')
     def assigned_employees_count(self, obj):
-        return obj.assigned_employees.count()
-    assigned_employees_count.short_description = 'Assigned Employees'
+        return obj.assigned_employees_count
+
+
+def make_transition_action(stage, label):
+    """
+    Build an admin action moving the selected reviews to ``stage`` with one UPDATE.
+
+    Reviews whose current stage does not allow the transition are left unchanged.
+    """
+    @admin.action(description=f'Move selected reviews to "{label}"')
+    def transition(modeladmin, request, queryset):
+        using = router.db_for_write(PerformanceReview)
+        with transaction.atomic(using=using):
+            movable = queryset.filter(
+                stage__in=PerformanceReview.stages_transitioning_to(stage)
+            ).select_for_update(of=("self",))
+            rows = list(movable.values_list(
+                "pk", "stage", "stage_changed_at", "employee_id", "employee__company_id",
+                "employee__department_id", "reviewer_id",
+            ))
+            now = timezone.now()
+            updated = PerformanceReview.objects.filter(
+                pk__in=[row[0] for row in rows]
+            ).update(
+                stage=stage, stage_changed_at=now, updated_at=now, version=F("version") + 1
+            )
+            stage_history.record_transitions(
+                [
+                    (pk, company_id, department_id, from_stage, stage, entered_at)
+                    for pk, from_stage, entered_at, _, company_id, department_id, _ in rows
+                ],
+                transitioned_at=now,
+            )
+            OutboxEvent.objects.bulk_create(
+                outbox.review_stage_changed(
+                    pk, from_stage, stage, employee_id, company_id, department_id, reviewer_id
+                )
+                for pk, from_stage, _, employee_id, company_id, department_id, reviewer_id in rows
+            )
+        bump_versions(
+            {f"employee:{row[3]}" for row in rows} | {f"company-reviews:{row[4]}" for row in rows},
+            using,
+        )
+        modeladmin.message_user(
+            request,
+            f'Moved {updated} review(s) to "{label}". Reviews that cannot move to this stage were left unchanged.',
+        )
+
+    transition.__name__ = f'transition_to_{stage}'
+    return transition
 
 
 @admin.register(PerformanceReview)
-class PerformanceReviewAdmin(admin.ModelAdmin):
+class PerformanceReviewAdmin(LargeTableAdmin):
     list_display = ['employee', 'reviewer', 'stage', 'review_date', 'rating', 'created_at']
     list_filter = ['stage', 'rating', 'review_date', 'created_at']
+    list_select_related = ['employee', 'reviewer']
     search_fields = ['employee__name', 'reviewer__name', 'feedback', 'notes']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['stage_changed_at', 'created_at', 'updated_at']
     ordering = ['-created_at']
     raw_id_fields = ['employee', 'reviewer']
+    actions = [
+        make_transition_action(stage, label)
+        for stage, label in PerformanceReview.STAGE_CHOICES
+        if PerformanceReview.stages_transitioning_to(stage)
+    ]
     
     fieldsets = (
         ('Basic Information', {
@@ -61,7 +202,58 @@ class PerformanceReviewAdmin(admin.ModelAdmin):
             'fields': ('review_date', 'rating', 'feedback', 'notes')
         }),
         ('Timestamps', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('stage_changed_at', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(ArchivedPerformanceReview)
+class ArchivedPerformanceReviewAdmin(LargeTableAdmin):
+    list_display = ['id', 'employee', 'reviewer', 'stage', 'rating', 'created_at', 'archived_at']
+    list_filter = ['stage', 'created_at']
+    list_select_related = ['employee', 'reviewer']
+    search_fields = ['=id', 'employee__name']
+    ordering = ['-created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(LargeTableAdmin):
+    list_display = [
+        'id', 'event_type', 'aggregate_id', 'created_at', 'attempts', 'delivered_at',
+        'dead_lettered_at',
+    ]
+    list_filter = [
+        'event_type',
+        ('delivered_at', admin.EmptyFieldListFilter),
+        ('dead_lettered_at', admin.EmptyFieldListFilter),
+    ]
+    search_fields = ['=aggregate_id']
+    ordering = ['-id']
+    readonly_fields = [
+        'aggregate_type', 'aggregate_id', 'event_type', 'payload', 'created_at',
+        'attempts', 'next_attempt_at', 'delivered_at', 'dead_lettered_at', 'last_error',
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ['target_type', 'target_name', 'status', 'progress', 'requested_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'target_type']
+    list_select_related = ['requested_by']
+    readonly_fields = [
+        'target_type', 'target_id', 'target_name', 'company_id', 'requested_by', 'status',
+        'totals', 'deleted', 'last_error', 'created_at', 'started_at', 'heartbeat_at', 'finished_at',
+    ]
+
+    def has_add_permission(self, request):
+        return False
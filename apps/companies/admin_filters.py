@@ -0,0 +1,93 @@
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.urls import reverse
+from django.utils.functional import cached_property
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """
+    Related-field list filter rendered as an autocomplete select.
+
+    Unlike ``RelatedFieldListFilter`` it never loads every related row to
+    build the sidebar; options are fetched from the admin autocomplete view,
+    so the related ModelAdmin must define ``search_fields``.
+    """
+
+    template = "admin/companies/autocomplete_filter.html"
+
+    def field_choices(self, field, request, model_admin):
+        if not self.lookup_val:
+            return []
+        related_model = field.remote_field.model
+        return [
+            (obj.pk, str(obj))
+            for obj in related_model._default_manager.filter(pk__in=self.lookup_val)
+        ]
+
+    def has_output(self):
+        return True
+
+    @property
+    def selected(self):
+        return self.lookup_choices[0] if self.lookup_choices else None
+
+    @property
+    def ajax_url(self):
+        return reverse("admin:autocomplete")
+
+    @property
+    def app_label(self):
+        return self.field.model._meta.app_label
+
+    @property
+    def model_name(self):
+        return self.field.model._meta.model_name
+
+
+class AutocompleteFilterMediaMixin:
+    """
+    Add the assets ``AutocompleteFilter`` needs to the changelist.
+    """
+
+    class Media:
+        js = (
+            "admin/js/vendor/jquery/jquery.js",
+            "admin/js/vendor/select2/select2.full.js",
+            "admin/js/jquery.init.js",
+            "admin/js/autocomplete.js",
+            "companies/admin/autocomplete_filter.js",
+        )
+        css = {
+            "screen": (
+                "admin/css/vendor/select2/select2.css",
+                "admin/css/autocomplete.css",
+            )
+        }
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids COUNT(*) over whole tables.
+
+    For unfiltered changelists on PostgreSQL it uses the planner's row
+    estimate once the table is larger than ``exact_count_threshold``.
+    Filtered querysets and other databases are counted exactly.
+    """
+
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.exact_count_threshold:
+                return row[0]
+        return super().count
@@ -5,3 +5,11 @@ class CompaniesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.companies'
     verbose_name = 'Company Management'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .sharding import reserve_id_ranges
+
+        post_migrate.connect(reserve_id_ranges, sender=self, dispatch_uid="companies.id_ranges")
@@ -0,0 +1,124 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from apps.core.cache import bump_versions
+
+from .models import ArchivedPerformanceReview, Employee, PerformanceReview, Tombstone
+
+DEFAULT_REVIEW_ARCHIVE_SETTINGS = {
+    # Finished reviews created longer ago than this move to the archive.
+    "HORIZON_DAYS": 730,
+    "BATCH_SIZE": 1000,
+}
+
+
+def get_review_archive_settings():
+    return {**DEFAULT_REVIEW_ARCHIVE_SETTINGS, **getattr(settings, "REVIEW_ARCHIVE", {})}
+
+
+def archive_horizon(now=None):
+    """
+    Reviews created before this instant may be archived.
+    """
+    days = get_review_archive_settings()["HORIZON_DAYS"]
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def reaches_archive(stage=None, created_from=None, created_to=None):
+    """
+    Whether a review query with these filters can match archived rows.
+
+    Unbounded queries stay on the hot table; the archive is included once
+    a created_at bound is given and the range starts before the horizon.
+    """
+    if stage and stage not in ArchivedPerformanceReview.STAGES:
+        return False
+    if created_from is None and created_to is None:
+        return False
+    return created_from is None or created_from < archive_horizon()
+
+
+def ensure_partitions(connection, created_ats):
+    """
+    Create the yearly archive partitions for ``created_ats`` on PostgreSQL.
+    """
+    if connection.vendor != "postgresql":
+        return
+    table = ArchivedPerformanceReview._meta.db_table
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for year in sorted({created_at.year for created_at in created_ats}):
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {quote(f'{table}_{year}')} "
+                f"PARTITION OF {quote(table)} "
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+            )
+
+
+def archive_batch(horizon, batch_size):
+    """
+    Move up to ``batch_size`` finished reviews created before ``horizon``
+    to the archive in one transaction; returns the number moved.
+
+    The raw delete sends no signals, so the tombstones that tell the
+    review change feed the rows are gone are written here, in bulk.
+    """
+    using = router.db_for_write(PerformanceReview)
+    columns = [field.attname for field in PerformanceReview._meta.concrete_fields]
+    with transaction.atomic(using=using):
+        rows = list(
+            PerformanceReview.objects.select_for_update(skip_locked=True)
+            .filter(stage__in=ArchivedPerformanceReview.STAGES, created_at__lt=horizon)
+            .order_by("pk")
+            .values(*columns)[:batch_size]
+        )
+        if not rows:
+            return 0
+        ensure_partitions(connections[using], [row["created_at"] for row in rows])
+        archived_at = timezone.now()
+        ArchivedPerformanceReview.objects.using(using).bulk_create(
+            [ArchivedPerformanceReview(**row, archived_at=archived_at) for row in rows]
+        )
+        PerformanceReview._base_manager.filter(pk__in=[row["id"] for row in rows])._raw_delete(
+            using
+        )
+        scopes = {
+            pk: (company_id, department_id)
+            for pk, company_id, department_id in Employee.objects.using(using)
+            .filter(pk__in={row["employee_id"] for row in rows})
+            .values_list("pk", "company_id", "department_id")
+        }
+        Tombstone.objects.using(using).bulk_create(
+            [
+                Tombstone(
+                    model="performancereview",
+                    object_id=row["id"],
+                    company_id=scopes[row["employee_id"]][0],
+                    department_id=scopes[row["employee_id"]][1],
+                    deleted_at=archived_at,
+                )
+                for row in rows
+            ]
+        )
+        bump_versions(
+            {f"employee:{pk}" for pk in scopes}
+            | {f"company-reviews:{company_id}" for company_id, _ in scopes.values()},
+            using,
+        )
+    return len(rows)
+
+
+def archive_reviews(horizon=None, batch_size=None):
+    """
+    Archive every finished review created before ``horizon``, one batch
+    per transaction; returns the number moved.
+    """
+    horizon = horizon or archive_horizon()
+    batch_size = batch_size or get_review_archive_settings()["BATCH_SIZE"]
+    total = 0
+    while moved := archive_batch(horizon, batch_size):
+        total += moved
+    return total
@@ -0,0 +1,205 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import generics, status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .access import get_access_context
+from .models import Tombstone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.get_fixed_timezone(0))
+
+DEFAULT_CHANGE_FEED_SETTINGS = {
+    # Rows and tombstones stamped this recently are held back: a writer may
+    # have stamped an earlier time and not committed yet, and the cursor
+    # must not move past its row.
+    "SETTLE_SECONDS": 5,
+    # Tombstones are purged after this long; cursors older than that must
+    # start over with a full sync.
+    "TOMBSTONE_RETENTION_DAYS": 30,
+    "PURGE_BATCH_SIZE": 1000,
+}
+
+
+def get_change_feed_settings():
+    return {**DEFAULT_CHANGE_FEED_SETTINGS, **getattr(settings, "CHANGE_FEED", {})}
+
+
+def retention_horizon(now=None):
+    """
+    Tombstones from before this instant may have been purged.
+    """
+    days = get_change_feed_settings()["TOMBSTONE_RETENTION_DAYS"]
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def purge_tombstones(batch_size=None):
+    """
+    Delete the tombstones older than the retention window, one batch per
+    statement; returns the number deleted.
+    """
+    batch_size = batch_size or get_change_feed_settings()["PURGE_BATCH_SIZE"]
+    expired = Tombstone.objects.filter(deleted_at__lt=retention_horizon()).order_by("pk")
+    total = 0
+    while ids := list(expired.values_list("pk", flat=True)[:batch_size]):
+        total += Tombstone.objects.filter(pk__in=ids)._raw_delete(expired.db)
+    return total
+
+
+class ResyncRequired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = (
+        "Deletes before this cursor are no longer kept; start over with a full sync."
+    )
+    default_code = "resync_required"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(position):
+    updated_at, row_id, deleted_at, tombstone_id = position
+    payload = json.dumps(
+        [updated_at.isoformat(), row_id, deleted_at.isoformat(), tombstone_id]
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        updated_at, row_id, deleted_at, tombstone_id = json.loads(
+            base64.urlsafe_b64decode(token.encode())
+        )
+        position = (
+            parse_datetime(updated_at),
+            int(row_id),
+            parse_datetime(deleted_at),
+            int(tombstone_id),
+        )
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if position[0] is None or position[2] is None:
+        raise InvalidCursor("Invalid cursor")
+    return position
+
+
+def after(queryset, timestamp_field, timestamp, row_id):
+    """
+    Rows strictly after (timestamp, id) in (timestamp, id) order.
+    """
+    return queryset.filter(
+        Q(**{f"{timestamp_field}__gt": timestamp})
+        | Q(**{timestamp_field: timestamp, "id__gt": row_id})
+    ).order_by(timestamp_field, "id")
+
+
+class ChangeFeedView(generics.GenericAPIView):
+    """
+    Incremental sync of one collection.
+
+    Returns rows with ``updated_at`` after the watermark in stable
+    ``(updated_at, id)`` order, plus tombstones for rows deleted since,
+    and a ``cursor`` to continue from. Start with ``?updated_since=<ISO
+    datetime>`` (or nothing for a full sync), then pass ``?cursor=`` until
+    ``has_more`` is false; the last cursor is the next sync's watermark.
+
+    Changes stamped in the last ``CHANGE_FEED["SETTLE_SECONDS"]`` are only
+    returned once they settle, so a transaction that commits after a read
+    cannot land behind the cursor; ``has_more`` stays true meanwhile.
+    Cursors older than the tombstone retention window get 410 Gone.
+    """
+
+    tombstone_model = None
+    default_limit = 500
+    max_limit = 1000
+
+    def get(self, request, *args, **kwargs):
+        try:
+            position = self.get_start_position(request)
+            limit = min(
+                int(request.query_params.get("limit", self.default_limit)), self.max_limit
+            )
+        except (InvalidCursor, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response(
+                {"error": "limit must be positive"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        updated_at, row_id, deleted_at, tombstone_id = position
+        settled = timezone.now() - timedelta(seconds=get_change_feed_settings()["SETTLE_SECONDS"])
+
+        changed = after(self.get_queryset(), "updated_at", updated_at, row_id)
+        rows = list(changed.filter(updated_at__lt=settled)[: limit + 1])
+        context = get_access_context(request.user)
+        deleted = after(
+            context.scope_tombstones(
+                self.access_scope, Tombstone.objects.filter(model=self.tombstone_model)
+            ),
+            "deleted_at",
+            deleted_at,
+            tombstone_id,
+        )
+        tombstones = list(
+            deleted.filter(deleted_at__lt=settled).values("id", "object_id", "deleted_at")[
+                : limit + 1
+            ]
+        )
+
+        more_tombstones = len(tombstones) > limit
+        has_more = (
+            len(rows) > limit
+            or more_tombstones
+            or changed.filter(updated_at__gte=settled).exists()
+            or deleted.filter(deleted_at__gte=settled).exists()
+        )
+        rows, tombstones = rows[:limit], tombstones[:limit]
+        if rows:
+            updated_at, row_id = rows[-1].updated_at, rows[-1].pk
+        if more_tombstones:
+            deleted_at, tombstone_id = tombstones[-1]["deleted_at"], tombstones[-1]["id"]
+        elif (deleted_at, tombstone_id) < (settled, 0):
+            # Every settled tombstone was delivered, so the next sync can
+            # start from the settle horizon and stays inside the retention
+            # window even when nothing is deleted for a long time.
+            deleted_at, tombstone_id = settled, 0
+
+        return Response(
+            {
+                "results": self.get_serializer(rows, many=True).data,
+                "deleted": [
+                    {"id": tombstone["object_id"], "deleted_at": tombstone["deleted_at"]}
+                    for tombstone in tombstones
+                ],
+                "cursor": encode_cursor((updated_at, row_id, deleted_at, tombstone_id)),
+                "has_more": has_more,
+            }
+        )
+
+    def get_start_position(self, request):
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            position = decode_cursor(cursor)
+            if position[2] < retention_horizon():
+                raise ResyncRequired()
+            return position
+
+        since = request.query_params.get("updated_since")
+        if not since:
+            return (EPOCH, 0, EPOCH, 0)
+        watermark = parse_datetime(since)
+        if watermark is None:
+            raise InvalidCursor("updated_since must be an ISO 8601 datetime")
+        if timezone.is_naive(watermark):
+            watermark = timezone.make_aware(watermark, timezone.get_fixed_timezone(0))
+        if watermark < retention_horizon():
+            raise ResyncRequired()
+        # Rows updated exactly at the watermark were delivered by the previous sync.
+        return (watermark, 2**63 - 1, watermark, 2**63 - 1)
@@ -0,0 +1,233 @@
+"""
+Collaboration graph: how many projects each pair of employees shares,
+kept in the Collaboration edge table.
+
+Edges are adjusted incrementally as assignments are added and removed,
+and rebuilt from a self-join of the assignment table for backfills.
+"""
+from collections import Counter, defaultdict
+from itertools import permutations
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F, Q
+
+from . import hierarchy
+from .models import Collaboration, Employee, Project, ProjectAssignment
+
+
+def _members(project_ids, using=None):
+    members = defaultdict(set)
+    for project_id, employee_id in (
+        ProjectAssignment.objects.using(using)
+        .filter(project_id__in=project_ids)
+        .values_list("project_id", "employee_id")
+    ):
+        members[project_id].add(employee_id)
+    return members
+
+
+def _by_project(pairs):
+    grouped = defaultdict(set)
+    for project_id, employee_id in pairs:
+        grouped[project_id].add(employee_id)
+    return grouped
+
+
+def _count(deltas, changed, others, sign):
+    for employee_id in changed:
+        for colleague_id in others:
+            deltas[(employee_id, colleague_id)] += sign
+            deltas[(colleague_id, employee_id)] += sign
+    for employee_id, colleague_id in permutations(changed, 2):
+        deltas[(employee_id, colleague_id)] += sign
+
+
+def assignments_added(pairs, using=None):
+    """
+    Count the ``(project_id, employee_id)`` assignments just added, which
+    are already in the assignment table.
+    """
+    added = _by_project(pairs)
+    members = _members(added, using)
+    deltas = Counter()
+    for project_id, employee_ids in added.items():
+        _count(deltas, employee_ids, members[project_id] - employee_ids, 1)
+    apply(deltas, using)
+
+
+def assignments_removed(pairs, using=None, present=True):
+    """
+    Uncount the ``(project_id, employee_id)`` assignments being removed,
+    all at once.
+
+    With ``present`` they are still in the assignment table, and pairs
+    that are not are ignored; otherwise they are already deleted.
+    """
+    removed = _by_project(pairs)
+    members = _members(removed, using)
+    deltas = Counter()
+    for project_id, employee_ids in removed.items():
+        if present:
+            employee_ids &= members[project_id]
+        remaining = members[project_id] - employee_ids
+        _count(deltas, employee_ids, remaining, -1)
+    apply(deltas, using)
+
+
+def apply(deltas, using=None):
+    """
+    Add ``deltas`` of ``{(employee_id, colleague_id): change}`` to the
+    edges: existing edges with one UPDATE per distinct change, new ones
+    with one INSERT, then edges left without a shared project are dropped.
+    """
+    deltas = {pair: delta for pair, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    edges = Collaboration.objects.using(using)
+    existing = {
+        (employee_id, colleague_id): pk
+        for pk, employee_id, colleague_id in edges.filter(
+            employee_id__in={employee_id for employee_id, _ in deltas},
+            colleague_id__in={colleague_id for _, colleague_id in deltas},
+        ).values_list("pk", "employee_id", "colleague_id")
+        if (employee_id, colleague_id) in deltas
+    }
+
+    by_delta = defaultdict(list)
+    for pair, pk in existing.items():
+        by_delta[deltas[pair]].append(pk)
+    for delta, pks in by_delta.items():
+        edges.filter(pk__in=pks).update(shared_projects=F("shared_projects") + delta)
+
+    missing = [
+        Collaboration(employee_id=employee_id, colleague_id=colleague_id, shared_projects=delta)
+        for (employee_id, colleague_id), delta in deltas.items()
+        if (employee_id, colleague_id) not in existing and delta > 0
+    ]
+    if missing:
+        try:
+            with transaction.atomic(using=using or router.db_for_write(Collaboration)):
+                edges.bulk_create(missing)
+        except IntegrityError:
+            # Some were created concurrently since the read above.
+            for edge in missing:
+                key = {"employee_id": edge.employee_id, "colleague_id": edge.colleague_id}
+                increment = {"shared_projects": F("shared_projects") + edge.shared_projects}
+                if not edges.filter(**key).update(**increment):
+                    edges.create(shared_projects=edge.shared_projects, **key)
+
+    if any(delta < 0 for delta in deltas.values()):
+        edges.filter(pk__in=existing.values(), shared_projects__lte=0).delete()
+
+
+def rebuild(company_id=None):
+    """
+    Recount the edges of ``company_id`` (every company by default) from
+    the assignment table in one INSERT ... SELECT self-join; returns the
+    number of edges.
+    """
+    using = router.db_for_write(Collaboration)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    edges = quote(Collaboration._meta.db_table)
+    assignments = quote(ProjectAssignment._meta.db_table)
+    projects = quote(Project._meta.db_table)
+    where, params = "", []
+    stale = Collaboration.objects.using(using)
+    if company_id is not None:
+        where, params = "WHERE p.company_id = %s", [company_id]
+        stale = stale.filter(employee__company_id=company_id)
+    with transaction.atomic(using=using):
+        stale._raw_delete(using)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {edges} (employee_id, colleague_id, shared_projects) "
+                f"SELECT a.employee_id, b.employee_id, COUNT(*) "
+                f"FROM {assignments} a "
+                f"JOIN {assignments} b "
+                f"ON b.project_id = a.project_id AND b.employee_id <> a.employee_id "
+                f"JOIN {projects} p ON p.id = a.project_id "
+                f"{where} "
+                f"GROUP BY a.employee_id, b.employee_id",
+                params,
+            )
+            return cursor.rowcount
+
+
+def top_collaborators(employee_id, limit=10):
+    """
+    ``[colleague_id, name, department_id, shared_projects]`` rows of the
+    employee's closest collaborators.
+    """
+    rows = (
+        Collaboration.objects.filter(employee_id=employee_id)
+        .order_by("-shared_projects", "colleague_id")
+        .values_list(
+            "colleague_id", "colleague__name", "colleague__department_id", "shared_projects"
+        )
+    )
+    return [list(row) for row in rows[:limit]]
+
+
+def department_graph(department_id, min_shared=1):
+    """
+    Collaboration graph of the employees in the subtree of
+    ``department_id``, as compact adjacency lists.
+
+    ``nodes`` are ``[id, name, department_id]`` and include colleagues
+    outside the subtree; ``adjacency`` maps each employee of the subtree
+    to ``[colleague_id, shared_projects]`` pairs; ``clusters`` are the
+    connected groups of two or more employees, largest first; ``bridges``
+    are the edges ``[id, id, shared_projects]`` joining employees of
+    different departments.
+    """
+    departments = hierarchy.subtree(department_id)
+    adjacency = defaultdict(list)
+    colleague_ids = set()
+    for employee_id, colleague_id, shared in (
+        Collaboration.objects.filter(
+            employee__department_id__in=departments, shared_projects__gte=min_shared
+        )
+        .order_by("employee_id", "-shared_projects", "colleague_id")
+        .values_list("employee_id", "colleague_id", "shared_projects")
+    ):
+        adjacency[employee_id].append([colleague_id, shared])
+        colleague_ids.add(colleague_id)
+
+    nodes = list(
+        Employee.objects.filter(Q(department_id__in=departments) | Q(pk__in=colleague_ids))
+        .order_by("pk")
+        .values_list("pk", "name", "department_id")
+    )
+    department_of = {pk: department for pk, _, department in nodes}
+
+    parent = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    bridges = []
+    for employee_id, edges in adjacency.items():
+        for colleague_id, shared in edges:
+            parent[find(employee_id)] = find(colleague_id)
+            # Edges within the subtree are listed from both ends.
+            first = colleague_id not in adjacency or employee_id < colleague_id
+            if first and department_of.get(employee_id) != department_of.get(colleague_id):
+                bridges.append([employee_id, colleague_id, shared])
+
+    clusters = defaultdict(list)
+    for node in sorted(parent):
+        clusters[find(node)].append(node)
+    return {
+        "nodes": [list(node) for node in nodes],
+        "adjacency": {str(employee_id): edges for employee_id, edges in adjacency.items()},
+        "clusters": sorted(
+            (members for members in clusters.values() if len(members) > 1),
+            key=lambda members: (-len(members), members[0]),
+        ),
+        "bridges": bridges,
+    }
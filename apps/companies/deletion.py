@@ -0,0 +1,266 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.core.cache import bump_versions
+
+from . import collaboration, hierarchy
+from .models import (
+    ArchivedPerformanceReview,
+    Collaboration,
+    Company,
+    DeletionJob,
+    Department,
+    DepartmentClosure,
+    Employee,
+    PerformanceReview,
+    Project,
+    Tombstone,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DELETION_SETTINGS = {
+    "BATCH_SIZE": 1000,
+    # A running job whose worker has not reported for this long is resumed.
+    "STALE_AFTER_SECONDS": 300,
+}
+
+Assignment = Project.assigned_employees.through
+
+
+def get_deletion_settings():
+    return {**DEFAULT_DELETION_SETTINGS, **getattr(settings, "DELETION", {})}
+
+
+class Step:
+    """
+    One set-based deletion step: the rows left to delete, the columns to
+    read for each batch and how to turn them into tombstones.
+    """
+
+    def __init__(self, name, model, queryset, fields=("pk",), tombstone=None, after_batch=None):
+        self.name = name
+        self.model = model
+        self.queryset = queryset
+        self.fields = fields
+        self.tombstone = tombstone
+        self.after_batch = after_batch
+
+
+def _tombstone(model):
+    def build(row):
+        pk, company_id, department_id = (list(row) + [None, None])[:3]
+        return Tombstone(
+            model=model, object_id=pk, company_id=company_id, department_id=department_id
+        )
+    return build
+
+
+def _touch_remaining_projects(lookup, target_id):
+    # Projects outside the target that lose assignees must show up in the
+    # change feed, and their remaining assignees lose collaborators, as the
+    # m2m signals would have done.
+    def touch(rows):
+        project_ids = {project_id for _, project_id, _ in rows}
+        Project.objects.filter(pk__in=project_ids).exclude(**{lookup: target_id}).update(
+            updated_at=timezone.now(), version=F("version") + 1
+        )
+        collaboration.assignments_removed(
+            [(project_id, employee_id) for _, project_id, employee_id in rows], present=False
+        )
+    return touch
+
+
+def plan(job):
+    """
+    Deletion steps for ``job`` in FK dependency order: rows are only
+    deleted once nothing left in the plan references them.
+    """
+    lookup = f"{job.target_type}_id"
+    target = job.target_id
+    steps = [
+        Step(
+            "archived_performance_reviews",
+            ArchivedPerformanceReview,
+            ArchivedPerformanceReview.objects.filter(
+                Q(**{f"employee__{lookup}": target}) | Q(**{f"reviewer__{lookup}": target})
+            ),
+            ("pk", "employee__company_id", "employee__department_id"),
+            _tombstone("performancereview"),
+        ),
+        Step(
+            "performance_reviews",
+            PerformanceReview,
+            PerformanceReview.objects.filter(
+                Q(**{f"employee__{lookup}": target}) | Q(**{f"reviewer__{lookup}": target})
+            ),
+            ("pk", "employee__company_id", "employee__department_id"),
+            _tombstone("performancereview"),
+        ),
+        Step(
+            "project_assignments",
+            Assignment,
+            Assignment.objects.filter(
+                Q(**{f"project__{lookup}": target}) | Q(**{f"employee__{lookup}": target})
+            ),
+            ("pk", "project_id", "employee_id"),
+            after_batch=_touch_remaining_projects(lookup, target),
+        ),
+        Step(
+            "collaborations",
+            Collaboration,
+            Collaboration.objects.filter(
+                Q(**{f"employee__{lookup}": target}) | Q(**{f"colleague__{lookup}": target})
+            ),
+        ),
+        Step(
+            "projects",
+            Project,
+            Project.objects.filter(**{lookup: target}),
+            ("pk", "company_id", "department_id"),
+            _tombstone("project"),
+        ),
+        Step(
+            "employees",
+            Employee,
+            Employee.objects.filter(**{lookup: target}),
+            ("pk", "company_id", "department_id"),
+            _tombstone("employee"),
+        ),
+    ]
+    if job.target_type == "company":
+        steps += [
+            Step(
+                "department_links",
+                DepartmentClosure,
+                DepartmentClosure.objects.filter(descendant__company_id=target),
+            ),
+            Step(
+                "departments",
+                Department,
+                Department.objects.filter(company_id=target),
+                ("pk", "company_id"),
+                _tombstone("department"),
+            ),
+            Step("company", Company, Company.objects.filter(pk=target)),
+        ]
+    else:
+        # Sub-departments are kept and move up to the target's parent.
+        steps.append(
+            Step(
+                "department",
+                Department,
+                Department.objects.filter(pk=target),
+                ("pk", "company_id"),
+                _tombstone("department"),
+                after_batch=lambda rows: hierarchy.detach(target),
+            )
+        )
+    return steps
+
+
+def enqueue_deletion(obj, requested_by=None):
+    """
+    Schedule the deletion of a Company or Department, reusing an
+    unfinished job for the same target.
+    """
+    target_type = obj._meta.model_name
+    company_id = obj.pk if target_type == "company" else obj.company_id
+    job = (
+        DeletionJob.objects.filter(target_type=target_type, target_id=obj.pk)
+        .exclude(status="completed")
+        .first()
+    )
+    if job is None:
+        job = DeletionJob(
+            target_type=target_type,
+            target_id=obj.pk,
+            target_name=str(obj)[:255],
+            company_id=company_id,
+            requested_by=requested_by if requested_by and requested_by.is_authenticated else None,
+        )
+        job.totals = {step.name: step.queryset.count() for step in plan(job)}
+        job.save()
+    elif job.status == "failed":
+        job.status = "pending"
+        job.save(update_fields=["status"])
+    return job
+
+
+def claim_job():
+    """
+    Take the oldest pending job, or a running one whose worker went away.
+    """
+    stale = timezone.now() - timedelta(seconds=get_deletion_settings()["STALE_AFTER_SECONDS"])
+    with transaction.atomic(using=router.db_for_write(DeletionJob)):
+        job = (
+            DeletionJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status="pending") | Q(status="running", heartbeat_at__lt=stale))
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        now = timezone.now()
+        job.status = "running"
+        job.started_at = job.started_at or now
+        job.heartbeat_at = now
+        job.save(update_fields=["status", "started_at", "heartbeat_at"])
+    return job
+
+
+def delete_batch(step, batch_size):
+    """
+    Delete up to ``batch_size`` rows of ``step`` in one transaction,
+    without loading model instances or sending signals.
+    """
+    using = router.db_for_write(step.model)
+    with transaction.atomic(using=using):
+        rows = list(step.queryset.order_by("pk").values_list(*step.fields)[:batch_size])
+        if not rows:
+            return 0
+        if step.tombstone:
+            Tombstone.objects.bulk_create([step.tombstone(row) for row in rows])
+        step.model._base_manager.filter(pk__in=[row[0] for row in rows])._raw_delete(using)
+        if step.after_batch:
+            step.after_batch(rows)
+    return len(rows)
+
+
+def run_job(job, batch_size=None):
+    """
+    Run ``job`` to completion. Every batch commits on its own, so a job
+    interrupted at any point resumes where it stopped.
+    """
+    batch_size = batch_size or get_deletion_settings()["BATCH_SIZE"]
+    try:
+        # Rows created under the target while the job ran are picked up by
+        # a second pass; the final delete fails until none are left.
+        for attempt in range(2):
+            try:
+                for step in plan(job):
+                    while deleted := delete_batch(step, batch_size):
+                        job.deleted[step.name] = job.deleted.get(step.name, 0) + deleted
+                        job.heartbeat_at = timezone.now()
+                        job.save(update_fields=["deleted", "heartbeat_at"])
+                break
+            except IntegrityError:
+                if attempt:
+                    raise
+    except Exception as e:
+        logger.exception("Deletion job %s failed", job.pk)
+        job.status = "failed"
+        job.last_error = str(e)[:2000]
+        job.save(update_fields=["status", "last_error"])
+        return job
+
+    job.status = "completed"
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "finished_at"])
+    bump_versions([f"company:{job.company_id}"])
+    return job
@@ -0,0 +1,127 @@
+"""
+Department hierarchy kept as a closure table: one DepartmentClosure row
+per (ancestor, descendant) pair, so the subtree or the ancestors of a
+department are one indexed query at any depth.
+"""
+from django.db import router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Department, DepartmentClosure
+
+
+def subtree(department_id):
+    """
+    Ids of ``department_id`` and every department below it, as a subquery.
+    """
+    return DepartmentClosure.objects.filter(ancestor_id=department_id).values("descendant_id")
+
+
+def ancestors(department_id):
+    """
+    Ids of ``department_id`` and every department above it, as a subquery.
+    """
+    return DepartmentClosure.objects.filter(descendant_id=department_id).values("ancestor_id")
+
+
+def link(department, using=None):
+    """
+    Add the rows of a new department: itself, and it below every
+    ancestor of its parent.
+    """
+    links = DepartmentClosure.objects.using(using)
+    rows = [DepartmentClosure(ancestor_id=department.pk, descendant_id=department.pk, depth=0)]
+    if department.parent_id:
+        rows += [
+            DepartmentClosure(ancestor_id=ancestor_id, descendant_id=department.pk, depth=depth + 1)
+            for ancestor_id, depth in links.filter(
+                descendant_id=department.parent_id
+            ).values_list("ancestor_id", "depth")
+        ]
+    links.bulk_create(rows)
+
+
+def move(department, using=None):
+    """
+    Re-link the subtree of ``department`` below its new parent.
+    """
+    links = DepartmentClosure.objects.using(using)
+    below = links.filter(ancestor_id=department.pk)
+    # Paths from the old ancestors into the subtree.
+    links.filter(descendant_id__in=below.values("descendant_id")).exclude(
+        ancestor_id__in=below.values("descendant_id")
+    ).delete()
+    if department.parent_id:
+        above = list(
+            links.filter(descendant_id=department.parent_id).values_list("ancestor_id", "depth")
+        )
+        links.bulk_create(
+            DepartmentClosure(
+                ancestor_id=ancestor_id,
+                descendant_id=descendant_id,
+                depth=ancestor_depth + descendant_depth + 1,
+            )
+            for descendant_id, descendant_depth in below.values_list("descendant_id", "depth")
+            for ancestor_id, ancestor_depth in above
+        )
+
+
+def detach(department_id, using=None):
+    """
+    Take a department out of the hierarchy before it is deleted: its
+    children move up to its parent, keeping their own subtrees.
+    """
+    links = DepartmentClosure.objects.using(using)
+    parent_id = (
+        links.filter(descendant_id=department_id, depth=1)
+        .values_list("ancestor_id", flat=True)
+        .first()
+    )
+    links.filter(
+        ancestor_id__in=links.filter(descendant_id=department_id, depth__gt=0).values(
+            "ancestor_id"
+        ),
+        descendant_id__in=links.filter(ancestor_id=department_id, depth__gt=0).values(
+            "descendant_id"
+        ),
+    ).update(depth=F("depth") - 1)
+    links.filter(Q(ancestor_id=department_id) | Q(descendant_id=department_id)).delete()
+    Department._base_manager.using(using).filter(parent_id=department_id).update(
+        parent_id=parent_id, updated_at=timezone.now(), version=F("version") + 1
+    )
+
+
+def is_within(department_id, ancestor_id, using=None):
+    """
+    Whether ``department_id`` is ``ancestor_id`` or below it.
+    """
+    return (
+        DepartmentClosure.objects.using(using)
+        .filter(ancestor_id=ancestor_id, descendant_id=department_id)
+        .exists()
+    )
+
+
+def rebuild(company_id=None, batch_size=2000):
+    """
+    Recompute the rows of ``company_id``'s departments (every company by
+    default) from their parents, for bulk loads that skip the signals;
+    returns the number of rows.
+    """
+    using = router.db_for_write(DepartmentClosure)
+    departments = Department._base_manager.using(using)
+    if company_id is not None:
+        departments = departments.filter(company_id=company_id)
+    parents = dict(departments.values_list("pk", "parent_id"))
+    rows = []
+    for pk in parents:
+        ancestor_id, depth = pk, 0
+        while ancestor_id is not None:
+            rows.append(DepartmentClosure(ancestor_id=ancestor_id, descendant_id=pk, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    with transaction.atomic(using=using):
+        DepartmentClosure.objects.using(using).filter(
+            descendant_id__in=departments.values("pk")
+        )._raw_delete(using)
+        DepartmentClosure.objects.using(using).bulk_create(rows, batch_size=batch_size)
+    return len(rows)
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.companies.archive import archive_horizon, archive_reviews
+from apps.companies.sharding import get_sharding_settings, shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Move approved and rejected reviews created before the archive horizon "
+        "to the archive tier, in batches. Run it daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Reviews moved per transaction")
+        parser.add_argument(
+            "--horizon-days", type=int, help="Override REVIEW_ARCHIVE['HORIZON_DAYS']"
+        )
+        parser.add_argument("--shard", help="Database alias to work on when sharding is on")
+
+    def handle(self, *args, **options):
+        shard = options["shard"] or get_sharding_settings()["DIRECTORY"]
+        if shard not in shard_aliases():
+            raise CommandError(f"Unknown shard {shard!r}")
+        with use_shard(shard):
+            self.run(options)
+
+    def run(self, options):
+        if options["horizon_days"] is not None:
+            horizon = timezone.now() - timedelta(days=options["horizon_days"])
+        else:
+            horizon = archive_horizon()
+        moved = archive_reviews(horizon=horizon, batch_size=options["batch_size"])
+        self.stdout.write(f"Archived {moved} review(s) created before {horizon:%Y-%m-%d}")
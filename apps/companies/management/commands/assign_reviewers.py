@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.companies.models import PerformanceReview
+from apps.companies.reviewer_assignment import assign_reviewers
+from apps.companies.sharding import get_sharding_settings, shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Assign reviewers to unassigned open reviews, balancing the load of "
+        "the managers of each department and the departments above it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", type=int, help="Only assign this company's reviews")
+        parser.add_argument(
+            "--department", type=int, help="Only assign reviews of this department's employees"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Show the planned assignment without saving it"
+        )
+        parser.add_argument("--shard", help="Database alias to work on when sharding is on")
+
+    def handle(self, *args, **options):
+        shard = options["shard"] or get_sharding_settings()["DIRECTORY"]
+        if shard not in shard_aliases():
+            raise CommandError(f"Unknown shard {shard!r}")
+        with use_shard(shard):
+            self.run(options)
+
+    def run(self, options):
+        reviews = PerformanceReview.objects.all()
+        if options["company"]:
+            reviews = reviews.filter(employee__company_id=options["company"])
+        if options["department"]:
+            reviews = reviews.filter(employee__department_id=options["department"])
+        summary = assign_reviewers(reviews, dry_run=options["dry_run"])
+        for row in summary["reviewers"]:
+            if row["assigned"]:
+                self.stdout.write(
+                    f"{row['name']} (#{row['reviewer']}): load {row['load']}, +{row['assigned']}"
+                )
+        verb = "Would assign" if summary["dry_run"] else "Assigned"
+        count = summary["planned"] if summary["dry_run"] else summary["assigned"]
+        self.stdout.write(
+            f"{verb} {count} review(s); {summary['unassignable']} without an eligible reviewer"
+        )
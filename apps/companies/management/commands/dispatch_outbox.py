@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.companies.outbox import OutboxDispatcher, get_outbox_settings
+from apps.companies.sharding import get_sharding_settings, shard_aliases, use_shard
+
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = "Deliver pending outbox events to the configured sink."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Drain what is due and exit instead of polling"
+        )
+        parser.add_argument("--batch-size", type=int, help="Events per delivery")
+        parser.add_argument("--interval", type=float, help="Seconds between polls when idle")
+        parser.add_argument("--shard", help="Database alias to work on when sharding is on")
+
+    def handle(self, *args, **options):
+        shard = options["shard"] or get_sharding_settings()["DIRECTORY"]
+        if shard not in shard_aliases():
+            raise CommandError(f"Unknown shard {shard!r}")
+        with use_shard(shard):
+            self.run(options)
+
+    def run(self, options):
+        dispatcher = OutboxDispatcher(batch_size=options["batch_size"])
+        if options["once"]:
+            delivered = dispatcher.drain()
+            self.stdout.write(f"Delivered {delivered} event(s)")
+            return
+
+        interval = options["interval"] or get_outbox_settings()["POLL_INTERVAL"]
+        last_purge = 0.0
+        try:
+            while True:
+                if time.monotonic() - last_purge > PURGE_INTERVAL:
+                    purged = dispatcher.purge()
+                    if purged:
+                        self.stdout.write(f"Purged {purged} delivered event(s)")
+                    last_purge = time.monotonic()
+                if not dispatcher.dispatch_batch():
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,47 @@
+import gzip
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.companies.models import Company
+from apps.companies.snapshots import export_company
+
+
+def open_snapshot(path, mode):
+    if path == "-":
+        return sys.stdin if mode == "r" else sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=3)
+    return open(path, mode, encoding="utf-8")
+
+
+class Command(BaseCommand):
+    help = "Write an NDJSON snapshot of one company's data (use a .gz path to compress)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("company", help="Company id or exact name")
+        parser.add_argument("output", help="Snapshot file, or - for stdout")
+
+    def handle(self, *args, **options):
+        lookup = {"pk": options["company"]} if options["company"].isdigit() else {
+            "name": options["company"]
+        }
+        company = Company.objects.filter(**lookup).first()
+        if company is None:
+            raise CommandError(f"Company {options['company']!r} not found")
+
+        started = time.perf_counter()
+        fp = open_snapshot(options["output"], "w")
+        try:
+            counts = export_company(company.pk, fp)
+        finally:
+            if fp is not sys.stdout:
+                fp.close()
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        self.stderr.write(
+            f"Exported {total} rows of {company} in {elapsed:.2f}s "
+            f"({total / elapsed:,.0f} rows/s): "
+            + ", ".join(f"{name}={count}" for name, count in counts.items())
+        )
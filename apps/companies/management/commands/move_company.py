@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.companies.models import Company
+from apps.companies.sharding import (
+    ShardMoveError,
+    is_enabled,
+    locate,
+    move_company,
+    shard_aliases,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move one company's rows to another shard while it stays online; "
+        "writes to the company get a 503 only during the final sync."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("company", type=int, help="Company id")
+        parser.add_argument("shard", help="Database alias of the target shard")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per batch")
+        parser.add_argument(
+            "--drain-seconds",
+            type=float,
+            help="Wait for writes in flight after freezing the company "
+            "(default: SHARDING['DRAIN_SECONDS'])",
+        )
+
+    def handle(self, *args, **options):
+        if not is_enabled():
+            raise CommandError("Sharding is off; set SHARDS first")
+        if options["shard"] not in shard_aliases():
+            raise CommandError(f"Unknown shard {options['shard']!r}")
+        if locate(Company, options["company"]) is None:
+            raise CommandError(f"Company {options['company']} not found")
+
+        started = time.perf_counter()
+        try:
+            move_company(
+                options["company"],
+                options["shard"],
+                batch_size=options["batch_size"],
+                drain_seconds=options["drain_seconds"],
+                log=self.stdout.write,
+            )
+        except ShardMoveError as e:
+            raise CommandError(str(e)) from e
+        self.stdout.write(f"Done in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.companies.changes import purge_tombstones, retention_horizon
+from apps.companies.sharding import get_sharding_settings, shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete change feed tombstones older than "
+        "CHANGE_FEED['TOMBSTONE_RETENTION_DAYS'], in batches. Run it daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Tombstones deleted per statement")
+        parser.add_argument("--shard", help="Database alias to work on when sharding is on")
+
+    def handle(self, *args, **options):
+        shard = options["shard"] or get_sharding_settings()["DIRECTORY"]
+        if shard not in shard_aliases():
+            raise CommandError(f"Unknown shard {shard!r}")
+        with use_shard(shard):
+            self.run(options)
+
+    def run(self, options):
+        horizon = retention_horizon()
+        purged = purge_tombstones(batch_size=options["batch_size"])
+        self.stdout.write(f"Purged {purged} tombstone(s) from before {horizon:%Y-%m-%d}")
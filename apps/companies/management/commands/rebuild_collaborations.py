@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.companies.collaboration import rebuild
+from apps.companies.sharding import get_sharding_settings, shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the collaboration graph from project assignments with one "
+        "self-join, for backfills and after bulk loads that skip signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", type=int, help="Only rebuild this company's edges")
+        parser.add_argument("--shard", help="Database alias to work on when sharding is on")
+
+    def handle(self, *args, **options):
+        shard = options["shard"] or get_sharding_settings()["DIRECTORY"]
+        if shard not in shard_aliases():
+            raise CommandError(f"Unknown shard {shard!r}")
+        with use_shard(shard):
+            self.run(options)
+
+    def run(self, options):
+        edges = rebuild(options["company"])
+        scope = f"company {options['company']}" if options["company"] else "every company"
+        self.stdout.write(f"Rebuilt {edges} collaboration edge(s) for {scope}")
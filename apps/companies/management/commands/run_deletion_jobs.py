@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.companies.deletion import claim_job, run_job
+from apps.companies.sharding import get_sharding_settings, shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    help = "Run queued company and department deletion jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Run the queued jobs and exit instead of polling"
+        )
+        parser.add_argument("--batch-size", type=int, help="Rows deleted per transaction")
+        parser.add_argument(
+            "--interval", type=float, default=5.0, help="Seconds between polls when idle"
+        )
+        parser.add_argument("--shard", help="Database alias to work on when sharding is on")
+
+    def handle(self, *args, **options):
+        shard = options["shard"] or get_sharding_settings()["DIRECTORY"]
+        if shard not in shard_aliases():
+            raise CommandError(f"Unknown shard {shard!r}")
+        with use_shard(shard):
+            self.run(options)
+
+    def run(self, options):
+        try:
+            while True:
+                job = claim_job()
+                if job is None:
+                    if options["once"]:
+                        return
+                    time.sleep(options["interval"])
+                    continue
+                self.stdout.write(f"Running {job}")
+                job = run_job(job, batch_size=options["batch_size"])
+                self.stdout.write(
+                    f"{job}: {sum(job.deleted.values())} row(s) deleted"
+                    + (f", error: {job.last_error}" if job.last_error and job.status == "failed" else "")
+                )
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,247 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.companies import collaboration, hierarchy
+from apps.companies.models import (
+    Company,
+    Department,
+    Employee,
+    Project,
+    ProjectAssignment,
+    PerformanceReview,
+)
+
+User = get_user_model()
+
+DESIGNATIONS = [
+    "Software Engineer",
+    "Senior Software Engineer",
+    "QA Engineer",
+    "Product Manager",
+    "Designer",
+    "Data Analyst",
+    "Support Specialist",
+    "Account Executive",
+]
+
+BASE_DATE = date(2024, 1, 1)
+ALLOCATIONS = [25, 50, 50, 100, 100, 100]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic organisation: companies, departments, "
+        "employees with linked users, projects with assignments and reviews at "
+        "every stage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=1.0,
+            help="Scale factor; 1.0 creates 1,000 employees across 5 companies",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--prefix", default="seed", help="Prefix for company names and usernames"
+        )
+        parser.add_argument(
+            "--password", default="seedpass123", help="Password for every seeded user"
+        )
+        parser.add_argument("--companies", type=int, default=5)
+        parser.add_argument("--departments", type=int, default=8, help="Per company")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.prefix = options["prefix"]
+        self.batch_size = options["batch_size"]
+        # Hashing once instead of per user is what makes large seeds fast.
+        self.password_hash = make_password(options["password"])
+
+        scale = options["scale"]
+        if scale <= 0:
+            raise CommandError("--scale must be positive")
+        if Company.objects.filter(name__startswith=f"{self.prefix} ").exists():
+            raise CommandError(
+                f"Companies prefixed '{self.prefix}' already exist; use another --prefix"
+            )
+
+        employees_per_department = max(2, round(25 * scale))
+        self.user_counter = 0
+        self.totals = {
+            "companies": 0,
+            "departments": 0,
+            "users": 0,
+            "employees": 0,
+            "projects": 0,
+            "assignments": 0,
+            "reviews": 0,
+        }
+
+        started = time.perf_counter()
+        self.create_admin()
+        for company_index in range(options["companies"]):
+            with transaction.atomic():
+                self.seed_company(
+                    company_index, options["departments"], employees_per_department
+                )
+            self.stdout.write(f"Seeded company {company_index + 1}/{options['companies']}")
+
+        elapsed = time.perf_counter() - started
+        rows = sum(self.totals.values())
+        for name, count in self.totals.items():
+            self.stdout.write(f"  {name:<12} {count:>10,}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s). "
+                f"Users log in as <username>@example.com with the seed password; "
+                f"admin is {self.prefix}-admin@example.com."
+            )
+        )
+
+    def build_user(self, role):
+        self.user_counter += 1
+        username = f"{self.prefix}-u{self.user_counter}"
+        return User(
+            username=username,
+            email=f"{username}@example.com",
+            password=self.password_hash,
+            first_name="Seed",
+            last_name=f"User {self.user_counter}",
+            role=role,
+        )
+
+    def bulk_create(self, model, objects):
+        return model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def create_admin(self):
+        User.objects.create(
+            username=f"{self.prefix}-admin",
+            email=f"{self.prefix}-admin@example.com",
+            password=self.password_hash,
+            role="admin",
+            is_staff=True,
+        )
+        self.totals["users"] += 1
+
+    def seed_company(self, company_index, department_count, employees_per_department):
+        rng = self.rng
+        company = Company.objects.create(name=f"{self.prefix} Company {company_index + 1}")
+        departments = self.bulk_create(
+            Department,
+            [
+                Department(company=company, name=f"Department {index + 1}")
+                for index in range(department_count)
+            ],
+        )
+
+        roles = []
+        for department in departments:
+            roles.append((department, "manager"))
+            roles.extend((department, "employee") for _ in range(employees_per_department - 1))
+        users = self.bulk_create(User, [self.build_user(role) for _, role in roles])
+
+        employees = self.bulk_create(
+            Employee,
+            [
+                Employee(
+                    company=company,
+                    department=department,
+                    user=user,
+                    name=f"{user.first_name} {user.last_name}",
+                    email=f"{user.username}@{self.prefix}.test",
+                    mobile_number=f"+1555{rng.randrange(10**7):07d}",
+                    address=f"{rng.randrange(1, 999)} Seed Street",
+                    designation=(
+                        "Engineering Manager" if role == "manager" else rng.choice(DESIGNATIONS)
+                    ),
+                    hired_on=BASE_DATE - timedelta(days=rng.randrange(3650)),
+                )
+                for (department, role), user in zip(roles, users)
+            ],
+        )
+
+        by_department = {}
+        for employee, (department, role) in zip(employees, roles):
+            by_department.setdefault(department.pk, {"manager": None, "staff": []})
+            if role == "manager":
+                by_department[department.pk]["manager"] = employee
+            else:
+                by_department[department.pk]["staff"].append(employee)
+
+        projects = []
+        for department in departments:
+            for index in range(max(1, employees_per_department // 5)):
+                start = BASE_DATE + timedelta(days=rng.randrange(-365, 365))
+                projects.append(
+                    Project(
+                        company=company,
+                        department=department,
+                        name=f"Project {department.pk}-{index + 1}",
+                        description="Synthetic project generated by seed_org.",
+                        start_date=start,
+                        end_date=start + timedelta(days=rng.randrange(30, 365)),
+                    )
+                )
+        projects = self.bulk_create(Project, projects)
+
+        assignments = []
+        for project in projects:
+            staff = by_department[project.department_id]["staff"]
+            members = rng.sample(staff, min(len(staff), rng.randint(2, 8)))
+            assignments.extend(
+                ProjectAssignment(
+                    project_id=project.pk,
+                    employee_id=member.pk,
+                    allocation=rng.choice(ALLOCATIONS),
+                    start_date=project.start_date,
+                    end_date=project.end_date,
+                )
+                for member in members
+            )
+        self.bulk_create(ProjectAssignment, assignments)
+
+        stages = [stage for stage, _ in PerformanceReview.STAGE_CHOICES]
+        reviews = []
+        for group in by_department.values():
+            for member in group["staff"]:
+                stage = stages[len(reviews) % len(stages)]
+                reviewed = stage != "pending_review"
+                reviews.append(
+                    PerformanceReview(
+                        employee=member,
+                        reviewer=group["manager"],
+                        stage=stage,
+                        review_date=(
+                            BASE_DATE + timedelta(days=rng.randrange(365)) if reviewed else None
+                        ),
+                        feedback="Synthetic feedback." if reviewed else "",
+                        rating=(
+                            rng.randint(1, 5)
+                            if stage in ("under_approval", "review_approved", "review_rejected")
+                            else None
+                        ),
+                    )
+                )
+        self.bulk_create(PerformanceReview, reviews)
+
+        # bulk_create skips the signals that maintain the department
+        # hierarchy and the collaboration graph.
+        hierarchy.rebuild(company.pk, self.batch_size)
+        collaboration.rebuild(company.pk)
+
+        self.totals["companies"] += 1
+        self.totals["departments"] += len(departments)
+        self.totals["users"] += len(users)
+        self.totals["employees"] += len(employees)
+        self.totals["projects"] += len(projects)
+        self.totals["assignments"] += len(assignments)
+        self.totals["reviews"] += len(reviews)
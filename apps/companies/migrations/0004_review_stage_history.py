@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_stage_changed_at(apps, schema_editor):
+    # The last update is the best available estimate of when the current
+    # stage was entered.
+    PerformanceReview = apps.get_model("companies", "PerformanceReview")
+    PerformanceReview.objects.update(stage_changed_at=models.F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0003_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='performancereview',
+            name='stage_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_stage_changed_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='StageDurationBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('company_id', models.BigIntegerField()),
+                ('department_id', models.BigIntegerField()),
+                ('stage', models.CharField(max_length=20)),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('department_id', 'stage', 'bucket'), name='unique_stage_duration_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReviewStageTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('company_id', models.BigIntegerField()),
+                ('department_id', models.BigIntegerField()),
+                ('from_stage', models.CharField(blank=True, max_length=20)),
+                ('to_stage', models.CharField(max_length=20)),
+                ('transitioned_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('duration_seconds', models.FloatField(help_text='Time spent in from_stage', null=True)),
+                ('review', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='stage_transitions', to='companies.performancereview')),
+            ],
+            options={
+                'ordering': ['transitioned_at', 'id'],
+                'indexes': [models.Index(fields=['transitioned_at'], name='companies_r_transit_894087_idx'), models.Index(fields=['department_id', 'transitioned_at'], name='companies_r_departm_db3ba3_idx'), models.Index(fields=['review', 'transitioned_at'], name='companies_r_review__603189_idx')],
+            },
+        ),
+    ]
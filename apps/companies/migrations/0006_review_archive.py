@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_archive_table(apps, schema_editor):
+    model = apps.get_model("companies", "ArchivedPerformanceReview")
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.create_model(model)
+        return
+    # Range-partitioned by created_at; PostgreSQL requires the partition key
+    # in the primary key. Yearly partitions are added as rows are archived.
+    quote = schema_editor.quote_name
+    sql, params = schema_editor.table_sql(model)
+    sql = sql.replace(f"{quote('id')} bigint NOT NULL PRIMARY KEY", f"{quote('id')} bigint NOT NULL")
+    sql = (
+        f"{sql[:sql.rindex(')')]}, PRIMARY KEY ({quote('id')}, {quote('created_at')})) "
+        f"PARTITION BY RANGE ({quote('created_at')})"
+    )
+    schema_editor.execute(sql, params or None)
+    schema_editor.deferred_sql.extend(schema_editor._model_indexes_sql(model))
+
+
+def drop_archive_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model("companies", "ArchivedPerformanceReview"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0005_deletion_jobs'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ArchivedPerformanceReview',
+                    fields=[
+                        ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                        ('stage', models.CharField(choices=[('pending_review', 'Pending Review'), ('review_scheduled', 'Review Scheduled'), ('feedback_provided', 'Feedback Provided'), ('under_approval', 'Under Approval'), ('review_approved', 'Review Approved'), ('review_rejected', 'Review Rejected')], max_length=20)),
+                        ('review_date', models.DateField(blank=True, null=True)),
+                        ('feedback', models.TextField(blank=True)),
+                        ('rating', models.IntegerField(blank=True, null=True)),
+                        ('notes', models.TextField(blank=True)),
+                        ('stage_changed_at', models.DateTimeField()),
+                        ('created_at', models.DateTimeField()),
+                        ('updated_at', models.DateTimeField()),
+                        ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_reviews', to='companies.employee')),
+                        ('reviewer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_reviews_conducted', to='companies.employee')),
+                    ],
+                    options={
+                        'ordering': ['-created_at'],
+                        'indexes': [models.Index(fields=['created_at'], name='companies_a_created_07fa8c_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_archive_table, drop_archive_table),
+    ]
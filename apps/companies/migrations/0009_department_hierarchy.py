@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_existing_departments(apps, schema_editor):
+    # Every existing department is a root: it is only its own ancestor.
+    Department = apps.get_model("companies", "Department")
+    DepartmentClosure = apps.get_model("companies", "DepartmentClosure")
+    using = schema_editor.connection.alias
+    DepartmentClosure.objects.using(using).bulk_create(
+        DepartmentClosure(ancestor_id=pk, descendant_id=pk, depth=0)
+        for pk in Department.objects.using(using).values_list("pk", flat=True).iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0008_row_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='parent',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='children', to='companies.department'),
+        ),
+        migrations.CreateModel(
+            name='DepartmentClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='companies.department')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='companies.department')),
+            ],
+            options={
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(link_existing_departments, migrations.RunPython.noop),
+    ]
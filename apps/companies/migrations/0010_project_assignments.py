@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:40
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+PERIOD_INDEX = "companies_assignment_period_gist"
+
+
+def create_period_index(apps, schema_editor):
+    # Range overlap queries use a GiST index over the period; other
+    # databases make do with the endpoint indexes.
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {PERIOD_INDEX} ON companies_project_assigned_employees "
+        "USING gist (daterange(start_date, end_date, '[]'))"
+    )
+
+
+def drop_period_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {PERIOD_INDEX}")
+
+
+def date_existing_assignments(apps, schema_editor):
+    Project = apps.get_model("companies", "Project")
+    ProjectAssignment = apps.get_model("companies", "ProjectAssignment")
+    project = Project.objects.filter(pk=models.OuterRef("project_id"))
+    ProjectAssignment.objects.using(schema_editor.connection.alias).update(
+        start_date=models.Subquery(project.values("start_date")[:1]),
+        end_date=models.Subquery(project.values("end_date")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0009_department_hierarchy'),
+    ]
+
+    operations = [
+        # The auto-created many-to-many table becomes the through model as is.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ProjectAssignment',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='companies.employee')),
+                        ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='companies.project')),
+                    ],
+                    options={
+                        'db_table': 'companies_project_assigned_employees',
+                        'unique_together': {('project', 'employee')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='project',
+                    name='assigned_employees',
+                    field=models.ManyToManyField(blank=True, related_name='assigned_projects', through='companies.ProjectAssignment', to='companies.employee'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='projectassignment',
+            name='allocation',
+            field=models.PositiveSmallIntegerField(default=100, help_text="Percentage of the employee's time", validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(100)]),
+        ),
+        migrations.AddField(
+            model_name='projectassignment',
+            name='start_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='projectassignment',
+            name='end_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(date_existing_assignments, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='projectassignment',
+            index=models.Index(fields=['employee', 'start_date', 'end_date'], name='companies_p_employe_b7d908_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectassignment',
+            index=models.Index(fields=['start_date', 'end_date'], name='companies_p_start_d_248e7c_idx'),
+        ),
+        migrations.RunPython(create_period_index, drop_period_index),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_collaborations(apps, schema_editor):
+    # Same self-join as collaboration.rebuild(), over every project.
+    schema_editor.execute(
+        "INSERT INTO companies_collaboration (employee_id, colleague_id, shared_projects) "
+        "SELECT a.employee_id, b.employee_id, COUNT(*) "
+        "FROM companies_project_assigned_employees a "
+        "JOIN companies_project_assigned_employees b "
+        "ON b.project_id = a.project_id AND b.employee_id <> a.employee_id "
+        "GROUP BY a.employee_id, b.employee_id"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0010_project_assignments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Collaboration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shared_projects', models.IntegerField()),
+                ('colleague', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='companies.employee')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='collaborations', to='companies.employee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['employee', '-shared_projects'], name='companies_c_employe_ceccfe_idx')],
+                'unique_together': {('employee', 'colleague')},
+            },
+        ),
+        migrations.RunPython(backfill_collaborations, migrations.RunPython.noop),
+    ]
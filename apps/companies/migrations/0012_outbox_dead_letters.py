@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0011_collaborations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxevent',
+            name='dead_lettered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(condition=models.Q(('dead_lettered_at__isnull', True), ('delivered_at__isnull', True)), fields=['aggregate_type', 'aggregate_id', 'id'], name='outbox_pending_aggregate_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class AlterFieldOutsideShards(migrations.AlterField):
+    """
+    AlterField that leaves the schema of shard databases alone.
+
+    Users live in the directory database only, so on a shard a foreign key
+    to them would point at an empty table; there the column stays
+    unconstrained and the ShardRouter keeps the two in step.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if self.on_shard(schema_editor):
+            return
+        super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if self.on_shard(schema_editor):
+            return
+        super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    @staticmethod
+    def on_shard(schema_editor):
+        from apps.companies.sharding import get_sharding_settings
+
+        config = get_sharding_settings()
+        alias = schema_editor.connection.alias
+        return alias in config["SHARDS"] and alias != config["DIRECTORY"]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0012_outbox_dead_letters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AlterFieldOutsideShards(
+            model_name='employee',
+            name='user',
+            field=models.OneToOneField(on_delete=models.deletion.CASCADE, related_name='employee_profile', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
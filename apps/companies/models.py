@@ -1,12 +1,250 @@
 from django.db import models
-from django.db.models import Count
-from django.core.validators import MinValueValidator
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
 
 
-class Company(models.Model):
+def count_subquery(queryset, field):
+    """
+    Correlated COUNT(*) of ``queryset`` rows whose ``field`` points at the outer row.
+    """
+    counts = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+class JSONArrayAgg(models.Aggregate):
+    """
+    JSON array of an expression's values across the group.
+    """
+
+    function = "JSON_ARRAYAGG"
+    output_field = models.JSONField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function="JSON_GROUP_ARRAY", **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function="JSONB_AGG", **extra_context)
+
+
+def ids_subquery(queryset, field, id_field):
+    """
+    Correlated JSON array of the ``id_field`` values of ``queryset`` rows
+    whose ``field`` points at the outer row; NULL when there are none.
+    """
+    ids = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(ids=JSONArrayAgg(id_field))
+        .values("ids")
+    )
+    return Subquery(ids, output_field=models.JSONField())
+
+
+class LoadedValuesMixin:
+    """
+    Remember the column values an instance was loaded with, so saves can
+    tell which fields changed.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def loaded_value(self, attname, default=None):
+        loaded = getattr(self, "_loaded_values", {}).get(attname, default)
+        return default if loaded is models.DEFERRED else loaded
+
+    def changed_fields(self):
+        """
+        Attnames of the concrete fields set to a value other than the one
+        loaded; fields not loaded count as changed once set.
+        """
+        loaded = getattr(self, "_loaded_values", {})
+        return [
+            field.attname
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname in self.__dict__
+            and (
+                loaded.get(field.attname, models.DEFERRED) is models.DEFERRED
+                or loaded[field.attname] != getattr(self, field.attname)
+            )
+        ]
+
+    def refresh_loaded_values(self):
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+
+class VersionConflict(Exception):
+    """
+    A save expecting a version found the row at another one.
+    """
+
+
+class VersionedMixin:
+    """
+    Optimistic concurrency: every save that updates a row bumps its
+    ``version``, and with ``expected_version`` set the UPDATE also matches
+    on the version, so it leaves a row changed since it was read alone and
+    raises VersionConflict instead.
+    """
+
+    expected_version = None
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        previous = self.version
+        self.version = previous + 1
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self.version = previous
+            raise
+        self.expected_version = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        if self.expected_version is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if not super()._do_update(
+            base_qs.filter(version=self.expected_version),
+            using,
+            pk_val,
+            values,
+            update_fields,
+            forced_update,
+        ):
+            raise VersionConflict(
+                f"{self._meta.label} #{pk_val} is no longer at version {self.expected_version}"
+            )
+        return True
+
+    def claim_version(self):
+        """
+        Bump only the version of a row still at ``expected_version``, for
+        changes to related rows; raises VersionConflict if it moved on.
+        """
+        expected = self.expected_version
+        claimed = (
+            type(self)
+            ._base_manager.using(self._state.db)
+            .filter(pk=self.pk, version=expected)
+            .update(version=F("version") + 1)
+        )
+        if not claimed:
+            raise VersionConflict(
+                f"{self._meta.label} #{self.pk} is no longer at version {expected}"
+            )
+        self.version = expected + 1
+        self.expected_version = None
+
+
+class CompanyQuerySet(models.QuerySet):
+    def with_counts(self):
+        return self.annotate(
+            departments_count=count_subquery(Department.objects.all(), "company"),
+            employees_count=count_subquery(Employee.objects.all(), "company"),
+            projects_count=count_subquery(Project.objects.all(), "company"),
+        )
+
+
+class DepartmentQuerySet(models.QuerySet):
+    def with_counts(self):
+        return self.annotate(
+            employees_count=count_subquery(Employee.objects.all(), "department"),
+            projects_count=count_subquery(Project.objects.all(), "department"),
+        )
+
+
+class ProjectQuerySet(models.QuerySet):
+    def with_counts(self):
+        return self.annotate(
+            assigned_employees_count=count_subquery(ProjectAssignment.objects.all(), "project"),
+        )
+
+    def with_assigned_ids(self):
+        """
+        Annotate the assigned employee ids, so serializing them costs no
+        query of its own.
+        """
+        return self.annotate(
+            assigned_employee_ids=ids_subquery(
+                ProjectAssignment.objects.all(), "project", "employee_id"
+            ),
+        )
+
+
+class PeriodOverlaps(models.Func):
+    """
+    Whether the inclusive ``start_date``/``end_date`` period of a row
+    intersects ``[start, end]``.
+
+    On PostgreSQL it is ``daterange && daterange``, which the GiST index on
+    the assignment period answers; elsewhere it compares the endpoints,
+    which the (start_date, end_date) indexes narrow.
+    """
+
+    output_field = models.BooleanField()
+
+    def __init__(self, start, end):
+        super().__init__(
+            models.F("start_date"),
+            models.F("end_date"),
+            models.Value(start, output_field=models.DateField()),
+            models.Value(end, output_field=models.DateField()),
+        )
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (start, start_params), (end, end_params), (low, low_params), (high, high_params) = [
+            compiler.compile(expression) for expression in self.get_source_expressions()
+        ]
+        return (
+            f"({start} <= {high} AND {end} >= {low})",
+            [*start_params, *high_params, *end_params, *low_params],
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        sqls, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            sqls.append(sql)
+            params.extend(expression_params)
+        start, end, low, high = sqls
+        return f"daterange({start}, {end}, '[]') && daterange({low}, {high}, '[]')", params
+
+
+class ProjectAssignmentQuerySet(models.QuerySet):
+    def overlapping(self, start, end):
+        """
+        Assignments active on any day from ``start`` to ``end`` inclusive.
+        """
+        return self.filter(PeriodOverlaps(start, end))
+
+
+class Company(VersionedMixin, models.Model):
     name = models.CharField(max_length=255, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = CompanyQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = "Companies"
@@ -17,50 +255,100 @@ class Company(models.Model):
 
     @property
     def number_of_departments(self):
+        if hasattr(self, "departments_count"):
+            return self.departments_count
         return self.departments.count()
 
     @property
     def number_of_employees(self):
+        if hasattr(self, "employees_count"):
+            return self.employees_count
         return self.employees.count()
 
     @property
     def number_of_projects(self):
+        if hasattr(self, "projects_count"):
+            return self.projects_count
         return self.projects.count()
 
 
-class Department(models.Model):
+class Department(LoadedValuesMixin, VersionedMixin, models.Model):
     company = models.ForeignKey(
         Company, on_delete=models.CASCADE, related_name="departments"
     )
+    # Children of a deleted department move up to its parent (see
+    # hierarchy.detach), so the database does not cascade or check this.
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="children",
+    )
     name = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = DepartmentQuerySet.as_manager()
 
     class Meta:
         unique_together = ["company", "name"]
         ordering = ["company", "name"]
+        indexes = [models.Index(fields=["updated_at", "id"])]
 
     def __str__(self):
         return f"{self.company.name} - {self.name}"
 
     @property
     def number_of_employees(self):
+        if hasattr(self, "employees_count"):
+            return self.employees_count
         return self.employees.count()
 
     @property
     def number_of_projects(self):
+        if hasattr(self, "projects_count"):
+            return self.projects_count
         return self.projects.count()
 
 
-class Employee(models.Model):
+class DepartmentClosure(models.Model):
+    """
+    One row per (ancestor, descendant) pair of the department hierarchy,
+    each department being its own ancestor at depth 0.
+    """
+
+    ancestor = models.ForeignKey(
+        Department, on_delete=models.CASCADE, related_name="descendant_links"
+    )
+    descendant = models.ForeignKey(
+        Department, on_delete=models.CASCADE, related_name="ancestor_links"
+    )
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ["ancestor", "descendant"]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
+class Employee(LoadedValuesMixin, VersionedMixin, models.Model):
     company = models.ForeignKey(
         Company, on_delete=models.CASCADE, related_name="employees"
     )
     department = models.ForeignKey(
         Department, on_delete=models.CASCADE, related_name="employees"
     )
+    # Users stay in the directory database while employees may live on a
+    # shard; the constraint is only created in the directory (see
+    # migration 0013).
     user = models.OneToOneField(
-        "accounts.User", on_delete=models.CASCADE, related_name="employee_profile"
+        "accounts.User",
+        on_delete=models.CASCADE,
+        related_name="employee_profile",
     )
     name = models.CharField(max_length=255)
     email = models.EmailField(unique=True)
@@ -70,9 +358,11 @@ class Employee(models.Model):
     hired_on = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         ordering = ["company", "department", "name"]
+        indexes = [models.Index(fields=["updated_at", "id"])]
 
     def __str__(self):
         return f"{self.name} - {self.designation}"
@@ -86,7 +376,7 @@ class Employee(models.Model):
         return None
 
 
-class Project(models.Model):
+class Project(LoadedValuesMixin, VersionedMixin, models.Model):
     company = models.ForeignKey(
         Company, on_delete=models.CASCADE, related_name="projects"
     )
@@ -98,13 +388,17 @@ class Project(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     assigned_employees = models.ManyToManyField(
-        Employee, related_name="assigned_projects", blank=True
+        Employee, through="ProjectAssignment", related_name="assigned_projects", blank=True
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = ProjectQuerySet.as_manager()
 
     class Meta:
         ordering = ["company", "department", "start_date"]
+        indexes = [models.Index(fields=["updated_at", "id"])]
 
     def __str__(self):
         return f"{self.name} - {self.company.name}"
@@ -116,7 +410,73 @@ class Project(models.Model):
             raise ValidationError("End date must be after start date")
 
 
-class PerformanceReview(models.Model):
+class ProjectAssignment(LoadedValuesMixin, models.Model):
+    """
+    An employee staffed on a project for a share of their time, from
+    ``start_date`` to ``end_date`` inclusive. Assignments added through
+    ``Project.assigned_employees`` take the project's dates.
+    """
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="assignments")
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name="assignments")
+    allocation = models.PositiveSmallIntegerField(
+        default=100,
+        validators=[MinValueValidator(1), MaxValueValidator(100)],
+        help_text="Percentage of the employee's time",
+    )
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+
+    objects = ProjectAssignmentQuerySet.as_manager()
+
+    class Meta:
+        # The table of the former auto-created many-to-many.
+        db_table = "companies_project_assigned_employees"
+        unique_together = ["project", "employee"]
+        indexes = [
+            models.Index(fields=["employee", "start_date", "end_date"]),
+            models.Index(fields=["start_date", "end_date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id} on {self.project_id} ({self.allocation}%)"
+
+    def save(self, *args, **kwargs):
+        if self.start_date is None:
+            self.start_date = self.project.start_date
+        if self.end_date is None:
+            self.end_date = self.project.end_date
+        super().save(*args, **kwargs)
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+
+        if self.start_date and self.end_date and self.start_date > self.end_date:
+            raise ValidationError("End date must be after start date")
+
+
+class Collaboration(models.Model):
+    """
+    Co-assignment edge: ``employee`` and ``colleague`` are both assigned to
+    ``shared_projects`` projects. Every edge is stored in both directions,
+    so an employee's collaborators are one index range.
+    """
+
+    employee = models.ForeignKey(
+        Employee, on_delete=models.CASCADE, related_name="collaborations"
+    )
+    colleague = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name="+")
+    shared_projects = models.IntegerField()
+
+    class Meta:
+        unique_together = ["employee", "colleague"]
+        indexes = [models.Index(fields=["employee", "-shared_projects"])]
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.colleague_id} ({self.shared_projects})"
+
+
+class PerformanceReview(LoadedValuesMixin, VersionedMixin, models.Model):
     STAGE_CHOICES = [
         ("pending_review", "Pending Review"),
         ("review_scheduled", "Review Scheduled"),
@@ -126,6 +486,15 @@ class PerformanceReview(models.Model):
         ("review_rejected", "Review Rejected"),
     ]
 
+    TRANSITIONS = {
+        "pending_review": ["review_scheduled"],
+        "review_scheduled": ["feedback_provided"],
+        "feedback_provided": ["under_approval"],
+        "under_approval": ["review_approved", "review_rejected"],
+        "review_rejected": ["feedback_provided"],
+        "review_approved": [],
+    }
+
     employee = models.ForeignKey(
         Employee, on_delete=models.CASCADE, related_name="performance_reviews"
     )
@@ -148,23 +517,287 @@ class PerformanceReview(models.Model):
         help_text="Rating from 1-5",
     )
     notes = models.TextField(blank=True)
+    stage_changed_at = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["updated_at", "id"])]
+
+    # True on instances built from the archive tier.
+    is_archived = False
 
     def __str__(self):
         return f"Performance Review - {self.employee.name} ({self.get_stage_display()})"
 
+    def save(self, *args, **kwargs):
+        if self.pk is not None and self.loaded_value("stage") not in (None, self.stage):
+            self.stage_changed_at = timezone.now()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "stage_changed_at"}
+        super().save(*args, **kwargs)
+
     def can_transition_to(self, new_stage):
         """Check if transition to new stage is allowed"""
-        transitions = {
-            "pending_review": ["review_scheduled"],
-            "review_scheduled": ["feedback_provided"],
-            "feedback_provided": ["under_approval"],
-            "under_approval": ["review_approved", "review_rejected"],
-            "review_rejected": ["feedback_provided"],
-            "review_approved": [],
-        }
-        return new_stage in transitions.get(self.stage, [])
+        return new_stage in self.TRANSITIONS.get(self.stage, [])
+
+    @classmethod
+    def stages_transitioning_to(cls, new_stage):
+        """Return the stages from which a review may move to new_stage"""
+        return [stage for stage, targets in cls.TRANSITIONS.items() if new_stage in targets]
+
+
+class ArchivedPerformanceReview(models.Model):
+    """
+    Cold tier of PerformanceReview.
+
+    Approved and rejected reviews created before the archive horizon are
+    moved here by ``archive_reviews`` under their original ids, keeping the
+    hot table down to the working set. Read-only through the API. On
+    PostgreSQL the table is range-partitioned by year of ``created_at``.
+    """
+
+    STAGES = ("review_approved", "review_rejected")
+
+    id = models.BigIntegerField(primary_key=True)
+    employee = models.ForeignKey(
+        Employee, on_delete=models.CASCADE, related_name="archived_reviews"
+    )
+    reviewer = models.ForeignKey(
+        Employee,
+        on_delete=models.CASCADE,
+        related_name="archived_reviews_conducted",
+        null=True,
+        blank=True,
+    )
+    stage = models.CharField(max_length=20, choices=PerformanceReview.STAGE_CHOICES)
+    review_date = models.DateField(null=True, blank=True)
+    feedback = models.TextField(blank=True)
+    rating = models.IntegerField(null=True, blank=True)
+    notes = models.TextField(blank=True)
+    stage_changed_at = models.DateTimeField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    version = models.PositiveIntegerField(default=1)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["created_at"])]
+
+    def __str__(self):
+        return f"Archived Performance Review #{self.pk} ({self.get_stage_display()})"
+
+    def to_review(self):
+        """
+        The review as a PerformanceReview instance, for code and
+        serializers shared with the hot tier.
+        """
+        review = PerformanceReview(
+            **{
+                field.attname: getattr(self, field.attname)
+                for field in PerformanceReview._meta.concrete_fields
+            }
+        )
+        review._state.adding = False
+        review._state.db = self._state.db
+        for name in ("employee", "reviewer"):
+            descriptor = getattr(type(self), name)
+            if descriptor.is_cached(self):
+                setattr(review, name, getattr(self, name))
+        if "employee_department_id" in self.__dict__:
+            review.employee_department_id = self.employee_department_id
+        review.is_archived = True
+        return review
+
+
+class ReviewStageTransition(models.Model):
+    """
+    Append-only history of review stage changes.
+
+    Outlives the review it describes, so the FK has no database constraint,
+    and carries the review's company and department at the time for
+    per-department reporting.
+    """
+
+    review = models.ForeignKey(
+        PerformanceReview,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name="stage_transitions",
+    )
+    company_id = models.BigIntegerField()
+    department_id = models.BigIntegerField()
+    from_stage = models.CharField(max_length=20, blank=True)
+    to_stage = models.CharField(max_length=20)
+    transitioned_at = models.DateTimeField(default=timezone.now)
+    duration_seconds = models.FloatField(
+        null=True, help_text="Time spent in from_stage"
+    )
+
+    class Meta:
+        ordering = ["transitioned_at", "id"]
+        indexes = [
+            models.Index(fields=["transitioned_at"]),
+            models.Index(fields=["department_id", "transitioned_at"]),
+            models.Index(fields=["review", "transitioned_at"]),
+        ]
+
+    def __str__(self):
+        return f"Review #{self.review_id}: {self.from_stage or '-'} -> {self.to_stage}"
+
+
+class StageDurationBucket(models.Model):
+    """
+    Histogram of time spent in each stage per department, incremented as
+    reviews leave the stage.
+    """
+
+    company_id = models.BigIntegerField()
+    department_id = models.BigIntegerField()
+    stage = models.CharField(max_length=20)
+    bucket = models.PositiveSmallIntegerField()
+    count = models.PositiveBigIntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["department_id", "stage", "bucket"],
+                name="unique_stage_duration_bucket",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.stage} bucket {self.bucket}: {self.count}"
+
+
+class Tombstone(models.Model):
+    """
+    Compact record of a deleted row, so incremental sync can report deletes.
+
+    Holds only the ids needed to scope it by role; no FKs, because the
+    company or department may be deleted in the same cascade.
+    """
+
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    company_id = models.BigIntegerField(null=True)
+    department_id = models.BigIntegerField(null=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["model", "deleted_at", "id"])]
+
+    def __str__(self):
+        return f"Deleted {self.model} #{self.object_id}"
+
+
+class OutboxEvent(models.Model):
+    """
+    Domain event written in the same transaction as the change it describes
+    and delivered asynchronously by the outbox dispatcher.
+    """
+
+    aggregate_type = models.CharField(max_length=50)
+    aggregate_id = models.BigIntegerField()
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    # Set once delivery has failed OUTBOX["MAX_ATTEMPTS"] times; the event
+    # is no longer retried.
+    dead_lettered_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(delivered_at__isnull=True),
+                name="outbox_pending_idx",
+            ),
+            # Finds the oldest pending event of each aggregate.
+            models.Index(
+                fields=["aggregate_type", "aggregate_id", "id"],
+                condition=models.Q(delivered_at__isnull=True, dead_lettered_at__isnull=True),
+                name="outbox_pending_aggregate_idx",
+            ),
+            models.Index(fields=["delivered_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.aggregate_id}"
+
+
+class DeletionJob(models.Model):
+    """
+    Background deletion of a company or department and everything under it.
+    """
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+    TARGET_CHOICES = [("company", "Company"), ("department", "Department")]
+
+    target_type = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    target_id = models.BigIntegerField()
+    target_name = models.CharField(max_length=255)
+    company_id = models.BigIntegerField()
+    requested_by = models.ForeignKey(
+        "accounts.User",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    totals = models.JSONField(default=dict, help_text="Rows to delete per step")
+    deleted = models.JSONField(default=dict, help_text="Rows deleted so far per step")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"Delete {self.target_type} {self.target_name} ({self.status})"
+
+    @property
+    def progress(self):
+        if self.status == "completed":
+            return 1.0
+        total = sum(self.totals.values())
+        return min(sum(self.deleted.values()) / total, 1.0) if total else 0.0
+
+
+class CompanyShard(models.Model):
+    """
+    Shard map entry: the database alias holding a company's rows.
+
+    Stored in the directory database only; companies without an entry
+    live in the directory database itself.
+    """
+
+    company_id = models.BigIntegerField(unique=True)
+    database = models.CharField(max_length=100)
+    moving = models.BooleanField(
+        default=False, help_text="Writes are refused while the company is copied"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Company #{self.company_id} on {self.database}"
@@ -0,0 +1,239 @@
+import hashlib
+import hmac
+import json
+import logging
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTBOX_SETTINGS = {
+    "SINK": "apps.companies.outbox.LoggingSink",
+    "SINK_OPTIONS": {},
+    "BATCH_SIZE": 100,
+    "POLL_INTERVAL": 1.0,
+    "LEASE_SECONDS": 60,
+    "MAX_BACKOFF_SECONDS": 3600,
+    # Failed deliveries after which an event is dead-lettered; later events
+    # of its aggregate then go ahead without it.
+    "MAX_ATTEMPTS": 15,
+    "RETENTION_DAYS": 7,
+}
+
+REVIEW_STAGE_CHANGED = "performance_review.stage_changed"
+EMPLOYEE_DEPARTMENT_CHANGED = "employee.department_changed"
+
+
+def get_outbox_settings():
+    return {**DEFAULT_OUTBOX_SETTINGS, **getattr(settings, "OUTBOX", {})}
+
+
+def review_stage_changed(review_id, from_stage, to_stage, employee_id,
+                         company_id, department_id, reviewer_id):
+    return OutboxEvent(
+        aggregate_type="performance_review",
+        aggregate_id=review_id,
+        event_type=REVIEW_STAGE_CHANGED,
+        payload={
+            "review_id": review_id,
+            "employee_id": employee_id,
+            "company_id": company_id,
+            "department_id": department_id,
+            "reviewer_id": reviewer_id,
+            "from_stage": from_stage,
+            "to_stage": to_stage,
+        },
+    )
+
+
+def employee_department_changed(employee, from_department_id):
+    return OutboxEvent(
+        aggregate_type="employee",
+        aggregate_id=employee.pk,
+        event_type=EMPLOYEE_DEPARTMENT_CHANGED,
+        payload={
+            "employee_id": employee.pk,
+            "user_id": employee.user_id,
+            "company_id": employee.company_id,
+            "from_department_id": from_department_id,
+            "to_department_id": employee.department_id,
+        },
+    )
+
+
+def serialize_event(event):
+    return {
+        "id": event.pk,
+        "type": event.event_type,
+        "aggregate_type": event.aggregate_type,
+        "aggregate_id": event.aggregate_id,
+        "occurred_at": event.created_at,
+        "data": event.payload,
+    }
+
+
+class LoggingSink:
+    """
+    Write events to the log; the default when no webhook is configured.
+    """
+
+    def send(self, events):
+        for event in events:
+            logger.info("outbox event %s", json.dumps(event, cls=DjangoJSONEncoder))
+
+
+class WebhookSink:
+    """
+    POST each batch as ``{"events": [...]}`` to ``url``.
+
+    With a ``secret``, the body is signed as ``X-Talentum-Signature:
+    sha256=<hex hmac>``. Any non-2xx response fails the whole batch.
+    """
+
+    def __init__(self, url, secret=None, timeout=10):
+        self.url = url
+        self.secret = secret
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send(self, events):
+        body = json.dumps({"events": events}, cls=DjangoJSONEncoder).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.secret:
+            digest = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+            headers["X-Talentum-Signature"] = f"sha256={digest}"
+        response = self.session.post(
+            self.url, data=body, headers=headers, timeout=self.timeout
+        )
+        response.raise_for_status()
+
+
+def get_sink():
+    conf = get_outbox_settings()
+    return import_string(conf["SINK"])(**conf["SINK_OPTIONS"])
+
+
+class OutboxDispatcher:
+    """
+    Drain pending outbox events to a sink in batches.
+
+    Events for the same aggregate are delivered in id order. Only the
+    oldest pending event of an aggregate (its head) can open a claim, and
+    the claim locks it; later events of that aggregate join the batch
+    behind it but are never claimed on their own, so a dispatcher that
+    skips a head locked or leased by another never overtakes it. A failed
+    batch is retried as a whole with exponential backoff, and an event
+    still failing after ``MAX_ATTEMPTS`` is dead-lettered. Claiming pushes
+    ``next_attempt_at`` out by a lease, so several dispatchers can run side
+    by side without double delivery.
+    """
+
+    def __init__(self, sink=None, batch_size=None):
+        self.conf = get_outbox_settings()
+        self.sink = sink or get_sink()
+        self.batch_size = batch_size or self.conf["BATCH_SIZE"]
+
+    def claim(self):
+        now = timezone.now()
+        pending = OutboxEvent.objects.filter(
+            delivered_at__isnull=True, dead_lettered_at__isnull=True
+        )
+        with transaction.atomic(using=router.db_for_write(OutboxEvent)):
+            earlier = pending.filter(
+                aggregate_type=OuterRef("aggregate_type"),
+                aggregate_id=OuterRef("aggregate_id"),
+                id__lt=OuterRef("id"),
+            )
+            heads = list(
+                pending.filter(next_attempt_at__lte=now)
+                .exclude(Exists(earlier))
+                .select_for_update(skip_locked=True)
+                .order_by("id")[: self.batch_size]
+            )
+            batch = list(heads)
+            if heads and len(batch) < self.batch_size:
+                # Later events of the claimed aggregates, in order, up to
+                # the first one that is not due.
+                aggregates = {(event.aggregate_type, event.aggregate_id) for event in heads}
+                stopped = set()
+                followers = pending.filter(
+                    aggregate_id__in={aggregate_id for _, aggregate_id in aggregates},
+                    id__gt=min(event.pk for event in heads),
+                ).exclude(pk__in=[event.pk for event in heads]).order_by("id")
+                for event in followers.iterator(chunk_size=self.batch_size):
+                    aggregate = (event.aggregate_type, event.aggregate_id)
+                    if aggregate not in aggregates or aggregate in stopped:
+                        continue
+                    if event.next_attempt_at > now:
+                        stopped.add(aggregate)
+                        continue
+                    batch.append(event)
+                    if len(batch) == self.batch_size:
+                        break
+                batch.sort(key=lambda event: event.pk)
+            if batch:
+                OutboxEvent.objects.filter(pk__in=[e.pk for e in batch]).update(
+                    next_attempt_at=now + timedelta(seconds=self.conf["LEASE_SECONDS"])
+                )
+        return batch
+
+    def backoff(self, attempts):
+        return min(2 ** attempts, self.conf["MAX_BACKOFF_SECONDS"])
+
+    def dispatch_batch(self):
+        """
+        Deliver one batch; returns the number of events delivered.
+        """
+        batch = self.claim()
+        if not batch:
+            return 0
+
+        ids = [event.pk for event in batch]
+        try:
+            self.sink.send([serialize_event(event) for event in batch])
+        except Exception as e:
+            attempts = max(event.attempts for event in batch) + 1
+            logger.warning(
+                "Outbox delivery of %d event(s) failed (attempt %d): %s",
+                len(batch), attempts, e,
+            )
+            now = timezone.now()
+            OutboxEvent.objects.filter(pk__in=ids).update(
+                attempts=attempts,
+                next_attempt_at=now + timedelta(seconds=self.backoff(attempts)),
+                last_error=str(e)[:2000],
+                dead_lettered_at=now if attempts >= self.conf["MAX_ATTEMPTS"] else None,
+            )
+            if attempts >= self.conf["MAX_ATTEMPTS"]:
+                logger.error(
+                    "Outbox event(s) %s dead-lettered after %d attempts", ids, attempts
+                )
+            return 0
+
+        OutboxEvent.objects.filter(pk__in=ids).update(
+            delivered_at=timezone.now(), last_error=""
+        )
+        return len(batch)
+
+    def drain(self):
+        """
+        Deliver until nothing is due; returns the number of events delivered.
+        """
+        total = 0
+        while delivered := self.dispatch_batch():
+            total += delivered
+        return total
+
+    def purge(self):
+        cutoff = timezone.now() - timedelta(days=self.conf["RETENTION_DAYS"])
+        deleted, _ = OutboxEvent.objects.filter(delivered_at__lt=cutoff).delete()
+        return deleted
@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from .access import get_access_context
+
 
 class IsAdminUser(permissions.BasePermission):
     """
@@ -76,8 +78,9 @@ class CompanyPermission(permissions.BasePermission):
             if request.user.role == 'manager':
                 return True
             # Employees can only read their own company
-            if hasattr(request.user, 'employee_profile'):
-                return obj == request.user.employee_profile.company
+            context = get_access_context(request.user)
+            if context.has_profile:
+                return obj.pk == context.company_id
         
         return False
 
@@ -86,7 +89,8 @@ class DepartmentPermission(permissions.BasePermission):
     """
     Department permissions:
     - Admin: Full access
-    - Manager: Read access to all, write access to their department
+    - Manager: Read access to all, write access to their department and
+      the departments below it
     - Employee: Read access to their department only
     """
     def has_permission(self, request, view):
@@ -108,17 +112,19 @@ class DepartmentPermission(permissions.BasePermission):
         if request.user.role == 'admin':
             return True
         
+        context = get_access_context(request.user)
+
         if request.method in permissions.SAFE_METHODS:
             # Managers can read all departments
             if request.user.role == 'manager':
                 return True
             # Employees can only read their own department
-            if hasattr(request.user, 'employee_profile'):
-                return obj == request.user.employee_profile.department
+            if context.has_profile:
+                return obj.pk == context.department_id
         
-        # Managers can modify their own department
-        if request.user.role == 'manager' and hasattr(request.user, 'employee_profile'):
-            return obj == request.user.employee_profile.department
+        # Managers can modify their own department and the ones below it
+        if request.user.role == 'manager' and context.has_profile:
+            return context.manages(obj.pk)
         
         return False
 
@@ -127,7 +133,7 @@ class EmployeePermission(permissions.BasePermission):
     """
     Employee permissions:
     - Admin: Full access
-    - Manager: Read access to all, write access to their department employees
+    - Manager: Read access to all, write access to employees in their department's subtree
     - Employee: Read/write access to their own profile only
     """
     def has_permission(self, request, view):
@@ -151,11 +157,12 @@ class EmployeePermission(permissions.BasePermission):
         
         # Employees can only access their own profile
         if request.user.role == 'employee':
-            return obj.user == request.user
+            return obj.user_id == request.user.pk
         
-        # Managers can access employees in their department
-        if request.user.role == 'manager' and hasattr(request.user, 'employee_profile'):
-            return obj.department == request.user.employee_profile.department
+        # Managers can access employees in their department and below it
+        context = get_access_context(request.user)
+        if request.user.role == 'manager' and context.has_profile:
+            return context.manages(obj.department_id)
         
         return False
 
@@ -164,7 +171,7 @@ class ProjectPermission(permissions.BasePermission):
     """
     Project permissions:
     - Admin: Full access
-    - Manager: Read access to all, write access to their department projects
+    - Manager: Read access to all, write access to projects in their department's subtree
     - Employee: Read access to assigned projects, write access to their own projects
     """
     def has_permission(self, request, view):
@@ -186,16 +193,21 @@ class ProjectPermission(permissions.BasePermission):
         if request.user.role == 'admin':
             return True
         
+        context = get_access_context(request.user)
+
         # Employees can read assigned projects and modify their own
-        if request.user.role == 'employee' and hasattr(request.user, 'employee_profile'):
+        if request.user.role == 'employee' and context.has_profile:
             if request.method in permissions.SAFE_METHODS:
-                return obj in request.user.employee_profile.assigned_projects.all()
+                # Uses the assigned ids annotated by the detail queryset
+                if 'assigned_employee_ids' in obj.__dict__:
+                    return context.employee_id in (obj.assigned_employee_ids or [])
+                return obj.assigned_employees.filter(pk=context.employee_id).exists()
             # Can only modify if they created it (assuming created_by field exists)
-            return hasattr(obj, 'created_by') and obj.created_by == request.user.employee_profile
+            return getattr(obj, 'created_by_id', None) == context.employee_id
         
-        # Managers can access projects in their department
-        if request.user.role == 'manager' and hasattr(request.user, 'employee_profile'):
-            return obj.department == request.user.employee_profile.department
+        # Managers can access projects in their department and below it
+        if request.user.role == 'manager' and context.has_profile:
+            return context.manages(obj.department_id)
         
         return False
 
@@ -204,7 +216,7 @@ class PerformanceReviewPermission(permissions.BasePermission):
     """
     Performance Review permissions:
     - Admin: Full access
-    - Manager: Read access to all, write access to their department reviews
+    - Manager: Read access to all, write access to reviews in their department's subtree
     - Employee: Read access to their own reviews only
     """
     def has_permission(self, request, view):
@@ -226,12 +238,60 @@ class PerformanceReviewPermission(permissions.BasePermission):
         if request.user.role == 'admin':
             return True
         
+        context = get_access_context(request.user)
+
         # Employees can only access their own reviews
         if request.user.role == 'employee':
-            return obj.employee.user == request.user
+            return context.has_profile and obj.employee_id == context.employee_id
         
-        # Managers can access reviews in their department
-        if request.user.role == 'manager' and hasattr(request.user, 'employee_profile'):
-            return obj.employee.department == request.user.employee_profile.department
+        # Managers can access reviews in their department and below it
+        # (the review querysets annotate the employee's department id)
+        if request.user.role == 'manager' and context.has_profile:
+            return context.manages(obj.employee_department_id)
         
         return False
+
+
+class ProjectAssignmentPermission(permissions.BasePermission):
+    """
+    Project assignment permissions:
+    - Admin: Full access
+    - Manager: Read access, write access to projects in their department's subtree
+    - Employee: Read access
+    """
+    def has_permission(self, request, view):
+        if not request.user.is_authenticated:
+            return False
+
+        if request.method in permissions.SAFE_METHODS:
+            return True
+
+        return request.user.role in ['admin', 'manager']
+
+    def has_object_permission(self, request, view, obj):
+        # obj is an assignment, or the project an assignment is added to
+        if request.method in permissions.SAFE_METHODS or request.user.role == 'admin':
+            return True
+
+        context = get_access_context(request.user)
+        if request.user.role == 'manager' and context.has_profile:
+            return context.manages(getattr(obj, 'project', obj).department_id)
+
+        return False
+
+
+class StaffingPermission(permissions.BasePermission):
+    """
+    Staffing and collaboration reports of a department:
+    - Admin: Every department
+    - Manager: Their department and the departments below it
+    """
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role in ['admin', 'manager']
+
+    def has_object_permission(self, request, view, obj):
+        if request.user.role == 'admin':
+            return True
+
+        context = get_access_context(request.user)
+        return context.has_profile and context.manages(obj.pk)
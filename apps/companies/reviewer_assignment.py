@@ -0,0 +1,168 @@
+"""
+Automatic reviewer assignment: every unassigned open review goes to the
+least loaded eligible reviewer.
+
+Reviewers are managers and admins. Those of the reviewed employee's own
+department are preferred; when it has none other than the employee, the
+nearest department above it that has one is used. Load is the number of
+open reviews a reviewer conducts, weighted by stage and read with one
+aggregate query; results are written with one UPDATE per reviewer.
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from apps.core.cache import bump_versions
+
+from .models import DepartmentClosure, Employee, PerformanceReview
+
+DEFAULT_REVIEWER_ASSIGNMENT_SETTINGS = {
+    # Load each review in these stages puts on its reviewer; reviews in
+    # them are the ones assigned.
+    "STAGE_WEIGHTS": {
+        "pending_review": 1,
+        "review_scheduled": 1,
+        "feedback_provided": 1,
+        "under_approval": 1,
+        "review_rejected": 1,
+    },
+    "ROLES": ("manager", "admin"),
+    # Reviews updated per statement.
+    "BATCH_SIZE": 1000,
+}
+
+
+def get_reviewer_assignment_settings():
+    return {
+        **DEFAULT_REVIEWER_ASSIGNMENT_SETTINGS,
+        **getattr(settings, "REVIEWER_ASSIGNMENT", {}),
+    }
+
+
+def _reviewer_levels(department_ids, roles):
+    """
+    Eligible reviewers of each department, nearest department first:
+    ``{department_id: [[reviewer_id, ...], ...]}``.
+    """
+    paths = list(
+        DepartmentClosure.objects.filter(descendant_id__in=department_ids).values_list(
+            "descendant_id", "ancestor_id", "depth"
+        )
+    )
+    employees = defaultdict(list)
+    users = {}
+    for pk, user_id, department_id in Employee.objects.filter(
+        department_id__in={ancestor_id for _, ancestor_id, _ in paths}
+    ).values_list("pk", "user_id", "department_id"):
+        employees[department_id].append(pk)
+        users[pk] = user_id
+    # Users live in the directory database, so roles are a second query.
+    reviewers = set(
+        get_user_model()
+        .objects.filter(pk__in=users.values(), role__in=roles)
+        .values_list("pk", flat=True)
+    )
+
+    levels = defaultdict(list)
+    for descendant_id, ancestor_id, _ in sorted(paths, key=lambda path: path[2]):
+        level = sorted(pk for pk in employees[ancestor_id] if users[pk] in reviewers)
+        if level:
+            levels[descendant_id].append(level)
+    return levels
+
+
+def current_load(reviewer_ids, weights):
+    """
+    Weighted count of the open reviews each reviewer conducts.
+    """
+    load = Counter()
+    for row in (
+        PerformanceReview.objects.filter(reviewer_id__in=reviewer_ids, stage__in=weights)
+        .values("reviewer_id", "stage")
+        .annotate(reviews=Count("pk"))
+        .order_by()
+    ):
+        load[row["reviewer_id"]] += row["reviews"] * weights[row["stage"]]
+    return load
+
+
+def plan_assignments(reviews):
+    """
+    Pick reviewers for the unassigned open reviews in ``reviews``.
+
+    Returns ``(assignments, load, unassignable)``: ``(review_id,
+    employee_id)`` pairs by reviewer, the load of every reviewer considered
+    before assignment, and the number of reviews with no eligible reviewer.
+    """
+    options = get_reviewer_assignment_settings()
+    weights = options["STAGE_WEIGHTS"]
+    pending = list(
+        reviews.filter(reviewer__isnull=True, stage__in=weights)
+        .order_by("pk")
+        .values_list("pk", "employee_id", "employee__department_id", "stage")
+    )
+    levels = _reviewer_levels({row[2] for row in pending}, options["ROLES"])
+    reviewer_ids = {pk for department in levels.values() for level in department for pk in level}
+    load = current_load(reviewer_ids, weights)
+    before = {pk: load[pk] for pk in reviewer_ids}
+
+    assignments = defaultdict(list)
+    unassignable = 0
+    for pk, employee_id, department_id, stage in pending:
+        for level in levels[department_id]:
+            candidates = [reviewer for reviewer in level if reviewer != employee_id]
+            if candidates:
+                reviewer = min(candidates, key=lambda candidate: (load[candidate], candidate))
+                assignments[reviewer].append((pk, employee_id))
+                load[reviewer] += weights[stage]
+                break
+        else:
+            unassignable += 1
+    return assignments, before, unassignable
+
+
+def assign_reviewers(reviews, dry_run=False):
+    """
+    Assign reviewers to the unassigned open reviews in ``reviews``.
+
+    Reviews given a reviewer since they were read are left alone. Returns
+    a summary of the assignment; with ``dry_run`` nothing is written.
+    """
+    using = router.db_for_write(PerformanceReview)
+    batch_size = get_reviewer_assignment_settings()["BATCH_SIZE"]
+    with transaction.atomic(using=using):
+        assignments, before, unassignable = plan_assignments(reviews)
+        assigned = 0
+        if not dry_run:
+            now = timezone.now()
+            for reviewer_id, rows in assignments.items():
+                for start in range(0, len(rows), batch_size):
+                    assigned += PerformanceReview.objects.filter(
+                        pk__in=[pk for pk, _ in rows[start:start + batch_size]],
+                        reviewer__isnull=True,
+                    ).update(reviewer_id=reviewer_id, updated_at=now, version=F("version") + 1)
+            bump_versions(
+                {f"employee:{employee_id}" for rows in assignments.values() for _, employee_id in rows},
+                using,
+            )
+
+    names = dict(Employee.objects.filter(pk__in=before).values_list("pk", "name"))
+    return {
+        "dry_run": dry_run,
+        "planned": sum(len(rows) for rows in assignments.values()),
+        "assigned": assigned,
+        "unassignable": unassignable,
+        "reviewers": [
+            {
+                "reviewer": reviewer_id,
+                "name": names.get(reviewer_id),
+                "load": before[reviewer_id],
+                "assigned": len(assignments[reviewer_id]),
+            }
+            for reviewer_id in sorted(before)
+        ],
+    }
@@ -1,8 +1,87 @@
 from rest_framework import serializers
-from .models import Company, Department, Employee, Project, PerformanceReview
+from rest_framework.relations import PKOnlyObject
+from rest_framework.serializers import raise_errors_on_nested_writes
+from rest_framework.utils import model_meta
+from apps.core.profiling import ProfiledSerializerMixin
+from . import hierarchy
+from .models import (
+    Company,
+    DeletionJob,
+    Department,
+    Employee,
+    Project,
+    ProjectAssignment,
+    PerformanceReview,
+)
 
 
-class CompanySerializer(serializers.ModelSerializer):
+class AnnotatedIdsField(serializers.ManyRelatedField):
+    """
+    Many-to-many primary keys, read from the ``annotation`` ids array when
+    the queryset has one (see ``ProjectQuerySet.with_assigned_ids``) and
+    from the relation otherwise.
+    """
+
+    def __init__(self, annotation, **kwargs):
+        self.annotation = annotation
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        if self.annotation in instance.__dict__:
+            ids = sorted(instance.__dict__[self.annotation] or [])
+            return [PKOnlyObject(pk) for pk in ids]
+        return super().get_attribute(instance)
+
+
+class MinimalUpdateMixin:
+    """
+    Write only what an update changes: ``save(update_fields=...)`` with the
+    changed columns and the ``auto_now`` stamps, and no write at all (so no
+    ``updated_at`` bump, signals or cache invalidation) for a no-op payload.
+
+    For models with LoadedValuesMixin, which knows the values loaded.
+    """
+
+    def update(self, instance, validated_data):
+        raise_errors_on_nested_writes("update", self, validated_data)
+        info = model_meta.get_field_info(instance)
+
+        many_to_many = {}
+        for attr, value in validated_data.items():
+            if attr in info.relations and info.relations[attr].to_many:
+                many_to_many[attr] = value
+            else:
+                setattr(instance, attr, value)
+
+        changed = instance.changed_fields()
+        if changed:
+            stamps = [
+                field.attname
+                for field in instance._meta.concrete_fields
+                if getattr(field, "auto_now", False)
+            ]
+            instance.save(update_fields=[*changed, *stamps])
+            instance.refresh_loaded_values()
+
+        # all() reads the prefetched rows when the view prefetched them.
+        touched = {
+            attr: value
+            for attr, value in many_to_many.items()
+            if {obj.pk for obj in value} != {obj.pk for obj in getattr(instance, attr).all()}
+        }
+        if touched and getattr(instance, "expected_version", None) is not None:
+            # Nothing above checked the version: changes only to related rows.
+            instance.claim_version()
+        for attr, value in touched.items():
+            getattr(instance, attr).set(value)
+        if touched:
+            # The m2m signals bump the row in the database.
+            instance.refresh_from_db(fields=["updated_at", "version"])
+
+        return instance
+
+
+class CompanySerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     number_of_departments = serializers.ReadOnlyField()
     number_of_employees = serializers.ReadOnlyField()
     number_of_projects = serializers.ReadOnlyField()
@@ -17,11 +96,12 @@ class CompanySerializer(serializers.ModelSerializer):
             "number_of_projects",
             "created_at",
             "updated_at",
+            "version",
         ]
-        read_only_fields = ["id", "created_at", "updated_at"]
+        read_only_fields = ["id", "created_at", "updated_at", "version"]
 
 
-class DepartmentSerializer(serializers.ModelSerializer):
+class DepartmentSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     company_name = serializers.CharField(source="company.name", read_only=True)
     number_of_employees = serializers.ReadOnlyField()
     number_of_projects = serializers.ReadOnlyField()
@@ -32,11 +112,13 @@ class DepartmentSerializer(serializers.ModelSerializer):
             "id",
             "company",
             "company_name",
+            "parent",
             "name",
             "number_of_employees",
             "number_of_projects",
             "created_at",
             "updated_at",
+            "version",
         ]
         read_only_fields = [
             "id",
@@ -45,10 +127,36 @@ class DepartmentSerializer(serializers.ModelSerializer):
             "number_of_projects",
             "created_at",
             "updated_at",
+            "version",
         ]
 
+    def validate(self, attrs):
+        instance = self.instance
+        company = attrs.get("company", getattr(instance, "company", None))
+        parent = attrs.get("parent", getattr(instance, "parent", None))
+        if parent is not None and company is not None and parent.company_id != company.pk:
+            raise serializers.ValidationError(
+                {"parent": "Parent department must belong to the same company"}
+            )
+        if instance is not None and parent is not None and hierarchy.is_within(
+            parent.pk, instance.pk
+        ):
+            raise serializers.ValidationError(
+                {"parent": "A department cannot be moved below itself"}
+            )
+        if (
+            instance is not None
+            and company is not None
+            and company.pk != instance.company_id
+            and instance.children.exists()
+        ):
+            raise serializers.ValidationError(
+                {"company": "Move or delete the sub-departments first"}
+            )
+        return attrs
+
 
-class EmployeeSerializer(serializers.ModelSerializer):
+class EmployeeSerializer(ProfiledSerializerMixin, MinimalUpdateMixin, serializers.ModelSerializer):
     company_name = serializers.CharField(source="company.name", read_only=True)
     department_name = serializers.CharField(source="department.name", read_only=True)
     days_employed = serializers.ReadOnlyField()
@@ -71,6 +179,7 @@ class EmployeeSerializer(serializers.ModelSerializer):
             "days_employed",
             "created_at",
             "updated_at",
+            "version",
         ]
         read_only_fields = [
             "id",
@@ -79,12 +188,20 @@ class EmployeeSerializer(serializers.ModelSerializer):
             "days_employed",
             "created_at",
             "updated_at",
+            "version",
         ]
 
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(ProfiledSerializerMixin, MinimalUpdateMixin, serializers.ModelSerializer):
     company_name = serializers.CharField(source="company.name", read_only=True)
     department_name = serializers.CharField(source="department.name", read_only=True)
+    # Writable although the many-to-many has a through model: assignments
+    # added here take the project's period at full allocation.
+    assigned_employees = AnnotatedIdsField(
+        "assigned_employee_ids",
+        child_relation=serializers.PrimaryKeyRelatedField(queryset=Employee.objects.all()),
+        required=False,
+    )
     assigned_employees_count = serializers.SerializerMethodField()
 
     class Meta:
@@ -103,6 +220,7 @@ class ProjectSerializer(serializers.ModelSerializer):
             "assigned_employees_count",
             "created_at",
             "updated_at",
+            "version",
         ]
         read_only_fields = [
             "id",
@@ -111,9 +229,19 @@ class ProjectSerializer(serializers.ModelSerializer):
             "assigned_employees_count",
             "created_at",
             "updated_at",
+            "version",
         ]
 
+    def update(self, instance, validated_data):
+        instance = super().update(instance, validated_data)
+        # The annotations were fetched before the assignments changed
+        instance.__dict__.pop("assigned_employees_count", None)
+        instance.__dict__.pop("assigned_employee_ids", None)
+        return instance
+
     def get_assigned_employees_count(self, obj):
+        if hasattr(obj, "assigned_employees_count"):
+            return obj.assigned_employees_count
         return obj.assigned_employees.count()
 
     def validate(self, attrs):
@@ -126,10 +254,52 @@ class ProjectSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class PerformanceReviewSerializer(serializers.ModelSerializer):
+class ProjectAssignmentSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    employee_name = serializers.CharField(source="employee.name", read_only=True)
+
+    class Meta:
+        model = ProjectAssignment
+        fields = [
+            "id",
+            "project",
+            "employee",
+            "employee_name",
+            "allocation",
+            "start_date",
+            "end_date",
+        ]
+        read_only_fields = ["id", "project", "employee_name"]
+
+    def validate(self, attrs):
+        instance = self.instance
+        start_date = attrs.get("start_date", getattr(instance, "start_date", None))
+        end_date = attrs.get("end_date", getattr(instance, "end_date", None))
+
+        if start_date and end_date and start_date > end_date:
+            raise serializers.ValidationError("End date must be after start date")
+
+        project = self.context.get("project") or getattr(instance, "project", None)
+        employee = attrs.get("employee")
+        if project is not None and employee is not None:
+            if employee.company_id != project.company_id:
+                raise serializers.ValidationError(
+                    {"employee": "Employee must belong to the project's company"}
+                )
+            if (
+                instance is None or instance.employee_id != employee.pk
+            ) and project.assignments.filter(employee=employee).exists():
+                raise serializers.ValidationError(
+                    {"employee": "Employee is already assigned to this project"}
+                )
+
+        return attrs
+
+
+class PerformanceReviewSerializer(ProfiledSerializerMixin, MinimalUpdateMixin, serializers.ModelSerializer):
     employee_name = serializers.CharField(source="employee.name", read_only=True)
     reviewer_name = serializers.CharField(source="reviewer.name", read_only=True)
     stage_display = serializers.CharField(source="get_stage_display", read_only=True)
+    is_archived = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = PerformanceReview
@@ -145,16 +315,22 @@ class PerformanceReviewSerializer(serializers.ModelSerializer):
             "feedback",
             "rating",
             "notes",
+            "stage_changed_at",
+            "is_archived",
             "created_at",
             "updated_at",
+            "version",
         ]
         read_only_fields = [
             "id",
             "employee_name",
             "reviewer_name",
             "stage_display",
+            "stage_changed_at",
+            "is_archived",
             "created_at",
             "updated_at",
+            "version",
         ]
 
     def validate_stage(self, value):
@@ -172,3 +348,25 @@ class PerformanceReviewSerializer(serializers.ModelSerializer):
         if value is not None and (value < 1 or value > 5):
             raise serializers.ValidationError("Rating must be between 1 and 5")
         return value
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    progress = serializers.ReadOnlyField()
+
+    class Meta:
+        model = DeletionJob
+        fields = [
+            "id",
+            "target_type",
+            "target_id",
+            "target_name",
+            "status",
+            "progress",
+            "totals",
+            "deleted",
+            "last_error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
@@ -0,0 +1,638 @@
+"""
+Company sharding: every row of a company lives in one database alias
+(its shard), given by the CompanyShard map in the directory database.
+
+Users, tokens and everything outside the companies app stay in the
+directory database. Requests are routed by the shard of the user's
+company, activated at authentication; admins without a company see every
+shard through ShardFanOut. Each shard allocates ids from its own range,
+so ids stay unique across shards and a company keeps them when moved.
+"""
+import contextvars
+import functools
+import json
+import logging
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, models, transaction
+from django.utils import timezone
+
+from . import snapshots
+from .archive import ensure_partitions
+from .models import (
+    ArchivedPerformanceReview,
+    Collaboration,
+    Company,
+    CompanyShard,
+    DeletionJob,
+    Department,
+    DepartmentClosure,
+    Employee,
+    PerformanceReview,
+    Project,
+    ReviewStageTransition,
+    StageDurationBucket,
+    Tombstone,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARDING_SETTINGS = {
+    # Database aliases holding company data besides the directory.
+    "SHARDS": [],
+    # Holds users, the shard map and companies without a map entry.
+    "DIRECTORY": "default",
+    # Where companies created outside any company context go.
+    "NEW_COMPANIES": "default",
+    # Shard n allocates ids from n * ID_RANGE.
+    "ID_RANGE": 10**12,
+    "MAP_CACHE_TIMEOUT": 30,
+    # How long a move waits for writes in flight once it freezes a company;
+    # by default long enough for every process's cached map entry to expire.
+    "DRAIN_SECONDS": None,
+}
+
+# Rows a move re-copies are those stamped since this long before it
+# started: transactions that stamped a row earlier but committed after it
+# was read, and clock differences between app servers.
+MOVE_CLOCK_SKEW = timedelta(minutes=1)
+
+ActiveShard = namedtuple("ActiveShard", ["alias", "company_id"])
+
+_active = contextvars.ContextVar("active_shard", default=None)
+
+
+def get_sharding_settings():
+    return {**DEFAULT_SHARDING_SETTINGS, **getattr(settings, "SHARDING", {})}
+
+
+def is_enabled():
+    return bool(get_sharding_settings()["SHARDS"])
+
+
+def shard_aliases():
+    """
+    Every database holding company data, the directory first.
+    """
+    config = get_sharding_settings()
+    return list(dict.fromkeys([config["DIRECTORY"], *config["SHARDS"]]))
+
+
+def is_sharded(model):
+    return model._meta.app_label == "companies" and model is not CompanyShard
+
+
+class CompanyMoving(Exception):
+    """
+    A write to a company that is being copied to another shard; the API
+    answers it with a 503.
+    """
+
+
+class ShardMoveError(Exception):
+    pass
+
+
+# Shard map
+
+def shard_for_company(company_id):
+    """
+    ``(alias, moving)`` of the shard holding company ``company_id``.
+    """
+    key = f"shard:company:{company_id}"
+    entry = cache.get(key)
+    if entry is None:
+        config = get_sharding_settings()
+        row = (
+            CompanyShard.objects.using(config["DIRECTORY"])
+            .filter(company_id=company_id)
+            .values_list("database", "moving")
+            .first()
+        )
+        entry = tuple(row) if row else (config["DIRECTORY"], False)
+        cache.set(key, entry, config["MAP_CACHE_TIMEOUT"])
+    return entry
+
+
+def forget_company(company_id):
+    cache.delete(f"shard:company:{company_id}")
+
+
+def assign_company(company_id, alias, moving=False):
+    """
+    Point the shard map entry of ``company_id`` at ``alias``.
+    """
+    CompanyShard.objects.using(get_sharding_settings()["DIRECTORY"]).update_or_create(
+        company_id=company_id, defaults={"database": alias, "moving": moving}
+    )
+    forget_company(company_id)
+
+
+def user_company_id(user_id):
+    """
+    Company of the employee profile of user ``user_id``, or None.
+    """
+    key = f"shard:user:{user_id}"
+    company_id = cache.get(key)
+    if company_id is None:
+        company_id = 0
+        for alias in shard_aliases():
+            found = (
+                Employee.objects.using(alias)
+                .filter(user_id=user_id)
+                .values_list("company_id", flat=True)
+                .first()
+            )
+            if found is not None:
+                company_id = found
+                break
+        cache.set(key, company_id, get_sharding_settings()["MAP_CACHE_TIMEOUT"])
+    return company_id or None
+
+
+def forget_user(user_id):
+    cache.delete(f"shard:user:{user_id}")
+
+
+def attach_employee_profile(user):
+    """
+    Load ``user.employee_profile`` from its company's shard and make that
+    shard the active one.
+    """
+    employee = None
+    company_id = user_company_id(user.pk)
+    if company_id is not None:
+        alias = activate_company(company_id)
+        employee = Employee.objects.using(alias).filter(user_id=user.pk).first()
+        if employee is None:
+            forget_user(user.pk)
+        else:
+            Employee.user.field.set_cached_value(employee, user)
+    type(user).employee_profile.related.set_cached_value(user, employee)
+    return employee
+
+
+def locate(model, pk):
+    """
+    Alias of the shard holding ``model`` row ``pk``, or None.
+    """
+    for alias in shard_aliases():
+        if model._base_manager.using(alias).filter(pk=pk).exists():
+            return alias
+    return None
+
+
+# Active shard
+
+def active_shard():
+    active = _active.get()
+    return active.alias if active else None
+
+
+def activate_shard(alias, company_id=None):
+    _active.set(ActiveShard(alias, company_id))
+
+
+def activate_company(company_id):
+    alias = shard_for_company(company_id)[0]
+    activate_shard(alias, company_id)
+    return alias
+
+
+@contextmanager
+def use_shard(alias, company_id=None):
+    token = _active.set(ActiveShard(alias, company_id))
+    try:
+        yield alias
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def use_company(company_id):
+    with use_shard(shard_for_company(company_id)[0], company_id) as alias:
+        yield alias
+
+
+class ShardMiddleware:
+    """
+    Start every request without an active shard; authentication
+    activates the shard of the user's company.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _active.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _active.reset(token)
+
+
+# Routing
+
+def _company_of(instance):
+    if isinstance(instance, Company):
+        return instance.pk
+    company_id = getattr(instance, "company_id", None)
+    if company_id is not None:
+        return company_id
+    for related in _cached_related(instance):
+        if (company_id := _company_of(related)) is not None:
+            return company_id
+    return None
+
+
+def _cached_related(instance):
+    for field in instance._meta.concrete_fields:
+        if field.is_relation and field.is_cached(instance):
+            related = field.get_cached_value(instance)
+            if related is not None and is_sharded(type(related)):
+                yield related
+
+
+class ShardRouter:
+    """
+    Send companies app models to the shard of the company they belong to:
+    the instance's own database, else that of a related row or its
+    company id, else the active shard. Everything else, and the shard map
+    itself, uses the directory database.
+    """
+
+    def _route(self, model, instance):
+        config = get_sharding_settings()
+        if not is_sharded(model):
+            return config["DIRECTORY"]
+        if instance is not None and is_sharded(type(instance)):
+            if instance._state.db:
+                return instance._state.db
+            for related in _cached_related(instance):
+                if related._state.db:
+                    return related._state.db
+            company_id = _company_of(instance)
+            if company_id is not None:
+                return shard_for_company(company_id)[0]
+        return active_shard() or config["NEW_COMPANIES"]
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints.get("instance"))
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get("instance")
+        if is_sharded(model):
+            company_id = None
+            if instance is not None and is_sharded(type(instance)):
+                company_id = _company_of(instance)
+            if company_id is None and (active := _active.get()):
+                company_id = active.company_id
+            if company_id is not None and shard_for_company(company_id)[1]:
+                raise CompanyMoving()
+        return self._route(model, instance)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Employees reference users in the directory.
+        return True
+
+
+def reserve_id_ranges(sender, using, **kwargs):
+    """
+    ``post_migrate`` receiver starting the id sequences of shard n at
+    n * ID_RANGE, so rows keep unique ids across shards.
+    """
+    aliases = shard_aliases()
+    if not is_enabled() or using not in aliases or not aliases.index(using):
+        return
+    start = aliases.index(using) * get_sharding_settings()["ID_RANGE"]
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for model in sender.get_models(include_auto_created=True):
+            if not is_sharded(model) or not isinstance(
+                model._meta.pk, models.fields.AutoFieldMixin
+            ):
+                continue
+            table = model._meta.db_table
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT pg_get_serial_sequence(%s, %s)", [table, model._meta.pk.column]
+                )
+                sequence = cursor.fetchone()[0]
+                cursor.execute(
+                    f"SELECT setval(%s, %s) FROM {sequence} WHERE last_value < %s",
+                    [sequence, start, start],
+                )
+            elif connection.vendor == "sqlite":
+                cursor.execute(
+                    "UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s",
+                    [start, table, start],
+                )
+                cursor.execute("SELECT 1 FROM sqlite_sequence WHERE name = %s", [table])
+                if cursor.fetchone() is None:
+                    cursor.execute(
+                        "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, start]
+                    )
+
+
+# Fan-out
+
+def _order_value(row, term):
+    if isinstance(row, dict):
+        return row[term]
+    for part in term.split("__"):
+        if row is None:
+            break
+        row = getattr(row, part)
+    return row
+
+
+class ShardFanOut:
+    """
+    A queryset run on every shard, sliceable like one for pagination.
+
+    A slice reads the first ``stop`` rows of each shard and merges them in
+    the queryset's order, so the cost grows with page depth. Iterating
+    yields each shard's rows in turn, without merging.
+    """
+
+    ordered = True
+
+    def __init__(self, queryset, aliases=None):
+        self.queryset = queryset
+        self.aliases = aliases or shard_aliases()
+
+    def count(self):
+        return sum(self.queryset.using(alias).count() for alias in self.aliases)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return chain.from_iterable(self.queryset.using(alias) for alias in self.aliases)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+        stop = index.stop
+        rows = []
+        for alias in self.aliases:
+            queryset = self.queryset.using(alias)
+            rows.extend(queryset if stop is None else queryset[:stop])
+        rows.sort(key=functools.cmp_to_key(self.compare))
+        return rows[index.start : stop]
+
+    @functools.cached_property
+    def ordering(self):
+        query = self.queryset.query
+        if query.order_by:
+            return [term for term in query.order_by if isinstance(term, str)]
+        return list(self.queryset.model._meta.ordering) if query.default_ordering else []
+
+    def compare(self, a, b):
+        for term in self.ordering:
+            name = term.lstrip("-")
+            x, y = _order_value(a, name), _order_value(b, name)
+            if x == y:
+                continue
+            # NULLs first, as on SQLite.
+            result = -1 if x is None or (y is not None and x < y) else 1
+            return -result if term.startswith("-") else result
+        return 0
+
+
+# Moving companies
+
+def _move_tables(company_id):
+    """
+    ``(model, rows of the company, change stamp)`` in FK dependency order.
+
+    Tables without a stamp are copied again in full once writes stop.
+    Outbox events stay behind for the source shard's dispatcher.
+    """
+    Assignment = Project.assigned_employees.through
+    return [
+        (Company, Company._base_manager.filter(pk=company_id), "updated_at"),
+        (Department, Department._base_manager.filter(company_id=company_id), "updated_at"),
+        (
+            DepartmentClosure,
+            DepartmentClosure._base_manager.filter(descendant__company_id=company_id),
+            None,
+        ),
+        (Employee, Employee._base_manager.filter(company_id=company_id), "updated_at"),
+        (Project, Project._base_manager.filter(company_id=company_id), "updated_at"),
+        (Assignment, Assignment.objects.filter(project__company_id=company_id), None),
+        (
+            Collaboration,
+            Collaboration._base_manager.filter(employee__company_id=company_id),
+            None,
+        ),
+        (
+            PerformanceReview,
+            PerformanceReview._base_manager.filter(employee__company_id=company_id),
+            "updated_at",
+        ),
+        (
+            ArchivedPerformanceReview,
+            ArchivedPerformanceReview._base_manager.filter(employee__company_id=company_id),
+            "archived_at",
+        ),
+        (
+            ReviewStageTransition,
+            ReviewStageTransition._base_manager.filter(company_id=company_id),
+            "transitioned_at",
+        ),
+        (StageDurationBucket, StageDurationBucket._base_manager.filter(company_id=company_id), None),
+        (Tombstone, Tombstone._base_manager.filter(company_id=company_id), "deleted_at"),
+        (DeletionJob, DeletionJob._base_manager.filter(company_id=company_id), None),
+    ]
+
+
+class CompanyMove:
+    """
+    Copy one company's rows from ``source`` to ``target`` with their ids,
+    while the company stays writable, then stop its writes, copy what
+    changed meanwhile and flip the shard map.
+    """
+
+    def __init__(self, company_id, target, batch_size=1000, drain_seconds=None, log=None):
+        config = get_sharding_settings()
+        self.company_id = company_id
+        self.source = shard_for_company(company_id)[0]
+        self.target = target
+        self.batch_size = batch_size
+        if drain_seconds is None:
+            drain_seconds = config["DRAIN_SECONDS"]
+        if drain_seconds is None:
+            drain_seconds = config["MAP_CACHE_TIMEOUT"] + 5
+        self.drain_seconds = drain_seconds
+        self.log = log or logger.info
+        self.tables = _move_tables(company_id)
+        self.copied = {}
+
+        aliases = shard_aliases()
+        if target not in aliases:
+            raise ShardMoveError(f"{target!r} is not a shard")
+        if target == self.source:
+            raise ShardMoveError(f"Company {company_id} is already on {target!r}")
+        if not Company._base_manager.using(self.source).filter(pk=company_id).exists():
+            raise ShardMoveError(f"Company {company_id} not found on {self.source!r}")
+        if connections[target].vendor == "sqlite" and (
+            aliases.index(target) < aliases.index(self.source)
+        ):
+            # AUTOINCREMENT would move the target's sequence into the
+            # source's id range.
+            raise ShardMoveError("SQLite shards only take companies from lower id ranges")
+
+    def run(self):
+        # Rows left on the target by an interrupted move.
+        for model, queryset, _ in reversed(self.tables):
+            self.delete(model, self.target, queryset.using(self.target).values_list("pk", flat=True))
+
+        started = timezone.now()
+        for model, queryset, _ in self.tables:
+            copied = self.copy_online(model, queryset)
+            self.log(f"Copied {copied} {model._meta.verbose_name_plural}")
+
+        assign_company(self.company_id, self.source, moving=True)
+        self.log(f"Writes stopped, draining for {self.drain_seconds}s")
+        time.sleep(self.drain_seconds)
+        try:
+            with transaction.atomic(using=self.target):
+                for model, queryset, stamp in self.tables:
+                    changed = self.copy_changes(model, queryset, stamp, started - MOVE_CLOCK_SKEW)
+                    self.log(f"Synced {changed} changed {model._meta.verbose_name_plural}")
+        except Exception:
+            assign_company(self.company_id, self.source)
+            raise
+        assign_company(self.company_id, self.target)
+        for user_id in Employee._base_manager.using(self.target).filter(
+            company_id=self.company_id
+        ).values_list("user_id", flat=True):
+            forget_user(user_id)
+        self.log(f"Company {self.company_id} now served from {self.target}")
+
+        for model, queryset, _ in reversed(self.tables):
+            deleted = self.delete_source(model, queryset)
+            self.log(f"Removed {deleted} {model._meta.verbose_name_plural} from {self.source}")
+
+    def rows(self, model, queryset, pks=None):
+        """
+        Batches of ``(pk, database values)`` read from the source.
+        """
+        fields = list(model._meta.concrete_fields)
+        columns = [field.attname for field in fields]
+        pk_position = columns.index(model._meta.pk.attname)
+        queryset = queryset.using(self.source).order_by("pk")
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        connection = connections[self.target]
+        last = None
+        while True:
+            batch = queryset if last is None else queryset.filter(pk__gt=last)
+            batch = list(batch.values_list(*columns)[: self.batch_size])
+            if not batch:
+                return
+            last = batch[-1][pk_position]
+            yield [self.prepare(fields, row, connection) for row in batch]
+
+    def prepare(self, fields, row, connection):
+        values = []
+        for field, value in zip(fields, row):
+            if isinstance(field, models.JSONField):
+                value = json.dumps(value, cls=field.encoder)
+            elif (
+                field.is_relation
+                and field.db_constraint
+                and value is not None
+                and field.related_model in self.copied
+            ):
+                if value not in self.copied[field.related_model]:
+                    if not field.null:
+                        return None
+                    # References outside the company are dropped, as in
+                    # company snapshots.
+                    value = None
+            else:
+                value = field.get_db_prep_save(value, connection)
+            values.append(value)
+        return values
+
+    def insert(self, model, batch):
+        fields = list(model._meta.concrete_fields)
+        rows = [row for row in batch if row is not None]
+        columns = [field.attname for field in fields]
+        if model is ArchivedPerformanceReview:
+            # Prepared datetimes are still datetimes on PostgreSQL.
+            created_at = columns.index("created_at")
+            ensure_partitions(connections[self.target], [row[created_at] for row in rows])
+        snapshots.insert_rows(connections[self.target], model, fields, rows)
+        pk_position = columns.index(model._meta.pk.attname)
+        self.copied.setdefault(model, set()).update(row[pk_position] for row in rows)
+        return len(rows)
+
+    def copy_online(self, model, queryset):
+        # Rows referencing one not copied yet (created meanwhile) are left
+        # for the final sync.
+        self.copied[model] = set()
+        copied = 0
+        for batch in self.rows(model, queryset):
+            with transaction.atomic(using=self.target):
+                copied += self.insert(model, batch)
+        return copied
+
+    def copy_changes(self, model, queryset, stamp, since):
+        source_ids = set(queryset.using(self.source).values_list("pk", flat=True))
+        target_ids = set(queryset.using(self.target).values_list("pk", flat=True))
+        if stamp:
+            changed = (source_ids - target_ids) | set(
+                queryset.using(self.source)
+                .filter(**{f"{stamp}__gte": since})
+                .values_list("pk", flat=True)
+            )
+        else:
+            changed = source_ids
+        self.delete(model, self.target, (target_ids - source_ids) | (changed & target_ids))
+        self.copied[model] = (source_ids & target_ids) - changed
+        ids = sorted(changed)
+        for start in range(0, len(ids), self.batch_size):
+            for batch in self.rows(model, queryset, ids[start : start + self.batch_size]):
+                if None in batch:
+                    raise ShardMoveError(
+                        f"{model._meta.verbose_name} references rows outside the company"
+                    )
+                self.insert(model, batch)
+        return len(changed)
+
+    def delete(self, model, alias, pks):
+        pks = sorted(set(pks))
+        for start in range(0, len(pks), self.batch_size):
+            model._base_manager.filter(pk__in=pks[start : start + self.batch_size])._raw_delete(
+                alias
+            )
+
+    def delete_source(self, model, queryset):
+        deleted = 0
+        while True:
+            with transaction.atomic(using=self.source):
+                pks = list(
+                    queryset.using(self.source).values_list("pk", flat=True)[: self.batch_size]
+                )
+                if not pks:
+                    return deleted
+                self.delete(model, self.source, pks)
+            deleted += len(pks)
+
+
+def move_company(company_id, target, batch_size=1000, drain_seconds=None, log=None):
+    """
+    Move company ``company_id`` to shard ``target`` while it stays online;
+    writes to it are refused with a 503 for the drain period and the
+    final sync.
+    """
+    CompanyMove(company_id, target, batch_size, drain_seconds, log).run()
@@ -0,0 +1,318 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.core.cache import bump_versions
+
+from . import collaboration, hierarchy, outbox, sharding, stage_history, staffing
+from .models import (
+    Company,
+    Department,
+    Employee,
+    Project,
+    ProjectAssignment,
+    PerformanceReview,
+    Tombstone,
+)
+
+
+# A delete sends pre_delete for every row of the cascade, then deletes
+# each model's rows at once and sends their post_delete. Receivers that
+# would query per row collect the rows in pre_delete and handle them all
+# at the first post_delete, with state kept on the object the delete was
+# called on.
+
+def _cascade(origin):
+    if origin is None:
+        return {}
+    return vars(origin).setdefault("_deleted_rows", {})
+
+
+@receiver(pre_delete, sender=Department)
+@receiver(pre_delete, sender=Employee)
+@receiver(pre_delete, sender=PerformanceReview)
+@receiver(pre_delete, sender=Project)
+@receiver(pre_delete, sender=ProjectAssignment)
+def collect_deleted_rows(sender, instance, origin=None, **kwargs):
+    _cascade(origin).setdefault(sender, []).append(instance)
+
+
+def deleted_rows(sender, instance, origin):
+    """
+    Rows of ``sender`` deleted along with ``instance``, the first time it
+    is called for the delete; nothing on later calls.
+    """
+    state = _cascade(origin)
+    rows = state.get(sender)
+    if rows is None:
+        return [instance]
+    state[sender] = []
+    return rows
+
+
+# Outbox events are written by post_save, so they share the caller's
+# transaction: writers that emit them must run inside transaction.atomic
+# (the admin and the API write views do).
+
+@receiver(post_save, sender=PerformanceReview)
+def record_review_stage_change(sender, instance, created, **kwargs):
+    from_stage = instance.loaded_value("stage")
+    changed = not created and from_stage is not None and from_stage != instance.stage
+    if created or changed:
+        employee = instance.employee
+        stage_history.record_transitions(
+            [(
+                instance.pk,
+                employee.company_id,
+                employee.department_id,
+                from_stage if changed else "",
+                instance.stage,
+                instance.loaded_value("stage_changed_at"),
+            )],
+            transitioned_at=instance.stage_changed_at,
+        )
+    if changed:
+        outbox.review_stage_changed(
+            instance.pk,
+            from_stage,
+            instance.stage,
+            employee_id=employee.pk,
+            company_id=employee.company_id,
+            department_id=employee.department_id,
+            reviewer_id=instance.reviewer_id,
+        ).save()
+    instance.refresh_loaded_values()
+
+
+@receiver(post_save, sender=Employee)
+def record_employee_department_change(sender, instance, created, **kwargs):
+    from_department_id = instance.loaded_value("department_id")
+    if not created and from_department_id is not None and (
+        from_department_id != instance.department_id
+    ):
+        outbox.employee_department_changed(instance, from_department_id).save()
+    instance.refresh_loaded_values()
+
+
+@receiver(post_save, sender=Department)
+def maintain_department_hierarchy(sender, instance, created, **kwargs):
+    using = kwargs.get("using")
+    if created:
+        hierarchy.link(instance, using)
+    elif instance.loaded_value("parent_id", instance.parent_id) != instance.parent_id:
+        hierarchy.move(instance, using)
+    instance.refresh_loaded_values()
+
+
+@receiver(pre_delete, sender=Department)
+def detach_department(sender, instance, **kwargs):
+    hierarchy.detach(instance.pk, kwargs.get("using"))
+
+
+@receiver(post_delete, sender=Department)
+def record_department_tombstones(sender, instance, origin=None, **kwargs):
+    departments = deleted_rows(sender, instance, origin)
+    if departments:
+        Tombstone.objects.bulk_create(
+            Tombstone(
+                model="department", object_id=department.pk, company_id=department.company_id
+            )
+            for department in departments
+        )
+
+
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=Project)
+def record_tombstones(sender, instance, origin=None, **kwargs):
+    rows = deleted_rows(sender, instance, origin)
+    if rows:
+        Tombstone.objects.bulk_create(
+            Tombstone(
+                model=sender._meta.model_name,
+                object_id=row.pk,
+                company_id=row.company_id,
+                department_id=row.department_id,
+            )
+            for row in rows
+        )
+
+
+@receiver(post_delete, sender=PerformanceReview)
+def record_review_tombstones(sender, instance, origin=None, **kwargs):
+    reviews = deleted_rows(sender, instance, origin)
+    if not reviews:
+        return
+    scopes = {
+        review.employee_id: (review.employee.company_id, review.employee.department_id)
+        for review in reviews
+        if PerformanceReview.employee.is_cached(review)
+    }
+    # Reviews are deleted before their employees in a cascade, so the
+    # employee rows are still there to scope the tombstones.
+    missing = {review.employee_id for review in reviews} - scopes.keys()
+    if missing:
+        scopes.update(
+            (pk, (company_id, department_id))
+            for pk, company_id, department_id in Employee.objects.filter(
+                pk__in=missing
+            ).values_list("pk", "company_id", "department_id")
+        )
+    tombstones = []
+    for review in reviews:
+        company_id, department_id = scopes.get(review.employee_id, (None, None))
+        tombstones.append(
+            Tombstone(
+                model="performancereview",
+                object_id=review.pk,
+                company_id=company_id,
+                department_id=department_id,
+            )
+        )
+    Tombstone.objects.bulk_create(tombstones)
+    bump_versions(
+        {f"employee:{review.employee_id}" for review in reviews}
+        | {f"company-reviews:{company_id}" for company_id, _ in scopes.values()},
+        kwargs.get("using"),
+    )
+
+
+def touch_projects(project_ids, company_id=None, using=None):
+    """
+    Bump Project.updated_at when assignments change, so the change feed
+    picks up the new assigned_employees. Without ``company_id`` the
+    companies are looked up from the projects.
+    """
+    if not project_ids:
+        return
+    projects = Project.objects.filter(pk__in=project_ids)
+    if company_id is None:
+        company_ids = set(projects.values_list("company_id", flat=True))
+    else:
+        company_ids = {company_id}
+    projects.update(updated_at=timezone.now(), version=F("version") + 1)
+    bump_versions([f"company:{pk}" for pk in company_ids], using)
+
+
+@receiver(m2m_changed, sender=ProjectAssignment)
+def touch_projects_on_assignment_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if not reverse:
+        project_ids = [instance.pk]
+    elif action == "pre_clear":
+        project_ids = list(instance.assigned_projects.values_list("pk", flat=True))
+    else:
+        project_ids = pk_set
+    if action == "post_add":
+        staffing.date_new_assignments(project_ids, kwargs.get("using"))
+    touch_projects(project_ids, instance.company_id, kwargs.get("using"))
+
+
+@receiver(post_save, sender=ProjectAssignment)
+def touch_project_on_assignment_save(sender, instance, **kwargs):
+    touch_projects([instance.project_id], instance.project.company_id, kwargs.get("using"))
+
+
+@receiver(post_delete, sender=ProjectAssignment)
+def handle_deleted_assignments(sender, instance, origin=None, **kwargs):
+    assignments = deleted_rows(sender, instance, origin)
+    if not assignments:
+        return
+    using = kwargs.get("using")
+    collaboration.assignments_removed(
+        [(assignment.project_id, assignment.employee_id) for assignment in assignments],
+        using,
+        present=False,
+    )
+    # Projects deleted in the same cascade have nothing left to touch.
+    deleting = {project.pk for project in _cascade(origin).get(Project, [])}
+    touch_projects(
+        {assignment.project_id for assignment in assignments} - deleting, using=using
+    )
+
+
+@receiver(m2m_changed, sender=ProjectAssignment)
+def count_collaborations_on_assignment_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    using = kwargs.get("using")
+    if action == "pre_clear":
+        related = instance.assigned_projects if reverse else instance.assigned_employees
+        pk_set = set(related.values_list("pk", flat=True))
+    if action not in ("post_add", "pre_remove", "pre_clear"):
+        return
+    pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+    if action == "post_add":
+        collaboration.assignments_added(pairs, using)
+    else:
+        collaboration.assignments_removed(pairs, using)
+
+
+@receiver(post_save, sender=ProjectAssignment)
+def count_collaborations_on_assignment_save(sender, instance, created, **kwargs):
+    using = kwargs.get("using")
+    previous = (
+        instance.loaded_value("project_id", instance.project_id),
+        instance.loaded_value("employee_id", instance.employee_id),
+    )
+    if not created and previous != (instance.project_id, instance.employee_id):
+        collaboration.assignments_removed([previous], using, present=False)
+    if created or previous != (instance.project_id, instance.employee_id):
+        collaboration.assignments_added([(instance.project_id, instance.employee_id)], using)
+    instance.refresh_loaded_values()
+
+
+# Cached employee workspaces and company dashboards are keyed on these
+# versions: anything shown company-wide bumps the company, an employee's
+# reviews bump the employee and the reviews of their company.
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company(sender, instance, **kwargs):
+    bump_versions([f"company:{instance.pk}"], kwargs.get("using"))
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_company_rows(sender, instance, **kwargs):
+    bump_versions([f"company:{instance.company_id}"], kwargs.get("using"))
+
+
+@receiver(post_save, sender=PerformanceReview)
+def invalidate_employee_reviews(sender, instance, **kwargs):
+    # Deleted reviews are invalidated with their tombstones.
+    if PerformanceReview.employee.is_cached(instance):
+        company_id = instance.employee.company_id
+    else:
+        company_id = (
+            Employee.objects.filter(pk=instance.employee_id)
+            .values_list("company_id", flat=True)
+            .first()
+        )
+    names = [f"employee:{instance.employee_id}"]
+    if company_id is not None:
+        names.append(f"company-reviews:{company_id}")
+    bump_versions(names, kwargs.get("using"))
+
+
+# Shard map upkeep; see sharding.py.
+
+@receiver(post_save, sender=Company)
+def record_company_shard(sender, instance, created, using, **kwargs):
+    # Companies created outside the directory database need a map entry.
+    directory = sharding.get_sharding_settings()["DIRECTORY"]
+    if created and sharding.is_enabled() and using != directory:
+        sharding.assign_company(instance.pk, using)
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def forget_user_company(sender, instance, **kwargs):
+    if sharding.is_enabled():
+        sharding.forget_user(instance.user_id)
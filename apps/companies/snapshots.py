@@ -0,0 +1,354 @@
+"""
+Company snapshots: every row of one company, exported as NDJSON and
+bulk-loaded back under fresh ids.
+
+A snapshot is a header line, then for each table a line
+``{"table", "columns", "rows"}`` followed by one JSON array per row.
+"""
+import datetime
+import decimal
+import io
+import json
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+
+from .archive import ensure_partitions
+from .models import (
+    ArchivedPerformanceReview,
+    Collaboration,
+    Company,
+    Department,
+    DepartmentClosure,
+    Employee,
+    PerformanceReview,
+    Project,
+)
+
+FORMAT = "talentum-company-snapshot"
+VERSION = 1
+
+
+def _tables():
+    """
+    ``(name, model, rows of a company)`` in FK dependency order.
+    """
+    User = get_user_model()
+    Assignment = Project.assigned_employees.through
+    return [
+        ("company", Company, lambda pk: Company.objects.filter(pk=pk)),
+        ("users", User, lambda pk: User.objects.filter(employee_profile__company_id=pk)),
+        ("departments", Department, lambda pk: Department.objects.filter(company_id=pk)),
+        (
+            "department_links",
+            DepartmentClosure,
+            lambda pk: DepartmentClosure.objects.filter(descendant__company_id=pk),
+        ),
+        ("employees", Employee, lambda pk: Employee.objects.filter(company_id=pk)),
+        ("projects", Project, lambda pk: Project.objects.filter(company_id=pk)),
+        ("assignments", Assignment, lambda pk: Assignment.objects.filter(project__company_id=pk)),
+        (
+            "collaborations",
+            Collaboration,
+            lambda pk: Collaboration.objects.filter(employee__company_id=pk),
+        ),
+        (
+            "reviews",
+            PerformanceReview,
+            lambda pk: PerformanceReview.objects.filter(employee__company_id=pk),
+        ),
+        (
+            "archived_reviews",
+            ArchivedPerformanceReview,
+            lambda pk: ArchivedPerformanceReview.objects.filter(employee__company_id=pk),
+        ),
+    ]
+
+
+def _encode(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def export_company(company_id, fp, chunk_size=5000):
+    """
+    Write the snapshot of company ``company_id`` to text stream ``fp``;
+    returns the number of rows per table.
+    """
+    counts = {}
+    fp.write(json.dumps({"format": FORMAT, "version": VERSION}) + "\n")
+    for name, model, rows_of in _tables():
+        queryset = rows_of(company_id).order_by("pk")
+        columns = [field.attname for field in model._meta.concrete_fields]
+        counts[name] = queryset.count()
+        fp.write(json.dumps({"table": name, "columns": columns, "rows": counts[name]}) + "\n")
+        dumps = json.JSONEncoder(default=_encode, separators=(",", ":")).encode
+        for row in queryset.values_list(*columns).iterator(chunk_size=chunk_size):
+            fp.write(dumps(row))
+            fp.write("\n")
+    return counts
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _with_suffix(value, suffix, email=False):
+    if not suffix or value is None:
+        return value
+    if email and "@" in value:
+        local, domain = value.rsplit("@", 1)
+        return f"{local}+{suffix}@{domain}"
+    return f"{value}-{suffix}"
+
+
+class SnapshotLoader:
+    """
+    Load a snapshot in FK order, remapping every id.
+
+    New ids are reserved up front from the table's sequence on PostgreSQL
+    and allocated above the current maximum elsewhere, so rows are written
+    with their final ids and references are rewritten in memory. Rows are
+    inserted with COPY on PostgreSQL and batched executemany otherwise,
+    without model instances or signals. On SQLite, secondary indexes of
+    tables the load at least doubles are rebuilt once after their rows.
+    """
+
+    def __init__(self, suffix=None, batch_size=10000):
+        self.suffix = suffix
+        self.batch_size = batch_size
+        self.id_maps = {}
+        self.now = timezone.now()
+        self.connection = connections[router.db_for_write(Company)]
+
+    def load(self, fp):
+        header = json.loads(fp.readline() or "{}")
+        if header.get("format") != FORMAT or header.get("version") != VERSION:
+            raise SnapshotError("Not a company snapshot this version can read")
+
+        tables = {name: model for name, model, _ in _tables()}
+        counts = {}
+        with transaction.atomic(using=self.connection.alias):
+            while line := fp.readline():
+                section = json.loads(line)
+                model = tables.get(section.get("table"))
+                if model is None:
+                    raise SnapshotError(f"Unknown table {section.get('table')!r}")
+                counts[section["table"]] = self.load_table(
+                    section["table"], model, section["columns"], section["rows"], fp
+                )
+        return counts
+
+    def load_table(self, name, model, columns, count, fp):
+        fields = list(model._meta.concrete_fields)
+        index = {column: position for position, column in enumerate(columns)}
+        converters = [self.converter(name, field, index) for field in fields]
+        id_map = self.id_maps.setdefault(model, {})
+        pk_position = index[model._meta.pk.attname]
+
+        remaining = count
+        with self.deferred_indexes(model, count):
+            while remaining:
+                # One parse per batch rather than one per line.
+                lines = [fp.readline() for _ in range(min(self.batch_size, remaining))]
+                batch = json.loads("[" + ",".join(lines) + "]")
+                remaining -= len(batch)
+                # Archived reviews keep ids from the review sequence, so the
+                # two tiers never share an id.
+                id_model = PerformanceReview if model is ArchivedPerformanceReview else model
+                for row, new_id in zip(batch, self.allocate_ids(id_model, len(batch))):
+                    id_map[row[pk_position]] = new_id
+                rows = [[convert(row) for convert in converters] for row in batch]
+                if model is ArchivedPerformanceReview:
+                    ensure_partitions(
+                        self.connection,
+                        [datetime.datetime.fromisoformat(row[index["created_at"]]) for row in batch],
+                    )
+                insert_rows(self.connection, model, fields, rows)
+        return count
+
+    def converter(self, table, field, index):
+        """
+        Function producing the database value of ``field`` from a snapshot row.
+        """
+        position = index.get(field.attname)
+        connection = self.connection
+        if field.primary_key:
+            id_map = self.id_maps.setdefault(field.model, {})
+            return lambda row: id_map[row[position]]
+        if position is None:
+            # Column added since the snapshot was taken.
+            default = field.get_db_prep_save(field.get_default(), connection)
+            return lambda row: default
+        if field.is_relation:
+            id_map = self.id_maps.setdefault(field.related_model, {})
+            if field.null:
+                # References outside the company (e.g. a reviewer who moved)
+                # are dropped rather than pointed at an unrelated row.
+                return lambda row: id_map.get(row[position])
+            return lambda row: id_map[row[position]]
+        if isinstance(field, models.DateTimeField) and field.auto_now:
+            # Imported rows are changes as far as incremental sync goes.
+            value = field.get_db_prep_save(self.now, connection)
+            return lambda row: value
+        if isinstance(field, models.DateTimeField):
+            # Plain dates and times are already in an ISO form both
+            # backends accept; datetimes need the backend's time zone
+            # handling, except that COPY reads the offset itself and SQLite
+            # stores UTC values as the ISO form without it.
+            if connection.vendor == "postgresql":
+                return lambda row: row[position]
+            adapt = connection.ops.adapt_datetimefield_value
+            parse = datetime.datetime.fromisoformat
+            if not (
+                settings.USE_TZ
+                and connection.vendor == "sqlite"
+                and connection.timezone_name == "UTC"
+            ):
+                return lambda row: row[position] and adapt(parse(row[position]))
+
+            def convert(row):
+                value = row[position]
+                if value and value.endswith("+00:00"):
+                    return value[:-6].replace("T", " ")
+                return value and adapt(parse(value))
+
+            return convert
+        if self.suffix and field.attname in ("email", "username", "name") and (
+            field.attname != "name" or table == "company"
+        ):
+            email = field.attname == "email"
+            suffix = self.suffix
+            return lambda row: _with_suffix(row[position], suffix, email)
+        return lambda row: row[position]
+
+    @contextmanager
+    def deferred_indexes(self, model, count):
+        """
+        On SQLite, drop the secondary indexes of ``model`` while ``count``
+        rows are loaded into it and recreate them afterwards: one sorted
+        build per index is cheaper than updating it row by row, and a
+        unique index still rejects conflicting rows when it is rebuilt. The
+        rebuild also covers the rows already there, so this is only done
+        when the load at least doubles the table. The drop is part of the
+        load's transaction, so a failed load restores the indexes. Indexes
+        declared with the table (``unique=True`` columns) cannot be dropped.
+
+        PostgreSQL keeps its indexes: dropping them would lock the table
+        against readers for the whole load, and COPY is fast already.
+        """
+        connection = self.connection
+        if connection.vendor != "sqlite":
+            yield
+            return
+        quote = connection.ops.quote_name
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            # The highest id bounds the row count without a table scan.
+            cursor.execute(f"SELECT MAX({quote(model._meta.pk.column)}) FROM {quote(table)}")
+            if (cursor.fetchone()[0] or 0) > count:
+                indexes = []
+            else:
+                cursor.execute(
+                    "SELECT name, sql FROM sqlite_master "
+                    "WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+                    [table],
+                )
+                indexes = cursor.fetchall()
+            for name, _ in indexes:
+                cursor.execute(f"DROP INDEX {quote(name)}")
+        yield
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+    def allocate_ids(self, model, count):
+        connection = self.connection
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                    [table, model._meta.pk.column, count],
+                )
+                return [row[0] for row in cursor.fetchall()]
+            # The transaction already holds the write lock after the first
+            # insert; the company row is always inserted first.
+            cursor.execute(
+                f"SELECT MAX({connection.ops.quote_name(model._meta.pk.column)}) "
+                f"FROM {connection.ops.quote_name(table)}"
+            )
+            start = (cursor.fetchone()[0] or 0) + 1
+            if connection.vendor == "sqlite":
+                # AUTOINCREMENT never reuses ids of rows since deleted or
+                # archived; reserve the new ones too, as archived reviews
+                # take them for another table.
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+                row = cursor.fetchone()
+                start = max(start, (row[0] if row else 0) + 1)
+                cursor.execute(
+                    "UPDATE sqlite_sequence SET seq = %s WHERE name = %s",
+                    [start + count - 1, table],
+                )
+                if not cursor.rowcount:
+                    cursor.execute(
+                        "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)",
+                        [table, start + count - 1],
+                    )
+        return range(start, start + count)
+
+
+def insert_rows(connection, model, fields, rows):
+    """
+    Insert ``rows`` of database values for ``fields`` as they are, with
+    COPY on PostgreSQL and executemany elsewhere.
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    column_list = ", ".join(quote(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write("\t".join(map(_copy_value, row)))
+                buffer.write("\n")
+            buffer.seek(0)
+            sql = f"COPY {table} ({column_list}) FROM STDIN"
+            raw = cursor.cursor
+            if hasattr(raw, "copy_expert"):
+                raw.copy_expert(sql, buffer)
+            else:
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+        else:
+            placeholders = ", ".join(["%s"] * len(fields))
+            cursor.executemany(
+                f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})", rows
+            )
+
+
+def _copy_value(value):
+    """
+    Encode a value for COPY's text format.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
@@ -0,0 +1,90 @@
+"""
+Staffing calendar: who is booked on which projects, for what share of
+their time, over a period.
+
+Assignments carry their own inclusive period and allocation; a
+department's calendar is one overlap query over the assignments of its
+employees, then a sweep over each employee's periods.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import OuterRef, Subquery
+
+from . import hierarchy
+from .models import Employee, Project, ProjectAssignment
+
+
+def date_new_assignments(project_ids, using=None):
+    """
+    Give assignments added without a period the period of their project.
+    """
+    project = Project.objects.filter(pk=OuterRef("project_id"))
+    ProjectAssignment.objects.using(using).filter(
+        project_id__in=project_ids, start_date__isnull=True
+    ).update(
+        start_date=Subquery(project.values("start_date")[:1]),
+        end_date=Subquery(project.values("end_date")[:1]),
+    )
+
+
+def employee_load(periods, start, end):
+    """
+    Load of one employee over ``[start, end]`` from their overlapping
+    ``(allocation, start_date, end_date)`` periods: the peak allocation and
+    peak number of concurrent projects on any day, and the allocation
+    averaged over every day of the range.
+    """
+    events = []
+    booked = 0
+    for allocation, period_start, period_end in periods:
+        low, high = max(period_start, start), min(period_end, end)
+        # A period ends the day after its last day, before anything that
+        # starts that day.
+        events.append((low, allocation, 1))
+        events.append((high + timedelta(days=1), -allocation, -1))
+        booked += allocation * ((high - low).days + 1)
+    events.sort()
+
+    allocation = projects = peak_allocation = peak_projects = 0
+    for _, allocation_change, project_change in events:
+        allocation += allocation_change
+        projects += project_change
+        peak_allocation = max(peak_allocation, allocation)
+        peak_projects = max(peak_projects, projects)
+    return {
+        "peak_allocation": peak_allocation,
+        "peak_projects": peak_projects,
+        "utilization": round(booked / ((end - start).days + 1), 1),
+    }
+
+
+def department_calendar(department_id, start, end):
+    """
+    Load of every employee in the subtree of ``department_id`` over
+    ``[start, end]``, ordered by name.
+    """
+    departments = hierarchy.subtree(department_id)
+    periods = defaultdict(list)
+    projects = defaultdict(list)
+    for employee_id, project_id, allocation, period_start, period_end in (
+        ProjectAssignment.objects.filter(employee__department_id__in=departments)
+        .overlapping(start, end)
+        .order_by("employee_id", "start_date", "project_id")
+        .values_list("employee_id", "project_id", "allocation", "start_date", "end_date")
+    ):
+        periods[employee_id].append((allocation, period_start, period_end))
+        projects[employee_id].append(project_id)
+
+    return [
+        {
+            "employee": pk,
+            "name": name,
+            "department": department,
+            "projects": projects[pk],
+            **employee_load(periods[pk], start, end),
+        }
+        for pk, name, department in Employee.objects.filter(department_id__in=departments)
+        .order_by("name", "pk")
+        .values_list("pk", "name", "department_id")
+    ]
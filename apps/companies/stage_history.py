@@ -0,0 +1,159 @@
+import bisect
+import operator
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import PerformanceReview, ReviewStageTransition, StageDurationBucket
+
+# Upper edges, in seconds, of the time-in-stage histogram buckets; the
+# last bucket is open-ended.
+BUCKET_BOUNDS = [
+    3600,
+    6 * 3600,
+    86400,
+    2 * 86400,
+    3 * 86400,
+    7 * 86400,
+    14 * 86400,
+    30 * 86400,
+    60 * 86400,
+    90 * 86400,
+]
+
+PERCENTILES = {"p50_seconds": 0.5, "p90_seconds": 0.9, "p99_seconds": 0.99}
+
+
+def bucket_for(seconds):
+    return bisect.bisect_left(BUCKET_BOUNDS, seconds)
+
+
+def record_transitions(rows, transitioned_at=None):
+    """
+    Append history rows and add their durations to the stage histograms.
+
+    ``rows`` are ``(review_id, company_id, department_id, from_stage,
+    to_stage, from_stage_entered_at)`` tuples; ``from_stage`` is empty when
+    the review was just created.
+    """
+    transitioned_at = transitioned_at or timezone.now()
+    history = []
+    increments = defaultdict(lambda: [0, 0.0])
+    for review_id, company_id, department_id, from_stage, to_stage, entered_at in rows:
+        duration = None
+        if from_stage and entered_at is not None:
+            duration = max((transitioned_at - entered_at).total_seconds(), 0.0)
+            increment = increments[(company_id, department_id, from_stage, bucket_for(duration))]
+            increment[0] += 1
+            increment[1] += duration
+        history.append(
+            ReviewStageTransition(
+                review_id=review_id,
+                company_id=company_id,
+                department_id=department_id,
+                from_stage=from_stage,
+                to_stage=to_stage,
+                transitioned_at=transitioned_at,
+                duration_seconds=duration,
+            )
+        )
+    ReviewStageTransition.objects.bulk_create(history)
+    for (company_id, department_id, stage, bucket), (count, seconds) in increments.items():
+        _increment_bucket(company_id, department_id, stage, bucket, count, seconds)
+
+
+def _increment_bucket(company_id, department_id, stage, bucket, count, seconds):
+    key = {"department_id": department_id, "stage": stage, "bucket": bucket}
+    increment = {"count": F("count") + count, "total_seconds": F("total_seconds") + seconds}
+    if StageDurationBucket.objects.filter(**key).update(**increment):
+        return
+    try:
+        with transaction.atomic(using=router.db_for_write(StageDurationBucket)):
+            StageDurationBucket.objects.create(
+                company_id=company_id, count=count, total_seconds=seconds, **key
+            )
+    except IntegrityError:
+        # Created concurrently since the update above.
+        StageDurationBucket.objects.filter(**key).update(**increment)
+
+
+def histogram_percentile(counts, q):
+    """
+    Estimate the ``q`` quantile from per-bucket counts, interpolating
+    linearly inside the bucket; the open last bucket reports its lower edge.
+    """
+    total = sum(counts.values())
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for bucket in sorted(counts):
+        count = counts[bucket]
+        if seen + count >= target and count:
+            lower = BUCKET_BOUNDS[bucket - 1] if bucket else 0
+            if bucket >= len(BUCKET_BOUNDS):
+                return float(lower)
+            fraction = (target - seen) / count
+            return lower + fraction * (BUCKET_BOUNDS[bucket] - lower)
+        seen += count
+    return None
+
+
+def stage_metrics(buckets, reviews, now=None):
+    """
+    Time-in-stage statistics per non-terminal stage.
+
+    ``buckets`` and ``reviews`` are StageDurationBucket and PerformanceReview
+    querysets already narrowed to the reporting scope. A stage is a
+    bottleneck when reviews have been waiting in it longer than its
+    historical p90.
+    """
+    now = now or timezone.now()
+    stages = [stage for stage, targets in PerformanceReview.TRANSITIONS.items() if targets]
+
+    counts = defaultdict(dict)
+    totals = defaultdict(float)
+    for row in buckets.values("stage", "bucket").annotate(
+        count=Sum("count"), seconds=Sum("total_seconds")
+    ):
+        counts[row["stage"]][row["bucket"]] = row["count"]
+        totals[row["stage"]] += row["seconds"]
+
+    metrics = {}
+    for stage in stages:
+        completed = sum(counts[stage].values())
+        metrics[stage] = {
+            "stage": stage,
+            "completed": completed,
+            "mean_seconds": totals[stage] / completed if completed else None,
+            **{name: histogram_percentile(counts[stage], q) for name, q in PERCENTILES.items()},
+            "in_stage": 0,
+            "overdue": 0,
+        }
+
+    overdue = [
+        Q(stage=stage, stage_changed_at__lt=now - timedelta(seconds=row["p90_seconds"]))
+        for stage, row in metrics.items()
+        if row["p90_seconds"] is not None
+    ]
+    annotations = {"in_stage": Count("pk")}
+    if overdue:
+        annotations["overdue"] = Count("pk", filter=reduce(operator.or_, overdue))
+    current = (
+        reviews.filter(stage__in=stages).order_by().values("stage").annotate(**annotations)
+    )
+    for row in current:
+        metrics[row["stage"]].update(in_stage=row["in_stage"], overdue=row.get("overdue", 0))
+
+    bottlenecks = sorted(
+        (row for row in metrics.values() if row["overdue"]),
+        key=lambda row: (-row["overdue"], -row["p90_seconds"]),
+    )
+    return {
+        "stages": list(metrics.values()),
+        "bottlenecks": [row["stage"] for row in bottlenecks],
+    }
@@ -0,0 +1,16 @@
+'use strict';
+{
+    const $ = django.jQuery;
+
+    $(document).on('change', '.admin-autocomplete-filter', function() {
+        const url = new URL(window.location.href);
+        const parameter = this.dataset.parameter;
+        if (this.value) {
+            url.searchParams.set(parameter, this.value);
+        } else {
+            url.searchParams.delete(parameter);
+        }
+        url.searchParams.delete('p');
+        window.location.href = url.toString();
+    });
+}
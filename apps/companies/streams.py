@@ -0,0 +1,367 @@
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import Max, Q
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from apps.accounts.authentication import JWTAuthentication
+
+from .access import get_access_context
+from .models import OutboxEvent
+from .outbox import REVIEW_STAGE_CHANGED
+from .sharding import get_sharding_settings, shard_aliases
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = "/api/v1/performance-reviews/stream/"
+
+DEFAULT_REVIEW_STREAM_SETTINGS = {
+    "POLL_INTERVAL": 1.0,
+    "QUEUE_SIZE": 100,
+    "HEARTBEAT_INTERVAL": 20.0,
+    "MAX_BACKLOG": 500,
+    "GAP_TIMEOUT": 10.0,
+}
+
+# Outbox ids allocated by transactions that had not committed when a poll
+# ran are re-checked for GAP_TIMEOUT seconds, up to this many per database
+# and poll.
+MAX_GAPS_PER_POLL = 1000
+
+CLOSE = object()
+
+
+def get_review_stream_settings():
+    return {**DEFAULT_REVIEW_STREAM_SETTINGS, **getattr(settings, "REVIEW_STREAM", {})}
+
+
+# A stream position is the last outbox id seen in each database holding
+# company data. Shards allocate ids from disjoint ranges, so the event ids
+# are written as a comma separated list of ids, one per database: a plain
+# id when there are no shards.
+
+def start_position():
+    """
+    The position before every event: the start of each database's id range.
+    """
+    id_range = get_sharding_settings()["ID_RANGE"]
+    return {alias: index * id_range for index, alias in enumerate(shard_aliases())}
+
+
+def encode_position(position):
+    return ",".join(str(pk) for pk in position.values())
+
+
+def decode_position(value):
+    """
+    The position in a ``Last-Event-ID``; databases it does not mention
+    start from the beginning. None when it is malformed.
+    """
+    try:
+        pks = [int(part) for part in value.split(",")]
+    except ValueError:
+        return None
+    position = start_position()
+    aliases = list(position)
+    id_range = get_sharding_settings()["ID_RANGE"]
+    for pk in pks:
+        index = pk // id_range
+        if 0 <= index < len(aliases):
+            position[aliases[index]] = max(position[aliases[index]], pk)
+    return position
+
+
+class StreamEvent:
+    """
+    A stage change, encoded once and shared by every connection it is sent to.
+    """
+
+    __slots__ = ("id", "company_id", "department_id", "stages", "message")
+
+    def __init__(self, pk, payload, created_at, position):
+        self.id = pk
+        self.company_id = payload.get("company_id")
+        self.department_id = payload.get("department_id")
+        self.stages = {payload.get("from_stage"), payload.get("to_stage")}
+        data = json.dumps({**payload, "occurred_at": created_at}, cls=DjangoJSONEncoder)
+        self.message = f"id: {position}\nevent: stage_changed\ndata: {data}\n\n".encode()
+
+
+class Subscriber:
+    """
+    One open stream: its filter and a bounded queue of pending events.
+    """
+
+    __slots__ = ("context", "stages", "queue")
+
+    def __init__(self, context, stages, maxsize):
+        self.context = context
+        self.stages = stages
+        self.queue = asyncio.Queue(maxsize)
+
+    def accepts(self, event):
+        if self.stages and not self.stages & event.stages:
+            return False
+        return self.context.permits("reviews", event.company_id, event.department_id)
+
+    def offer(self, event):
+        """
+        Queue ``event`` if it is visible here; False when the queue is full.
+        """
+        if not self.accepts(event):
+            return True
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def close(self):
+        # Drop anything pending: a client that reconnects resumes from
+        # the outbox with Last-Event-ID.
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(CLOSE)
+
+
+class ReviewEventBroker:
+    """
+    Polls the outbox of every database once per process and fans stage
+    changes out to every open stream. The poller only runs while someone
+    is subscribed.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.task = None
+        self.ready = None
+        self.cursors = {}
+        self.gaps = {}
+
+    async def subscribe(self, context, stages):
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.ready = asyncio.Event()
+            self.task = loop.create_task(self.run())
+        subscriber = Subscriber(context, stages, get_review_stream_settings()["QUEUE_SIZE"])
+        self.subscribers.add(subscriber)
+        await self.ready.wait()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def run(self):
+        self.cursors = await sync_to_async(self.latest_ids)()
+        self.gaps = {alias: {} for alias in self.cursors}
+        self.ready.set()
+        interval = get_review_stream_settings()["POLL_INTERVAL"]
+        while self.subscribers:
+            await asyncio.sleep(interval)
+            try:
+                events = await sync_to_async(self.poll)()
+            except Exception:
+                logger.exception("Polling the outbox for review events failed")
+                continue
+            self.publish(events)
+
+    def publish(self, events):
+        for event in events:
+            for subscriber in list(self.subscribers):
+                if not subscriber.offer(event):
+                    logger.info("Closing review stream that fell %d events behind",
+                                subscriber.queue.qsize())
+                    subscriber.close()
+                    self.subscribers.discard(subscriber)
+
+    def position(self):
+        return encode_position(self.cursors)
+
+    def latest_ids(self):
+        close_old_connections()
+        latest = {}
+        for alias, start in start_position().items():
+            pk = OutboxEvent.objects.using(alias).aggregate(latest=Max("id"))["latest"]
+            latest[alias] = pk or start
+        return latest
+
+    def poll(self):
+        close_old_connections()
+        events = []
+        for alias in self.cursors:
+            events += self.poll_database(alias)
+        return events
+
+    def poll_database(self, alias):
+        now = time.monotonic()
+        timeout = get_review_stream_settings()["GAP_TIMEOUT"]
+        gaps = {pk: seen for pk, seen in self.gaps[alias].items() if now - seen < timeout}
+        self.gaps[alias] = gaps
+
+        cursor = self.cursors[alias]
+        condition = Q(pk__gt=cursor)
+        if gaps:
+            condition |= Q(pk__in=list(gaps))
+        rows = (
+            OutboxEvent.objects.using(alias)
+            .filter(condition)
+            .order_by("id")
+            .values_list("id", "event_type", "payload", "created_at")[:1000]
+        )
+
+        events = []
+        for pk, event_type, payload, created_at in rows:
+            if pk > cursor:
+                for missing in range(max(cursor + 1, pk - MAX_GAPS_PER_POLL), pk):
+                    gaps.setdefault(missing, now)
+                cursor = self.cursors[alias] = pk
+            else:
+                gaps.pop(pk, None)
+            if event_type == REVIEW_STAGE_CHANGED:
+                events.append(StreamEvent(pk, payload, created_at, self.position()))
+        return events
+
+
+broker = ReviewEventBroker()
+
+
+def authenticate(raw_token):
+    backend = JWTAuthentication()
+    close_old_connections()
+    try:
+        user = backend.get_user(backend.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    context = get_access_context(user)
+    if context.role == "manager" and context.has_profile:
+        # Events are matched against the subtree in the event loop, where
+        # it cannot be queried.
+        context.subtree_ids
+    return user
+
+
+def fetch_backlog(position, limit):
+    """
+    Stage changes after ``position`` in every database, oldest first; the
+    flag is True when there were more than ``limit``.
+    """
+    close_old_connections()
+    rows = []
+    for alias, last_id in position.items():
+        rows += [
+            (alias, *row)
+            for row in OutboxEvent.objects.using(alias)
+            .filter(pk__gt=last_id, event_type=REVIEW_STAGE_CHANGED)
+            .order_by("id")
+            .values_list("id", "payload", "created_at")[: limit + 1]
+        ]
+    rows.sort(key=lambda row: (row[3], row[1]))
+    position = dict(position)
+    events = []
+    for alias, pk, payload, created_at in rows[:limit]:
+        position[alias] = max(position[alias], pk)
+        events.append(StreamEvent(pk, payload, created_at, encode_position(position)))
+    return events, len(rows) > limit
+
+
+def _get_token(headers, params):
+    authorization = headers.get(b"authorization", b"").decode()
+    if authorization.startswith("Bearer "):
+        return authorization[len("Bearer "):]
+    return params.get("token", [None])[0]
+
+
+def _get_last_event_id(headers, params):
+    value = headers.get(b"last-event-id", b"").decode() or params.get("last_event_id", [""])[0]
+    return decode_position(value) if value else None
+
+
+async def _close_on_disconnect(receive, subscriber):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    subscriber.close()
+
+
+async def review_stream(scope, receive, send):
+    """
+    ASGI endpoint streaming review stage changes as server-sent events.
+
+    Visibility follows PerformanceReviewListView's role scoping; ``?stage=``
+    (comma separated) keeps changes into or out of those stages. Clients
+    resume with the ``Last-Event-ID`` header (or ``?last_event_id=``), which
+    holds one outbox id per database; when they are too far behind they get
+    a ``reset`` event and should reload.
+    Browsers that cannot set headers may pass the access token as ``?token=``.
+    """
+    conf = get_review_stream_settings()
+    headers = dict(scope["headers"])
+    params = parse_qs(scope["query_string"].decode())
+
+    token = _get_token(headers, params)
+    user = await sync_to_async(authenticate)(token) if token else None
+    if user is None:
+        body = json.dumps({"detail": "Authentication credentials were not provided or are invalid."})
+        await send({
+            "type": "http.response.start",
+            "status": 401,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": body.encode()})
+        return
+
+    stages = {stage for value in params.get("stage", []) for stage in value.split(",") if stage}
+    last_id = _get_last_event_id(headers, params)
+    subscriber = await broker.subscribe(get_access_context(user), stages)
+    watcher = asyncio.ensure_future(_close_on_disconnect(receive, subscriber))
+
+    async def write(message):
+        await send({"type": "http.response.body", "body": message, "more_body": True})
+
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+        await write(b"retry: 3000\n\n")
+
+        replayed = set()
+        if last_id is not None:
+            backlog, truncated = await sync_to_async(fetch_backlog)(last_id, conf["MAX_BACKLOG"])
+            if truncated:
+                await write(f"id: {broker.position()}\nevent: reset\ndata: {{}}\n\n".encode())
+            else:
+                for event in backlog:
+                    if subscriber.accepts(event):
+                        await write(event.message)
+                        replayed.add(event.id)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscriber.queue.get(), conf["HEARTBEAT_INTERVAL"]
+                )
+            except asyncio.TimeoutError:
+                await write(b": ping\n\n")
+                continue
+            if event is CLOSE:
+                break
+            if event.id not in replayed:
+                await write(event.message)
+        await send({"type": "http.response.body", "body": b""})
+    except OSError:
+        pass
+    finally:
+        broker.unsubscribe(subscriber)
+        watcher.cancel()
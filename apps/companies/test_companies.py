@@ -0,0 +1,1512 @@
+import json
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.companies.models import (
+    ArchivedPerformanceReview,
+    Collaboration,
+    Company,
+    CompanyShard,
+    DeletionJob,
+    Department,
+    DepartmentClosure,
+    Employee,
+    OutboxEvent,
+    PerformanceReview,
+    Project,
+    ProjectAssignment,
+    ReviewStageTransition,
+    Tombstone,
+    VersionConflict,
+)
+from apps.companies import hierarchy
+from apps.companies.changes import encode_cursor
+from apps.companies.outbox import OutboxDispatcher, WebhookSink, employee_department_changed
+from apps.companies.sharding import CompanyMoving, use_company
+from apps.companies.snapshots import insert_rows
+from apps.companies.streams import STREAM_PATH, review_stream
+
+
+User = get_user_model()
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def settled_change_feed(settings):
+    # Change feeds return rows as soon as they are written, unless a test
+    # sets a settle window of its own.
+    settings.CHANGE_FEED = {"SETTLE_SECONDS": 0}
+
+
+def create_employee(company, department, username, role="employee", **extra):
+    user = User.objects.create_user(
+        username=username,
+        email=f"{username}@example.com",
+        password=None,
+        role=role,
+    )
+    return Employee.objects.create(
+        company=company,
+        department=department,
+        user=user,
+        name=username.title(),
+        email=f"{username}@acme.com",
+        mobile_number="+1234567890",
+        address="Main street",
+        designation=extra.pop("designation", "Engineer"),
+        **extra,
+    )
+
+
+@pytest.fixture
+def api_client() -> APIClient:
+    return APIClient()
+
+
+@pytest.fixture
+def company() -> Company:
+    return Company.objects.create(name="Acme")
+
+
+@pytest.fixture
+def department(company: Company) -> Department:
+    return Department.objects.create(company=company, name="Engineering")
+
+
+@pytest.fixture
+def other_department(company: Company) -> Department:
+    return Department.objects.create(company=company, name="Sales")
+
+
+@pytest.fixture
+def admin_user() -> User:
+    return User.objects.create_user(
+        username="admin",
+        email="admin@example.com",
+        password="testpass123",
+        role="admin",
+    )
+
+
+@pytest.fixture
+def manager(company: Company, department: Department) -> Employee:
+    return create_employee(company, department, "manager", role="manager")
+
+
+@pytest.fixture
+def employee(company: Company, department: Department) -> Employee:
+    return create_employee(company, department, "employee")
+
+
+@pytest.fixture
+def other_employee(company: Company, other_department: Department) -> Employee:
+    return create_employee(company, other_department, "outsider")
+
+
+@pytest.fixture
+def project(company: Company, department: Department, employee: Employee) -> Project:
+    project = Project.objects.create(
+        company=company,
+        department=department,
+        name="Apollo",
+        description="Description",
+        start_date="2025-01-01",
+        end_date="2025-12-31",
+    )
+    project.assigned_employees.add(employee)
+    return project
+
+
+@pytest.fixture
+def review(employee: Employee, manager: Employee) -> PerformanceReview:
+    return PerformanceReview.objects.create(employee=employee, reviewer=manager)
+
+
+@pytest.fixture
+def populated_company(company: Company, department: Department, manager: Employee):
+    employees = [
+        create_employee(company, department, f"staff{index}") for index in range(6)
+    ]
+    for index, member in enumerate(employees):
+        project = Project.objects.create(
+            company=company,
+            department=department,
+            name=f"Project {index}",
+            description="Description",
+            start_date="2025-01-01",
+            end_date="2025-12-31",
+        )
+        project.assigned_employees.add(member, manager)
+        PerformanceReview.objects.create(employee=member, reviewer=manager)
+    for index in range(5):
+        Department.objects.create(company=company, name=f"Team {index}")
+        Company.objects.create(name=f"Company {index}")
+    return company
+
+
+@pytest.mark.parametrize(
+    "url_name",
+    [
+        "company-list",
+        "department-list",
+        "employee-list",
+        "project-list",
+        "performance-review-list",
+    ],
+)
+def test_list_views_do_not_repeat_queries(
+    api_client: APIClient, admin_user: User, populated_company, settings, url_name
+):
+    settings.NPLUSONE = {"MODE": "raise", "THRESHOLD": 3}
+    api_client.force_authenticate(admin_user)
+
+    response = api_client.get(reverse(url_name))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["count"] > 3
+
+
+def test_seed_org_is_deterministic_and_covers_every_stage():
+    call_command("seed_org", scale=0.2, companies=2, departments=2, seed=7, prefix="a")
+    call_command("seed_org", scale=0.2, companies=2, departments=2, seed=7, prefix="b")
+
+    first = Employee.objects.filter(company__name__startswith="a ").order_by("pk")
+    second = Employee.objects.filter(company__name__startswith="b ").order_by("pk")
+    assert first.count() == second.count() == 2 * 2 * 5
+    assert list(first.values_list("designation", "hired_on")) == list(
+        second.values_list("designation", "hired_on")
+    )
+    assert set(PerformanceReview.objects.values_list("stage", flat=True)) == {
+        stage for stage, _ in PerformanceReview.STAGE_CHOICES
+    }
+    assert User.objects.filter(username__startswith="a-", role="manager").count() == 4
+    seeded_user = User.objects.filter(username__startswith="a-u").first()
+    assert seeded_user.check_password("seedpass123")
+    # The bulk loads are followed by the rebuilds the skipped signals would do.
+    departments = Department.objects.filter(company__name__startswith="a ")
+    assert DepartmentClosure.objects.filter(descendant__in=departments).count() == 4
+    members = {}
+    for project_id, employee_id in ProjectAssignment.objects.filter(
+        project__company__name__startswith="a "
+    ).values_list("project", "employee"):
+        members.setdefault(project_id, set()).add(employee_id)
+    edges = Collaboration.objects.filter(employee__company__name__startswith="a ")
+    assert set(edges.values_list("employee", "colleague")) == {
+        (employee, colleague)
+        for team in members.values()
+        for employee in team
+        for colleague in team
+        if employee != colleague
+    }
+
+
+@pytest.fixture
+def superuser() -> User:
+    return User.objects.create_superuser(
+        username="root", email="root@example.com", password="testpass123"
+    )
+
+
+@pytest.mark.parametrize(
+    "model_name", ["company", "department", "employee", "project", "performancereview"]
+)
+def test_admin_changelists_do_not_repeat_queries(
+    client, superuser: User, populated_company, settings, model_name
+):
+    settings.NPLUSONE = {"MODE": "raise", "THRESHOLD": 3}
+    client.force_login(superuser)
+
+    response = client.get(reverse(f"admin:companies_{model_name}_changelist"))
+
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_admin_autocomplete_filter_loads_only_selected_value(
+    client, superuser: User, populated_company, department: Department
+):
+    client.force_login(superuser)
+
+    response = client.get(
+        reverse("admin:companies_employee_changelist"),
+        {"department__id__exact": department.pk},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    content = response.content.decode()
+    assert f'<option value="{department.pk}" selected>{department}</option>' in content
+    assert "Team 1" not in content
+
+
+def test_admin_bulk_transition_updates_only_eligible_reviews(
+    client, superuser: User, employee: Employee, manager: Employee
+):
+    pending = PerformanceReview.objects.create(employee=employee)
+    approved = PerformanceReview.objects.create(employee=manager, stage="review_approved")
+    client.force_login(superuser)
+
+    response = client.post(
+        reverse("admin:companies_performancereview_changelist"),
+        {
+            "action": "transition_to_review_scheduled",
+            "_selected_action": [pending.pk, approved.pk],
+        },
+    )
+
+    assert response.status_code == status.HTTP_302_FOUND
+    pending.refresh_from_db()
+    approved.refresh_from_db()
+    assert pending.stage == "review_scheduled"
+    assert approved.stage == "review_approved"
+    event = OutboxEvent.objects.get()
+    assert event.aggregate_id == pending.pk
+    assert event.payload["from_stage"] == "pending_review"
+    assert event.payload["to_stage"] == "review_scheduled"
+    assert pending.stage_transitions.filter(from_stage="pending_review").exists()
+
+
+def authenticate(api_client: APIClient, user: User):
+    token = RefreshToken.for_user(user).access_token
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+
+@pytest.mark.parametrize(
+    "url_name, fixture_name",
+    [
+        ("employee-detail", "employee"),
+        ("department-detail", "department"),
+        ("performance-review-detail", "review"),
+    ],
+)
+def test_detail_get_costs_one_query_after_authentication(
+    api_client: APIClient,
+    manager: Employee,
+    django_assert_num_queries,
+    request,
+    url_name,
+    fixture_name,
+):
+    obj = request.getfixturevalue(fixture_name)
+    authenticate(api_client, manager.user)
+
+    # One query authenticates the user together with their profile.
+    with django_assert_num_queries(2):
+        response = api_client.get(reverse(url_name, args=[obj.pk]))
+
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_project_detail_checks_assignment_without_extra_queries(
+    api_client: APIClient, employee: Employee, project: Project, django_assert_num_queries
+):
+    authenticate(api_client, employee.user)
+
+    # User, then the project with its assigned ids.
+    with django_assert_num_queries(2):
+        response = api_client.get(reverse("project-detail", args=[project.pk]))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["assigned_employees"] == [employee.pk]
+    assert response.data["assigned_employees_count"] == 1
+
+
+def test_detail_outside_role_scope_is_not_found(
+    api_client: APIClient, manager: Employee, other_employee: Employee
+):
+    api_client.force_authenticate(manager.user)
+
+    response = api_client.get(reverse("employee-detail", args=[other_employee.pk]))
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_employee_cannot_read_colleague_review(
+    api_client: APIClient, employee: Employee, other_employee: Employee
+):
+    review = PerformanceReview.objects.create(employee=other_employee)
+    api_client.force_authenticate(employee.user)
+
+    response = api_client.get(reverse("performance-review-detail", args=[review.pk]))
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+def test_change_feed_pages_changes_and_reports_deletes(
+    api_client: APIClient, admin_user: User, company: Company, department: Department
+):
+    employees = [create_employee(company, department, f"sync{index}") for index in range(3)]
+    api_client.force_authenticate(admin_user)
+    url = reverse("employee-changes")
+
+    first = api_client.get(url, {"limit": 2})
+    second = api_client.get(url, {"cursor": first.data["cursor"], "limit": 2})
+
+    assert first.status_code == status.HTTP_200_OK
+    assert [row["id"] for row in first.data["results"]] == [e.pk for e in employees[:2]]
+    assert first.data["has_more"] is True
+    assert [row["id"] for row in second.data["results"]] == [employees[2].pk]
+    assert second.data["has_more"] is False
+
+    employees[0].designation = "Lead"
+    employees[0].save()
+    deleted_pk = employees[1].pk
+    employees[1].delete()
+
+    incremental = api_client.get(url, {"cursor": second.data["cursor"]})
+
+    assert [row["id"] for row in incremental.data["results"]] == [employees[0].pk]
+    assert [row["id"] for row in incremental.data["deleted"]] == [deleted_pk]
+
+
+def test_change_feed_holds_back_changes_until_they_settle(
+    api_client: APIClient, admin_user: User, company: Company, department: Department, settings
+):
+    settings.CHANGE_FEED = {"SETTLE_SECONDS": 60}
+    now = timezone.now()
+    settled, recent = (create_employee(company, department, name) for name in ("old", "recent"))
+    Employee.objects.filter(pk=settled.pk).update(updated_at=now - timedelta(minutes=2))
+    Employee.objects.filter(pk=recent.pk).update(updated_at=now - timedelta(seconds=10))
+    Tombstone.objects.create(model="employee", object_id=999, deleted_at=now - timedelta(seconds=5))
+    api_client.force_authenticate(admin_user)
+    url = reverse("employee-changes")
+
+    first = api_client.get(url)
+    assert [row["id"] for row in first.data["results"]] == [settled.pk]
+    assert first.data["deleted"] == []
+    assert first.data["has_more"] is True
+
+    # A transaction that stamped its row before the read commits after it.
+    late = create_employee(company, department, "late")
+    Employee.objects.filter(pk=late.pk).update(updated_at=now - timedelta(seconds=20))
+    # A minute later, everything has settled.
+    settings.CHANGE_FEED = {"SETTLE_SECONDS": 0}
+
+    second = api_client.get(url, {"cursor": first.data["cursor"]})
+    assert [row["id"] for row in second.data["results"]] == [late.pk, recent.pk]
+    assert [row["id"] for row in second.data["deleted"]] == [999]
+    assert second.data["has_more"] is False
+
+
+def test_change_feed_sees_cascaded_deletes_and_assignment_changes(
+    api_client: APIClient, admin_user: User, project: Project, department: Department, employee: Employee
+):
+    api_client.force_authenticate(admin_user)
+    watermark = api_client.get(reverse("project-changes")).data["cursor"]
+
+    project.assigned_employees.remove(employee)
+    touched = api_client.get(reverse("project-changes"), {"cursor": watermark})
+    assert [row["assigned_employees"] for row in touched.data["results"]] == [[]]
+
+    department.delete()
+    since = (timezone.now() - timedelta(days=1)).isoformat()
+    deleted = api_client.get(reverse("employee-changes"), {"updated_since": since})
+    assert employee.pk in [row["id"] for row in deleted.data["deleted"]]
+    projects = api_client.get(reverse("project-changes"), {"cursor": touched.data["cursor"]})
+    assert [row["id"] for row in projects.data["deleted"]] == [project.pk]
+
+
+def test_change_feed_scopes_tombstones_by_role(
+    api_client: APIClient, manager: Employee, employee: Employee, other_employee: Employee
+):
+    other_employee.delete()
+    employee_pk = employee.pk
+    employee.delete()
+    api_client.force_authenticate(manager.user)
+
+    response = api_client.get(reverse("employee-changes"))
+
+    assert [row["id"] for row in response.data["deleted"]] == [employee_pk]
+
+
+def test_change_feed_purges_tombstones_and_expires_old_cursors(
+    api_client: APIClient, admin_user: User, employee: Employee
+):
+    api_client.force_authenticate(admin_user)
+    url = reverse("employee-changes")
+    cursor = api_client.get(url).data["cursor"]
+    employee.delete()
+    old = Tombstone.objects.create(
+        model="employee", object_id=999, deleted_at=timezone.now() - timedelta(days=31)
+    )
+
+    call_command("purge_tombstones")
+
+    assert not Tombstone.objects.filter(pk=old.pk).exists()
+    assert Tombstone.objects.filter(model="employee").count() == 1
+    # A quiet feed keeps its cursor inside the retention window.
+    assert api_client.get(url, {"cursor": cursor}).status_code == status.HTTP_200_OK
+    stale = (timezone.now() - timedelta(days=31)).isoformat()
+    assert api_client.get(url, {"updated_since": stale}).status_code == status.HTTP_410_GONE
+    expired = encode_cursor((timezone.now(), 0, timezone.now() - timedelta(days=31), 0))
+    assert api_client.get(url, {"cursor": expired}).status_code == status.HTTP_410_GONE
+
+
+def test_review_tombstones_cost_the_same_for_any_number_of_reviews(
+    company: Company, department: Department, manager: Employee
+):
+    few = create_employee(company, department, "few")
+    many = create_employee(company, department, "many")
+    PerformanceReview.objects.create(employee=few, reviewer=manager)
+    for _ in range(6):
+        PerformanceReview.objects.create(employee=many, reviewer=manager)
+    many_pk = many.pk
+
+    with CaptureQueriesContext(connection) as one:
+        few.delete()
+    with CaptureQueriesContext(connection) as six:
+        many.delete()
+
+    assert len(six) == len(one)
+    tombstones = Tombstone.objects.filter(model="performancereview", company_id=company.pk)
+    assert tombstones.count() == 7
+    assert tombstones.filter(department_id=department.pk).count() == 7
+    assert not PerformanceReview.objects.filter(employee_id=many_pk).exists()
+
+
+def test_cascaded_deletes_write_each_models_tombstones_at_once(
+    company: Company, department: Department
+):
+    for index in range(3):
+        create_employee(company, department, f"gone{index}")
+        Project.objects.create(
+            company=company, department=department, name=f"Gone {index}", description="",
+            start_date=date(2025, 1, 1), end_date=date(2025, 12, 31),
+        )
+
+    with CaptureQueriesContext(connection) as queries:
+        company.delete()
+
+    inserts = [q["sql"] for q in queries if q["sql"].startswith('INSERT INTO "companies_tombstone"')]
+    assert len(inserts) == 3
+    assert Tombstone.objects.filter(model="employee").count() == 3
+    assert Tombstone.objects.filter(model="project", department_id=department.pk).count() == 3
+    assert Tombstone.objects.filter(model="department").count() == 1
+
+
+def test_cascaded_assignment_deletes_touch_projects_once(
+    company: Company, department: Department, project: Project
+):
+    members = [create_employee(company, department, f"crew{index}") for index in range(20)]
+    project.assigned_employees.add(*members)
+    other = Project.objects.create(
+        company=company, department=department, name="Other", description="",
+        start_date="2025-01-01", end_date="2025-12-31",
+    )
+    other.assigned_employees.add(members[0])
+    version = Project.objects.get(pk=other.pk).version
+
+    with CaptureQueriesContext(connection) as queries:
+        project.delete()
+    project_queries = [q["sql"] for q in queries if '"companies_project"' in q["sql"]]
+    # The project's own delete, and nothing per assignment.
+    assert len(project_queries) == 1 and project_queries[0].startswith("DELETE")
+
+    with CaptureQueriesContext(connection) as queries:
+        members[0].delete()
+    touches = [q["sql"] for q in queries if q["sql"].startswith('UPDATE "companies_project"')]
+    assert len(touches) == 1
+    assert Project.objects.get(pk=other.pk).version == version + 1
+
+
+def test_cascaded_deletes_uncount_collaborations_in_constant_queries(
+    company: Company, department: Department
+):
+    def staffed(name, members):
+        project = Project.objects.create(
+            company=company, department=department, name=name, description="",
+            start_date="2025-01-01", end_date="2025-12-31",
+        )
+        project.assigned_employees.add(*members)
+        return project
+
+    def edges():
+        return set(
+            Collaboration.objects.values_list("employee_id", "colleague_id", "shared_projects")
+        )
+
+    crew = [create_employee(company, department, f"crew{index}") for index in range(24)]
+    small, large = staffed("Small", crew[:3]), staffed("Large", crew[3:23])
+    for index in range(5):
+        staffed(f"Side{index}", [crew[22], crew[index], crew[23]])
+
+    with CaptureQueriesContext(connection) as few:
+        small.delete()
+    with CaptureQueriesContext(connection) as many:
+        large.delete()
+    assert len(many) == len(few)
+
+    # One project against five, each shared with other members.
+    with CaptureQueriesContext(connection) as few:
+        crew[0].delete()
+    with CaptureQueriesContext(connection) as many:
+        crew[22].delete()
+    assert len(many) == len(few)
+
+    remaining = edges()
+    call_command("rebuild_collaborations")
+    assert edges() == remaining
+
+
+def test_change_feed_rejects_malformed_cursor(api_client: APIClient, admin_user: User):
+    api_client.force_authenticate(admin_user)
+
+    response = api_client.get(reverse("employee-changes"), {"cursor": "not-a-cursor"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_stage_and_department_changes_write_outbox_events(
+    api_client: APIClient, manager: Employee, employee: Employee, review: PerformanceReview,
+    department: Department, other_department: Department,
+):
+    authenticate(api_client, manager.user)
+
+    api_client.post(
+        reverse("performance-review-transition", args=[review.pk]),
+        {"new_stage": "review_scheduled"},
+    )
+    api_client.patch(reverse("employee-detail", args=[employee.pk]), {"designation": "Lead"})
+    employee.department = other_department
+    employee.save()
+
+    events = list(OutboxEvent.objects.values_list("event_type", "aggregate_id", "payload"))
+    assert events == [
+        ("performance_review.stage_changed", review.pk, {
+            "review_id": review.pk,
+            "employee_id": employee.pk,
+            "company_id": employee.company_id,
+            "department_id": department.pk,
+            "reviewer_id": review.reviewer_id,
+            "from_stage": "pending_review",
+            "to_stage": "review_scheduled",
+        }),
+        ("employee.department_changed", employee.pk, {
+            "employee_id": employee.pk,
+            "user_id": employee.user_id,
+            "company_id": employee.company_id,
+            "from_department_id": department.pk,
+            "to_department_id": other_department.pk,
+        }),
+    ]
+
+
+@pytest.fixture
+def webhook_receiver():
+    """
+    Local stand-in for a downstream webhook: records batches and fails
+    the next ``fail`` requests with a 503.
+    """
+    state = {"batches": [], "fail": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if state["fail"]:
+                state["fail"] -= 1
+                self.send_response(503)
+            else:
+                state["batches"].append(json.loads(body)["events"])
+                self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}/hooks"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def test_outbox_dispatcher_retries_and_keeps_aggregate_order(
+    webhook_receiver, review: PerformanceReview, employee: Employee
+):
+    for stage in ["review_scheduled", "feedback_provided", "under_review"]:
+        review.stage = stage
+        review.save()
+    dispatcher = OutboxDispatcher(sink=WebhookSink(webhook_receiver["url"]), batch_size=2)
+
+    webhook_receiver["fail"] = 1
+    assert dispatcher.drain() == 0
+    failed = OutboxEvent.objects.filter(attempts=1)
+    assert failed.count() == 2
+    assert "503" in failed.first().last_error
+
+    # Backed-off events hold back later events for the same aggregate.
+    assert dispatcher.drain() == 0
+    failed.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+    assert dispatcher.drain() == 3
+
+    delivered = [event for batch in webhook_receiver["batches"] for event in batch]
+    assert [event["data"]["to_stage"] for event in delivered] == [
+        "review_scheduled", "feedback_provided", "under_review"
+    ]
+    assert not OutboxEvent.objects.filter(delivered_at__isnull=True).exists()
+
+
+def test_outbox_claims_never_overtake_an_aggregates_claimed_head(
+    review: PerformanceReview, employee: Employee
+):
+    for stage in ["review_scheduled", "feedback_provided"]:
+        review.stage = stage
+        review.save()
+    employee_event = employee_department_changed(employee, employee.department_id)
+    employee_event.save()
+    first, second = OutboxDispatcher(batch_size=1), OutboxDispatcher(batch_size=3)
+
+    head = first.claim()
+    # The review's head is leased by the first dispatcher; its next event
+    # must wait even though it is due.
+    assert [event.payload["to_stage"] for event in head] == ["review_scheduled"]
+    assert [event.pk for event in second.claim()] == [employee_event.pk]
+    assert second.claim() == []
+
+    OutboxEvent.objects.filter(pk=head[0].pk).update(delivered_at=timezone.now())
+    assert [event.payload["to_stage"] for event in second.claim()] == ["feedback_provided"]
+
+
+def test_outbox_dead_letters_events_that_keep_failing(
+    webhook_receiver, review: PerformanceReview, settings
+):
+    settings.OUTBOX = {**settings.OUTBOX, "MAX_ATTEMPTS": 2}
+    for stage in ["review_scheduled", "feedback_provided"]:
+        review.stage = stage
+        review.save()
+    dispatcher = OutboxDispatcher(sink=WebhookSink(webhook_receiver["url"]), batch_size=1)
+    poison = OutboxEvent.objects.order_by("id").first()
+
+    webhook_receiver["fail"] = 2
+    for _ in range(2):
+        assert dispatcher.drain() == 0
+        OutboxEvent.objects.update(next_attempt_at=timezone.now())
+    poison.refresh_from_db()
+    assert (poison.attempts, poison.dead_lettered_at is not None) == (2, True)
+
+    # The dead letter no longer holds back the rest of its aggregate.
+    assert dispatcher.drain() == 1
+    poison.refresh_from_db()
+    assert poison.delivered_at is None
+
+
+def open_stream(user=None, query="", headers=()):
+    headers = list(headers)
+    if user is not None:
+        token = RefreshToken.for_user(user).access_token
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    scope = {
+        "type": "http", "method": "GET", "path": STREAM_PATH,
+        "query_string": query.encode(), "headers": headers,
+    }
+    return ApplicationCommunicator(review_stream, scope)
+
+
+async def read_events(stream, count):
+    events = []
+    while len(events) < count:
+        body = (await stream.receive_output(timeout=5))["body"].decode()
+        events += [
+            dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+            for block in body.split("\n\n")
+            if block.startswith("id:")
+        ]
+    return events
+
+
+def test_review_stream_requires_token():
+    stream = open_stream()
+
+    async def scenario():
+        await stream.send_input({"type": "http.request"})
+        return await stream.receive_output(timeout=5)
+
+    assert async_to_sync(scenario)()["status"] == status.HTTP_401_UNAUTHORIZED
+
+
+def test_review_stream_resumes_and_pushes_scoped_changes(
+    settings, manager: Employee, employee: Employee, other_employee: Employee, review: PerformanceReview
+):
+    settings.REVIEW_STREAM = {"POLL_INTERVAL": 0.05}
+    hidden = PerformanceReview.objects.create(employee=other_employee)
+    review.stage = "review_scheduled"
+    review.save()
+    hidden.stage = "review_scheduled"
+    hidden.save()
+
+    def transition():
+        review.stage = "feedback_provided"
+        review.save()
+
+    stream = open_stream(manager.user, headers=[(b"last-event-id", b"0")])
+
+    async def scenario():
+        await stream.send_input({"type": "http.request"})
+        start = await stream.receive_output(timeout=5)
+        replayed = await read_events(stream, 1)
+        await sync_to_async(transition)()
+        live = await read_events(stream, 1)
+        await stream.send_input({"type": "http.disconnect"})
+        await stream.wait(timeout=5)
+        return start, replayed, live
+
+    start, replayed, live = async_to_sync(scenario)()
+
+    assert start["status"] == status.HTTP_200_OK
+    assert [json.loads(e["data"])["to_stage"] for e in replayed] == ["review_scheduled"]
+    assert json.loads(live[0]["data"])["review_id"] == review.pk
+    assert json.loads(live[0]["data"])["to_stage"] == "feedback_provided"
+    assert int(live[0]["id"]) > int(replayed[0]["id"])
+
+
+def test_stage_history_feeds_time_in_stage_metrics(
+    api_client: APIClient, manager: Employee, employee: Employee, other_employee: Employee
+):
+    now = timezone.now()
+    moved = PerformanceReview.objects.create(employee=employee)
+    waiting = PerformanceReview.objects.create(employee=employee)
+    PerformanceReview.objects.create(employee=other_employee)
+    PerformanceReview.objects.filter(pk=moved.pk).update(stage_changed_at=now - timedelta(days=2))
+    PerformanceReview.objects.filter(pk=waiting.pk).update(stage_changed_at=now - timedelta(days=10))
+    authenticate(api_client, manager.user)
+
+    api_client.post(
+        reverse("performance-review-transition", args=[moved.pk]),
+        {"new_stage": "review_scheduled"},
+    )
+    response = api_client.get(reverse("performance-review-stage-metrics"))
+
+    history = list(moved.stage_transitions.values_list("from_stage", "to_stage"))
+    assert history == [("", "pending_review"), ("pending_review", "review_scheduled")]
+    assert moved.stage_transitions.last().duration_seconds == pytest.approx(2 * 86400, abs=60)
+    pending = response.data["stages"][0]
+    assert pending["stage"] == "pending_review"
+    assert (pending["completed"], pending["in_stage"], pending["overdue"]) == (1, 1, 1)
+    assert 2 * 86400 <= pending["p50_seconds"] <= 3 * 86400
+    assert response.data["bottlenecks"] == ["pending_review"]
+
+
+def test_workspace_is_cached_until_underlying_rows_change(
+    api_client: APIClient, employee: Employee, project: Project, review: PerformanceReview,
+    django_assert_num_queries, django_capture_on_commit_callbacks,
+):
+    cache.clear()
+    api_client.force_authenticate(employee.user)
+    url = reverse("employee-workspace")
+
+    # Employee, company, department, projects, reviews.
+    with django_assert_num_queries(5):
+        first = api_client.get(url)
+    with django_assert_num_queries(0):
+        cached = api_client.get(url)
+
+    assert first.data == cached.data
+    assert first.data["profile"]["id"] == employee.pk
+    assert [p["id"] for p in first.data["projects"]] == [project.pk]
+    assert [r["id"] for r in first.data["reviews"]] == [review.pk]
+    assert first.data["company"]["number_of_employees"] == 2
+
+    with django_capture_on_commit_callbacks(execute=True):
+        review.stage = "review_scheduled"
+        review.save()
+        project.name = "Renamed"
+        project.save()
+    refreshed = api_client.get(url)
+
+    assert refreshed.data["reviews"][0]["stage"] == "review_scheduled"
+    assert refreshed.data["projects"][0]["name"] == "Renamed"
+
+
+def test_department_delete_runs_as_resumable_background_job(
+    api_client: APIClient, admin_user: User, department: Department, other_department: Department,
+    manager: Employee, employee: Employee, other_employee: Employee, project: Project,
+    review: PerformanceReview,
+):
+    elsewhere = Project.objects.create(
+        company=department.company, department=other_department, name="Hermes",
+        description="Description", start_date="2025-01-01", end_date="2025-12-31",
+    )
+    elsewhere.assigned_employees.add(employee, other_employee)
+    Project.objects.filter(pk=elsewhere.pk).update(updated_at="2000-01-01T00:00:00Z")
+    api_client.force_authenticate(admin_user)
+
+    response = api_client.delete(reverse("department-detail", args=[department.pk]))
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    job = DeletionJob.objects.get(pk=response.data["id"])
+    assert job.totals == {
+        "archived_performance_reviews": 0, "performance_reviews": 1, "project_assignments": 2,
+        "collaborations": 2, "projects": 1, "employees": 2, "department": 1,
+    }
+    assert Department.objects.filter(pk=department.pk).exists()
+
+    call_command("run_deletion_jobs", once=True, batch_size=1)
+
+    progress = api_client.get(reverse("deletion-job-detail", args=[job.pk])).data
+    assert (progress["status"], progress["progress"]) == ("completed", 1.0)
+    assert not Department.objects.filter(pk=department.pk).exists()
+    assert not Employee.objects.filter(pk__in=[manager.pk, employee.pk]).exists()
+    assert list(elsewhere.assigned_employees.all()) == [other_employee]
+    assert not Collaboration.objects.filter(employee=other_employee).exists()
+    elsewhere.refresh_from_db()
+    assert elsewhere.updated_at.year > 2000
+    assert set(Tombstone.objects.values_list("model", "object_id")) == {
+        ("performancereview", review.pk), ("project", project.pk),
+        ("employee", manager.pk), ("employee", employee.pk), ("department", department.pk),
+    }
+    assert ReviewStageTransition.objects.filter(review_id=review.pk).exists()
+
+
+def test_admin_company_delete_is_queued_without_collecting_dependents(
+    client, superuser: User, populated_company: Company, django_assert_max_num_queries
+):
+    client.force_login(superuser)
+    url = reverse("admin:companies_company_delete", args=[populated_company.pk])
+
+    with django_assert_max_num_queries(10):
+        confirmation = client.get(url)
+    response = client.post(url, {"post": "yes"})
+
+    assert confirmation.status_code == status.HTTP_200_OK
+    assert response.status_code == status.HTTP_302_FOUND
+    job = DeletionJob.objects.get(target_type="company")
+    assert job.requested_by == superuser
+
+    call_command("run_deletion_jobs", once=True)
+
+    assert not Company.objects.filter(pk=populated_company.pk).exists()
+    assert not Employee.objects.filter(company_id=populated_company.pk).exists()
+    assert Company.objects.count() == 5
+
+
+def test_company_snapshot_round_trips_under_new_ids(populated_company: Company, tmp_path):
+    path = tmp_path / "acme.ndjson.gz"
+    call_command("export_company", str(populated_company.pk), str(path))
+
+    def indexes():
+        with connection.cursor() as cursor:
+            return {
+                table: set(connection.introspection.get_constraints(cursor, table))
+                for table in (Employee._meta.db_table, PerformanceReview._meta.db_table)
+            }
+
+    before = indexes()
+    call_command("import_company", str(path), suffix="copy")
+    # Indexes dropped for the load are rebuilt.
+    assert indexes() == before
+
+    copy = Company.objects.get(name=f"{populated_company.name}-copy")
+    assert copy.pk != populated_company.pk
+    for model, lookup in [
+        (Department, "company"), (Employee, "company"), (Project, "company"),
+        (PerformanceReview, "employee__company"),
+    ]:
+        assert model.objects.filter(**{lookup: copy}).count() == model.objects.filter(
+            **{lookup: populated_company}
+        ).count()
+    staff = Employee.objects.select_related("user").get(company=copy, user__username="staff0-copy")
+    assert (staff.email, staff.user.email) == ("staff0+copy@acme.com", "staff0+copy@example.com")
+    assert staff.department.company_id == copy.pk
+    assert {member.company_id for project in staff.assigned_projects.all()
+            for member in project.assigned_employees.all()} == {copy.pk}
+    assert staff.performance_reviews.get().reviewer.company_id == copy.pk
+    original = Employee.objects.get(company=populated_company, user__username="staff0")
+    assert (
+        staff.performance_reviews.get().stage_changed_at
+        == original.performance_reviews.get().stage_changed_at
+    )
+
+
+def test_snapshot_copy_encodes_values_for_postgresql():
+    class RawCursor:
+        def copy_expert(self, sql, buffer):
+            self.sql, self.data = sql, buffer.read()
+
+    class Cursor:
+        cursor = RawCursor()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    class PostgreSQL:
+        vendor = "postgresql"
+        ops = connection.ops
+
+        def cursor(self):
+            return cursor
+
+    cursor = Cursor()
+    fields = [Employee._meta.get_field(name) for name in ("name", "address", "hired_on")]
+    stamp = datetime(2026, 10, 19, 4, 30, tzinfo=dt_timezone.utc)
+    insert_rows(PostgreSQL(), Employee, fields, [
+        ["tab\there", "line\nbreak\r\\back", None],
+        [True, False, stamp],
+        [{"a": 1}, date(2026, 1, 2), 7],
+    ])
+
+    assert cursor.cursor.sql.startswith('COPY "companies_employee" ("name", "address", "hired_on")')
+    assert cursor.cursor.data.splitlines() == [
+        "tab\\there\tline\\nbreak\\r\\\\back\t\\N",
+        "t\tf\t2026-10-19T04:30:00+00:00",
+        '{"a": 1}\t2026-01-02\t7',
+    ]
+
+
+def test_finished_reviews_move_to_archive_and_are_listed_when_filters_reach_it(
+    api_client: APIClient, admin_user: User, employee: Employee, manager: Employee,
+    django_capture_on_commit_callbacks,
+):
+    old = timezone.now() - timedelta(days=1000)
+    archived, stuck, recent = [
+        PerformanceReview.objects.create(employee=employee, reviewer=manager, stage=stage)
+        for stage in ("review_approved", "under_approval", "review_approved")
+    ]
+    PerformanceReview.objects.filter(pk__in=[archived.pk, stuck.pk]).update(created_at=old)
+    api_client.force_authenticate(admin_user)
+    watermark = api_client.get(reverse("performance-review-changes")).data["cursor"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command("archive_reviews", batch_size=1)
+
+    changes = api_client.get(reverse("performance-review-changes"), {"cursor": watermark})
+    assert [row["id"] for row in changes.data["deleted"]] == [archived.pk]
+
+    assert list(ArchivedPerformanceReview.objects.values_list("pk", flat=True)) == [archived.pk]
+    assert not PerformanceReview.objects.filter(pk=archived.pk).exists()
+    url = reverse("performance-review-list")
+
+    default = api_client.get(url).data["results"]
+    reaching = api_client.get(url, {"created_at__lt": "2030-01-01"}).data["results"]
+    unfinished = api_client.get(url, {"created_at__lt": "2030-01-01", "stage": "under_approval"})
+    detail = api_client.get(reverse("performance-review-detail", args=[archived.pk]))
+    update = api_client.patch(
+        reverse("performance-review-detail", args=[archived.pk]), {"notes": "x"}
+    )
+
+    assert [row["id"] for row in default] == [recent.pk, stuck.pk]
+    assert [(row["id"], row["is_archived"]) for row in reaching] == [
+        (recent.pk, False), (stuck.pk, False), (archived.pk, True),
+    ]
+    assert [row["id"] for row in unfinished.data["results"]] == [stuck.pk]
+    assert (detail.status_code, detail.data["employee_name"]) == (200, employee.name)
+    assert update.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.fixture
+def shard_b(settings, tmp_path):
+    """
+    A second SQLite database migrated as a shard, with sharding turned on.
+    """
+    connections.settings["shard_b"] = {
+        **connections["default"].settings_dict,
+        "NAME": str(tmp_path / "shard_b.sqlite3"),
+        # Kept open by close_old_connections(), as it cannot reconnect.
+        "CONN_MAX_AGE": None,
+    }
+    settings.SHARDING = {"SHARDS": ["shard_b"], "DRAIN_SECONDS": 0}
+    settings.DATABASE_ROUTERS = ["apps.companies.sharding.ShardRouter"]
+    cache.clear()
+    # Connected up front: the test case only lets "default" open connections.
+    connections["shard_b"].connect()
+    call_command("migrate", database="shard_b", verbosity=0)
+    yield "shard_b"
+    connections["shard_b"].close()
+    del connections.settings["shard_b"]
+    delattr(connections._connections, "shard_b")
+    cache.clear()
+
+
+def test_sharded_company_is_served_from_its_shard_and_admins_see_every_shard(
+    api_client: APIClient, admin_user: User, employee: Employee, shard_b: str
+):
+    def user_foreign_keys(alias):
+        with connections[alias].cursor() as cursor:
+            constraints = connections[alias].introspection.get_constraints(
+                cursor, Employee._meta.db_table
+            )
+        return [name for name, info in constraints.items()
+                if info["foreign_key"] == (User._meta.db_table, "id")]
+
+    # Users live in the directory only, so only it enforces the reference.
+    assert user_foreign_keys("default") and not user_foreign_keys(shard_b)
+    globex = Company.objects.using(shard_b).create(name="Globex")
+    with use_company(globex.pk):
+        ops = Department.objects.create(company=globex, name="Ops")
+        remote = create_employee(globex, ops, "remote")
+
+    assert CompanyShard.objects.get(company_id=globex.pk).database == shard_b
+    assert remote._state.db == shard_b and remote.pk >= 10**12
+    assert not Employee.objects.using("default").filter(pk=remote.pk).exists()
+
+    authenticate(api_client, remote.user)
+    own = api_client.get(reverse("employee-list")).data["results"]
+    assert [row["id"] for row in own] == [remote.pk]
+    assert api_client.get(reverse("employee-profile")).data["name"] == remote.name
+
+    CompanyShard.objects.filter(company_id=globex.pk).update(moving=True)
+    cache.clear()
+    moving = api_client.patch(reverse("employee-profile"), {"address": "Elsewhere"})
+    assert moving.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert moving.data["detail"].code == "company_moving"
+    # Outside the API (admin, commands) it is a plain domain error.
+    with pytest.raises(CompanyMoving):
+        remote.save()
+    CompanyShard.objects.filter(company_id=globex.pk).update(moving=False)
+    cache.clear()
+
+    api_client.credentials()
+    api_client.force_authenticate(admin_user)
+    listed = api_client.get(reverse("employee-list")).data
+    detail = api_client.get(reverse("employee-detail", args=[remote.pk]))
+    created = api_client.post(reverse("department-list"), {"company": globex.pk, "name": "R&D"})
+
+    assert listed["count"] == 2
+    assert [row["id"] for row in listed["results"]] == [employee.pk, remote.pk]
+    assert (detail.status_code, detail.data["company_name"]) == (200, "Globex")
+    assert created.status_code == status.HTTP_201_CREATED
+    assert Department.objects.using(shard_b).filter(pk=created.data["id"]).exists()
+
+
+def test_review_stream_follows_every_shard(
+    settings, admin_user: User, review: PerformanceReview, shard_b: str
+):
+    settings.REVIEW_STREAM = {"POLL_INTERVAL": 0.05}
+    globex = Company.objects.using(shard_b).create(name="Globex")
+    with use_company(globex.pk):
+        ops = Department.objects.create(company=globex, name="Ops")
+        remote = PerformanceReview.objects.create(employee=create_employee(globex, ops, "remote"))
+        remote.stage = "review_scheduled"
+        remote.save()
+    review.stage = "review_scheduled"
+    review.save()
+
+    def transition():
+        with use_company(globex.pk):
+            remote.stage = "feedback_provided"
+            remote.save()
+
+    async def scenario(stream, count, then=None):
+        await stream.send_input({"type": "http.request"})
+        await stream.receive_output(timeout=5)
+        events = await read_events(stream, count)
+        if then:
+            await sync_to_async(then)()
+            events += await read_events(stream, 1)
+        await stream.send_input({"type": "http.disconnect"})
+        await stream.wait(timeout=5)
+        return events
+
+    def resume(last_event_id):
+        return open_stream(admin_user, headers=[(b"last-event-id", last_event_id.encode())])
+
+    events = async_to_sync(scenario)(resume("0"), 2, then=transition)
+    resumed = async_to_sync(scenario)(resume(events[0]["id"]), 2)
+
+    def reviews(events):
+        return [(json.loads(e["data"])["review_id"], json.loads(e["data"])["to_stage"]) for e in events]
+
+    assert reviews(events) == [
+        (remote.pk, "review_scheduled"), (review.pk, "review_scheduled"),
+        (remote.pk, "feedback_provided"),
+    ]
+    # One outbox id per database: the directory's, then the shard's.
+    positions = [[int(pk) for pk in e["id"].split(",")] for e in events]
+    assert positions[0][0] < positions[1][0] == positions[2][0] < 10**12
+    assert 10**12 < positions[0][1] == positions[1][1] < positions[2][1]
+    assert reviews(resumed) == reviews(events[1:])
+
+
+def test_move_company_copies_rows_and_flips_the_shard_map(
+    api_client: APIClient, populated_company: Company, shard_b: str
+):
+    tables = [
+        (Department, "company"), (Employee, "company"), (Project, "company"),
+        (PerformanceReview, "employee__company"),
+        (Project.assigned_employees.through, "project__company"),
+    ]
+    before = {
+        model: set(model.objects.filter(**{lookup: populated_company}).values_list("pk", flat=True))
+        for model, lookup in tables
+    }
+
+    call_command("move_company", str(populated_company.pk), shard_b, drain_seconds=0)
+
+    entry = CompanyShard.objects.get(company_id=populated_company.pk)
+    assert (entry.database, entry.moving) == (shard_b, False)
+    for model, lookup in tables:
+        moved = model.objects.using(shard_b).filter(**{lookup: populated_company.pk})
+        assert set(moved.values_list("pk", flat=True)) == before[model]
+        assert not model.objects.using("default").filter(**{lookup: populated_company.pk}).exists()
+    assert Company.objects.using("default").filter(name="Company 0").exists()
+
+    staff = Employee.objects.using(shard_b).get(company_id=populated_company.pk, name="Staff0")
+    authenticate(api_client, User.objects.get(pk=staff.user_id))
+    response = api_client.get(reverse("performance-review-list"))
+    assert {row["id"] for row in response.data["results"]} == before[PerformanceReview]
+
+
+def test_patch_writes_only_changed_columns_and_skips_no_ops(
+    api_client: APIClient, admin_user: User, employee: Employee, project: Project
+):
+    api_client.force_authenticate(admin_user)
+    employee_url = reverse("employee-detail", args=[employee.pk])
+    project_url = reverse("project-detail", args=[project.pk])
+    employee.refresh_from_db()
+    project.refresh_from_db()
+    stamps = (employee.updated_at, project.updated_at)
+
+    def updates(queries):
+        return [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+
+    with CaptureQueriesContext(connection) as no_ops:
+        assert api_client.patch(
+            employee_url, {"name": employee.name, "address": employee.address}
+        ).status_code == status.HTTP_200_OK
+        assert api_client.patch(
+            project_url, {"assigned_employees": [employee.pk]}, format="json"
+        ).status_code == status.HTTP_200_OK
+    assert updates(no_ops) == []
+    employee.refresh_from_db()
+    project.refresh_from_db()
+    assert (employee.updated_at, project.updated_at) == stamps
+
+    with CaptureQueriesContext(connection) as changed:
+        response = api_client.patch(employee_url, {"address": "Elm street"})
+    [update] = updates(changed)
+    assert response.data["address"] == "Elm street"
+    assert '"address"' in update and '"updated_at"' in update
+    assert '"name"' not in update and '"email"' not in update
+
+
+@pytest.mark.django_db
+def test_if_match_rejects_writes_to_a_changed_version(
+    api_client: APIClient, admin_user: User, employee: Employee, project: Project
+):
+    api_client.force_authenticate(admin_user)
+    url = reverse("employee-detail", args=[employee.pk])
+    etag = api_client.get(url)["ETag"]
+    assert etag == '"1"'
+
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.patch(url, {"address": "Elm street"}, HTTP_IF_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    # One conditional UPDATE, no lock or version read before it.
+    writes = [q["sql"] for q in queries if '"companies_employee"."version" =' in q["sql"]]
+    assert len(writes) == 1 and writes[0].startswith('UPDATE "companies_employee"')
+    assert response["ETag"] == '"2"' and response.data["version"] == 2
+
+    stale = api_client.patch(url, {"address": "Oak street"}, HTTP_IF_MATCH=etag)
+    assert stale.status_code == status.HTTP_412_PRECONDITION_FAILED
+    assert api_client.delete(url, HTTP_IF_MATCH=etag).status_code == 412
+    employee.refresh_from_db()
+    assert (employee.address, employee.version) == ("Elm street", 2)
+
+    # Assignment changes bump the project and are checked the same way.
+    project_url = reverse("project-detail", args=[project.pk])
+    project_etag = api_client.get(project_url)["ETag"]
+    response = api_client.patch(
+        project_url, {"assigned_employees": []}, format="json", HTTP_IF_MATCH=project_etag
+    )
+    assert response["ETag"] != project_etag
+    assert api_client.patch(
+        project_url, {"assigned_employees": [employee.pk]}, format="json",
+        HTTP_IF_MATCH=project_etag,
+    ).status_code == 412
+
+    # A writer that read the row before another one saved it loses the race.
+    first, second = Employee.objects.get(pk=employee.pk), Employee.objects.get(pk=employee.pk)
+    first.expected_version = second.expected_version = 2
+    first.name = "First"
+    first.save(update_fields=["name"])
+    second.name = "Second"
+    with pytest.raises(VersionConflict), transaction.atomic():
+        second.save(update_fields=["name"])
+    employee.refresh_from_db()
+    assert (employee.name, employee.version) == ("First", 3)
+    assert api_client.delete(url, HTTP_IF_MATCH='"3"').status_code == 204
+
+
+def test_managers_reach_the_whole_subtree_of_their_department(
+    api_client: APIClient, company: Company, department: Department, other_department: Department
+):
+    division = Department.objects.create(company=company, name="Division")
+    team = Department.objects.create(company=company, name="Team", parent=department)
+    department.parent = division
+    department.save()
+    assert set(
+        DepartmentClosure.objects.filter(descendant=team).values_list("ancestor__name", "depth")
+    ) == {("Team", 0), (department.name, 1), ("Division", 2)}
+    links = set(DepartmentClosure.objects.values_list("ancestor", "descendant", "depth"))
+    assert hierarchy.rebuild(company.pk) == len(links) == 7
+    assert set(DepartmentClosure.objects.values_list("ancestor", "descendant", "depth")) == links
+
+    head = create_employee(company, division, "head", role="manager")
+    lead = create_employee(company, team, "lead", role="manager")
+    member = create_employee(company, team, "member")
+    outsider = create_employee(company, other_department, "outsider")
+
+    api_client.force_authenticate(head.user)
+    names = {row["name"] for row in api_client.get(reverse("employee-list")).data["results"]}
+    assert {"Head", "Lead", "Member"} <= names and "Outsider" not in names
+    member_url = reverse("employee-detail", args=[member.pk])
+    assert api_client.patch(member_url, {"address": "Elm street"}).status_code == 200
+    assert api_client.get(reverse("employee-detail", args=[outsider.pk])).status_code == 404
+
+    api_client.force_authenticate(lead.user)
+    names = {row["name"] for row in api_client.get(reverse("employee-list")).data["results"]}
+    assert names == {"Lead", "Member"}
+
+    # A department cannot move below itself.
+    api_client.force_authenticate(head.user)
+    response = api_client.patch(
+        reverse("department-detail", args=[division.pk]), {"parent": team.pk}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    # Deleting the middle level hoists the team up to the division.
+    api_client.delete(reverse("department-detail", args=[department.pk]))
+    call_command("run_deletion_jobs", once=True)
+    team.refresh_from_db()
+    assert team.parent_id == division.pk
+    assert set(
+        DepartmentClosure.objects.filter(descendant=team).values_list("ancestor_id", "depth")
+    ) == {(team.pk, 0), (division.pk, 1)}
+    assert api_client.get(member_url).status_code == 200
+
+
+def test_staffing_calendar_answers_overlaps_for_a_department(
+    api_client: APIClient,
+    company: Company,
+    department: Department,
+    manager: Employee,
+    employee: Employee,
+    project: Project,
+):
+    # Added through assigned_employees: the project's period, full time.
+    assignment = ProjectAssignment.objects.get(project=project, employee=employee)
+    assert (str(assignment.start_date), str(assignment.end_date), assignment.allocation) == (
+        "2025-01-01", "2025-12-31", 100
+    )
+    team = Department.objects.create(company=company, name="Team", parent=department)
+    member = create_employee(company, team, "member")
+    side = Project.objects.create(
+        company=company, department=team, name="Side", description="",
+        start_date="2025-06-01", end_date="2025-08-31",
+    )
+
+    api_client.force_authenticate(manager.user)
+    assignments_url = reverse("project-assignment-list", args=[side.pk])
+    response = api_client.post(
+        assignments_url,
+        {"employee": member.pk, "allocation": 50, "start_date": "2025-07-01"},
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert (response.data["start_date"], response.data["end_date"]) == ("2025-07-01", "2025-08-31")
+    assert api_client.post(
+        assignments_url, {"employee": member.pk, "allocation": 50}
+    ).status_code == status.HTTP_400_BAD_REQUEST
+    patch = api_client.patch(
+        reverse("project-assignment-detail", args=[side.pk, response.data["id"]]),
+        {"allocation": 40},
+    )
+    assert patch.data["allocation"] == 40
+    side.refresh_from_db()
+    assert side.version > 1
+
+    availability_url = reverse("department-availability", args=[department.pk])
+    window = {"start": "2025-06-15", "end": "2025-07-15"}
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get(availability_url, {**window, "allocation": 60})
+    assert len(queries) <= 4
+    free = {row["name"]: row["available_allocation"] for row in response.data["results"]}
+    assert free == {"Manager": 100, "Member": 60}
+
+    response = api_client.get(reverse("department-utilization", args=[department.pk]), window)
+    rows = {row["name"]: row for row in response.data["results"]}
+    assert rows["Employee"]["peak_allocation"] == 100 and rows["Employee"]["utilization"] == 100
+    assert rows["Member"]["projects"] == [side.pk]
+    assert rows["Member"]["peak_allocation"] == 40
+    # Booked 15 of the 31 days at 40%.
+    assert rows["Member"]["utilization"] == round(40 * 15 / 31, 1)
+    assert rows["Manager"]["peak_projects"] == 0
+
+    assert api_client.get(availability_url, {"start": "2025-07-15"}).status_code == 400
+    api_client.force_authenticate(member.user)
+    assert api_client.get(availability_url, window).status_code == status.HTTP_403_FORBIDDEN
+
+
+def test_collaboration_graph_follows_project_co_assignment(
+    api_client: APIClient,
+    company: Company,
+    department: Department,
+    other_department: Department,
+    manager: Employee,
+    employee: Employee,
+    other_employee: Employee,
+    project: Project,
+):
+    def edges():
+        return {
+            (a, b): shared
+            for a, b, shared in Collaboration.objects.values_list(
+                "employee_id", "colleague_id", "shared_projects"
+            )
+        }
+
+    project.assigned_employees.add(manager, other_employee)
+    side = Project.objects.create(
+        company=company, department=department, name="Side", description="",
+        start_date="2025-01-01", end_date="2025-06-30",
+    )
+    side.assigned_employees.add(manager, employee)
+    assert edges()[(employee.pk, manager.pk)] == edges()[(manager.pk, employee.pk)] == 2
+    assert edges()[(other_employee.pk, employee.pk)] == 1
+    assert len(edges()) == 6
+
+    api_client.force_authenticate(manager.user)
+    response = api_client.get(reverse("employee-collaborators", args=[employee.pk]))
+    assert response.data["collaborators"] == [
+        [manager.pk, "Manager", department.pk, 2],
+        [other_employee.pk, "Outsider", other_department.pk, 1],
+    ]
+    assert api_client.get(
+        reverse("employee-collaborators", args=[employee.pk]), {"limit": "x"}
+    ).status_code == status.HTTP_400_BAD_REQUEST
+
+    graph = api_client.get(
+        reverse("department-collaboration-graph", args=[department.pk]), {"min_shared": 2}
+    ).data
+    assert graph["adjacency"] == {
+        str(manager.pk): [[employee.pk, 2]], str(employee.pk): [[manager.pk, 2]]
+    }
+    assert graph["clusters"] == [sorted([manager.pk, employee.pk])]
+    assert graph["bridges"] == []
+    graph = api_client.get(reverse("department-collaboration-graph", args=[department.pk])).data
+    assert graph["clusters"] == [sorted([manager.pk, employee.pk, other_employee.pk])]
+    assert len(graph["bridges"]) == 2
+
+    project.assigned_employees.remove(other_employee)
+    side.delete()
+    assert edges() == {(employee.pk, manager.pk): 1, (manager.pk, employee.pk): 1}
+    call_command("rebuild_collaborations", company=company.pk)
+    assert edges() == {(employee.pk, manager.pk): 1, (manager.pk, employee.pk): 1}
+
+
+def test_assign_reviewers_balances_load_up_the_hierarchy(
+    api_client: APIClient,
+    company: Company,
+    department: Department,
+    manager: Employee,
+    employee: Employee,
+):
+    lead = create_employee(company, department, "lead", role="manager")
+    team = Department.objects.create(company=company, name="Team", parent=department)
+    member = create_employee(company, team, "member")
+    for _ in range(2):
+        PerformanceReview.objects.create(employee=employee, reviewer=manager)
+    PerformanceReview.objects.create(employee=member, stage="review_approved")
+    unassigned = [
+        PerformanceReview.objects.create(employee=reviewed)
+        for reviewed in [employee, employee, employee, member, manager]
+    ]
+
+    api_client.force_authenticate(employee.user)
+    url = reverse("performance-review-assign-reviewers")
+    assert api_client.post(url, {}).status_code == status.HTTP_403_FORBIDDEN
+
+    api_client.force_authenticate(manager.user)
+    preview = api_client.post(url, {"dry_run": True}, format="json").data
+    assert (preview["planned"], preview["assigned"], preview["unassignable"]) == (5, 0, 0)
+    assert PerformanceReview.objects.filter(reviewer__isnull=True).count() == 6
+
+    with CaptureQueriesContext(connection) as queries:
+        summary = api_client.post(url, {}, format="json").data
+    assert len(queries) <= 12
+    assert summary["assigned"] == 5
+    assert summary["reviewers"] == [
+        {"reviewer": manager.pk, "name": "Manager", "load": 2, "assigned": 1},
+        {"reviewer": lead.pk, "name": "Lead", "load": 0, "assigned": 4},
+    ]
+    reviewers = dict(
+        PerformanceReview.objects.filter(pk__in=[r.pk for r in unassigned]).values_list(
+            "pk", "reviewer_id"
+        )
+    )
+    # The team has no manager of its own, and nobody reviews themselves.
+    assert reviewers[unassigned[3].pk] in (manager.pk, lead.pk)
+    assert reviewers[unassigned[4].pk] == lead.pk
+    assert PerformanceReview.objects.get(pk=unassigned[0].pk).version == 2
+    assert PerformanceReview.objects.filter(reviewer__isnull=True).count() == 1
+
+    call_command("assign_reviewers", company=company.pk)
+    assert PerformanceReview.objects.filter(reviewer__isnull=True).count() == 1
+
+
+def test_company_dashboard_aggregates_in_two_queries_and_is_cached(
+    api_client: APIClient, company: Company, department: Department,
+    other_department: Department, manager: Employee, employee: Employee,
+    project: Project, review: PerformanceReview,
+    django_assert_num_queries, django_capture_on_commit_callbacks,
+):
+    cache.clear()
+    Project.objects.create(
+        company=company, department=department, name="Later", description="",
+        start_date="2026-01-01", end_date="2026-12-31",
+    )
+    PerformanceReview.objects.create(employee=manager, stage="review_approved", rating=4)
+    PerformanceReview.objects.create(employee=employee, stage="review_approved", rating=5)
+    api_client.force_authenticate(employee.user)
+    url = reverse("company-dashboard", args=[company.pk])
+
+    # Company, departments, reviews.
+    with django_assert_num_queries(3):
+        first = api_client.get(url, {"date": "2025-06-01"})
+    with django_assert_num_queries(1):
+        cached = api_client.get(url, {"date": "2025-06-01"})
+    assert first.data == cached.data
+
+    data = first.data
+    assert data["company"]["number_of_employees"] == 2
+    assert data["company"]["number_of_projects"] == 2
+    assert data["active_projects"] == 1
+    departments = [
+        (row["name"], row["headcount"], row["active_projects"]) for row in data["departments"]
+    ]
+    assert departments == [("Engineering", 2, 1), ("Sales", 0, 0)]
+    assert data["reviews"]["total"] == 3
+    assert data["reviews"]["average_rating"] == 4.5
+    assert data["reviews"]["stages"]["review_approved"] == 2
+    assert api_client.get(url, {"date": "2026-06-01"}).data["active_projects"] == 1
+    assert api_client.get(url, {"date": "June"}).status_code == status.HTTP_400_BAD_REQUEST
+    assert api_client.get(url).data["date"] == timezone.localdate().isoformat()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        review.stage = "review_scheduled"
+        review.save()
+    stages = api_client.get(url, {"date": "2025-06-01"}).data["reviews"]["stages"]
+    assert (stages["pending_review"], stages["review_scheduled"]) == (0, 1)
+
+    other = Company.objects.create(name="Other")
+    assert api_client.get(
+        reverse("company-dashboard", args=[other.pk])
+    ).status_code == status.HTTP_403_FORBIDDEN
@@ -8,22 +8,39 @@ urlpatterns = [
     # Company endpoints
     path('companies/', views.CompanyListView.as_view(), name='company-list'),
     path('companies/<int:pk>/', views.CompanyDetailView.as_view(), name='company-detail'),
+    path('companies/<int:pk>/dashboard/', views.CompanyDashboardView.as_view(), name='company-dashboard'),
     
     # Department endpoints
     path('departments/', views.DepartmentListView.as_view(), name='department-list'),
     path('departments/<int:pk>/', views.DepartmentDetailView.as_view(), name='department-detail'),
+    path('departments/changes/', views.DepartmentChangesView.as_view(), name='department-changes'),
+    path('departments/<int:pk>/availability/', views.DepartmentAvailabilityView.as_view(), name='department-availability'),
+    path('departments/<int:pk>/utilization/', views.DepartmentUtilizationView.as_view(), name='department-utilization'),
+    path('departments/<int:pk>/collaboration-graph/', views.DepartmentCollaborationGraphView.as_view(), name='department-collaboration-graph'),
     
     # Employee endpoints
     path('employees/', views.EmployeeListView.as_view(), name='employee-list'),
     path('employees/<int:pk>/', views.EmployeeDetailView.as_view(), name='employee-detail'),
+    path('employees/<int:pk>/collaborators/', views.EmployeeCollaboratorsView.as_view(), name='employee-collaborators'),
     path('employees/profile/', views.EmployeeProfileView.as_view(), name='employee-profile'),
+    path('employees/workspace/', views.EmployeeWorkspaceView.as_view(), name='employee-workspace'),
+    path('employees/changes/', views.EmployeeChangesView.as_view(), name='employee-changes'),
     
     # Project endpoints
     path('projects/', views.ProjectListView.as_view(), name='project-list'),
     path('projects/<int:pk>/', views.ProjectDetailView.as_view(), name='project-detail'),
+    path('projects/changes/', views.ProjectChangesView.as_view(), name='project-changes'),
+    path('projects/<int:project_pk>/assignments/', views.ProjectAssignmentListView.as_view(), name='project-assignment-list'),
+    path('projects/<int:project_pk>/assignments/<int:pk>/', views.ProjectAssignmentDetailView.as_view(), name='project-assignment-detail'),
     
     # Performance Review endpoints
     path('performance-reviews/', views.PerformanceReviewListView.as_view(), name='performance-review-list'),
     path('performance-reviews/<int:pk>/', views.PerformanceReviewDetailView.as_view(), name='performance-review-detail'),
     path('performance-reviews/<int:pk>/transition/', views.PerformanceReviewTransitionView.as_view(), name='performance-review-transition'),
+    path('performance-reviews/changes/', views.PerformanceReviewChangesView.as_view(), name='performance-review-changes'),
+    path('performance-reviews/stage-metrics/', views.PerformanceReviewStageMetricsView.as_view(), name='performance-review-stage-metrics'),
+    path('performance-reviews/assign-reviewers/', views.PerformanceReviewAssignReviewersView.as_view(), name='performance-review-assign-reviewers'),
+
+    # Background deletions
+    path('deletion-jobs/<int:pk>/', views.DeletionJobDetailView.as_view(), name='deletion-job-detail'),
 ]
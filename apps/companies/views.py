@@ -1,14 +1,49 @@
+from datetime import date
+from functools import cached_property
+
 from rest_framework import status, generics, permissions
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
+from rest_framework.views import exception_handler as drf_exception_handler
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from .models import Company, Department, Employee, Project, PerformanceReview
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import Avg, Count, F, Q, Value
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from apps.core.cache import get_versions
+from apps.core.profiling import ProfiledViewMixin
+from . import collaboration, sharding, staffing
+from .access import get_access_context
+from .archive import reaches_archive
+from .changes import ChangeFeedView
+from .reviewer_assignment import assign_reviewers
+from .deletion import enqueue_deletion
+from .models import (
+    ArchivedPerformanceReview,
+    Company,
+    DeletionJob,
+    Department,
+    Employee,
+    Project,
+    ProjectAssignment,
+    PerformanceReview,
+    StageDurationBucket,
+    VersionConflict,
+    count_subquery,
+)
+from .stage_history import stage_metrics
 from .serializers import (
     CompanySerializer,
+    DeletionJobSerializer,
     DepartmentSerializer,
     EmployeeSerializer,
     ProjectSerializer,
+    ProjectAssignmentSerializer,
     PerformanceReviewSerializer,
 )
 from .permissions import (
@@ -16,17 +51,178 @@ from .permissions import (
     DepartmentPermission,
     EmployeePermission,
     ProjectPermission,
+    ProjectAssignmentPermission,
     PerformanceReviewPermission,
+    StaffingPermission,
+    IsManagerUser,
 )
 
 
+class RoleScopedMixin:
+    """
+    Narrow the view queryset with the AccessContext scope named by access_scope.
+
+    List and detail views share the same scope, so objects outside it are
+    a 404 resolved by the fetch query itself.
+    """
+
+    access_scope = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        context = get_access_context(self.request.user)
+        return context.scope(self.access_scope, queryset)
+
+
+class AtomicUpdateMixin:
+    """
+    Save updates in a transaction, so outbox events written by the model
+    signals commit or roll back together with the change.
+    """
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        with transaction.atomic(using=router.db_for_write(type(instance), instance=instance)):
+            super().perform_update(serializer)
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The object was changed since it was read; fetch it again and retry."
+    default_code = "precondition_failed"
+
+
+class CompanyMovingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "This company is being moved, please retry shortly."
+    default_code = "company_moving"
+
+
+def exception_handler(exc, context):
+    """
+    DRF exception handler that also answers domain errors raised below the
+    API layer.
+    """
+    if isinstance(exc, sharding.CompanyMoving):
+        exc = CompanyMovingUnavailable()
+    return drf_exception_handler(exc, context)
+
+
+class VersionedWriteMixin:
+    """
+    Optimistic concurrency for versioned objects: responses carry the
+    version as an ETag, and a write sent with ``If-Match`` only applies
+    while the row is still at that version, else it is a 412.
+
+    Updates are a single ``UPDATE ... WHERE id = %s AND version = %s``,
+    without locks; updates only to related rows and deletes claim the
+    version with the same conditional UPDATE first, and a no-op update was
+    checked against the version just read. Writes without ``If-Match`` are
+    applied as before.
+    """
+
+    def if_match_version(self, obj):
+        header = self.request.headers.get("If-Match")
+        if not header or header.strip() == "*":
+            return None
+        tags = {
+            tag.strip().removeprefix("W/").strip('"') for tag in header.split(",")
+        }
+        if str(obj.version) not in tags:
+            raise PreconditionFailed()
+        return obj.version
+
+    def claim_version(self, instance, expected):
+        """
+        Bump the version of ``instance`` if it is still ``expected``.
+        """
+        if expected is None:
+            return
+        instance.expected_version = expected
+        try:
+            instance.claim_version()
+        except VersionConflict:
+            raise PreconditionFailed()
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        expected = self.if_match_version(instance)
+        with transaction.atomic(using=router.db_for_write(type(instance), instance=instance)):
+            instance.expected_version = expected
+            try:
+                super().perform_update(serializer)
+            except VersionConflict:
+                raise PreconditionFailed()
+            finally:
+                instance.expected_version = None
+
+    def perform_destroy(self, instance):
+        expected = self.if_match_version(instance)
+        with transaction.atomic(using=router.db_for_write(type(instance), instance=instance)):
+            self.claim_version(instance, expected)
+            super().perform_destroy(instance)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        data = getattr(response, "data", None)
+        if response.status_code < 300 and isinstance(data, dict) and "version" in data:
+            response["ETag"] = f'"{data["version"]}"'
+        return response
+
+
+class ShardFanOutMixin:
+    """
+    With sharding on, admins work across every shard: list pages are
+    merged from all shards, detail lookups try the shards in turn and
+    creates go to the shard of the company or employee in the payload.
+    Everyone else stays on the shard of their own company.
+    """
+
+    def fans_out(self):
+        return sharding.is_enabled() and get_access_context(self.request.user).is_admin
+
+    def shard_rows(self, queryset):
+        return sharding.ShardFanOut(queryset) if self.fans_out() else queryset
+
+    def paginate_queryset(self, queryset):
+        return super().paginate_queryset(self.shard_rows(queryset))
+
+    def get_object(self):
+        if not self.fans_out():
+            return super().get_object()
+        for alias in sharding.shard_aliases():
+            with sharding.use_shard(alias):
+                try:
+                    obj = super().get_object()
+                except Http404:
+                    continue
+            sharding.activate_shard(alias)
+            return obj
+        raise Http404
+
+    def create(self, request, *args, **kwargs):
+        if self.fans_out() and (alias := self.shard_for_data(request.data)):
+            sharding.activate_shard(alias)
+        return super().create(request, *args, **kwargs)
+
+    def shard_for_data(self, data):
+        try:
+            if data.get("company"):
+                return sharding.shard_for_company(int(data["company"]))[0]
+            if data.get("employee"):
+                return sharding.locate(Employee, int(data["employee"]))
+        except (AttributeError, TypeError, ValueError):
+            pass
+        return None
+
+
 # Company Views
-class CompanyListView(generics.ListAPIView):
+class CompanyListView(ProfiledViewMixin, ShardFanOutMixin, generics.ListAPIView):
     """
     List all companies (read-only for non-admin users)
     """
 
-    queryset = Company.objects.all()
+    queryset = Company.objects.with_counts()
     serializer_class = CompanySerializer
     permission_classes = [CompanyPermission]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -36,59 +232,259 @@ class CompanyListView(generics.ListAPIView):
     ordering = ["name"]
 
 
-class CompanyDetailView(generics.RetrieveAPIView):
+class CompanyDetailView(ProfiledViewMixin, ShardFanOutMixin, VersionedWriteMixin, generics.RetrieveAPIView):
     """
     Retrieve a single company (read-only for non-admin users)
     """
 
-    queryset = Company.objects.all()
+    throttle_scope = "detail"
+    queryset = Company.objects.with_counts()
     serializer_class = CompanySerializer
     permission_classes = [CompanyPermission]
 
 
+class CompanyDashboardView(ProfiledViewMixin, ShardFanOutMixin, generics.GenericAPIView):
+    """
+    Executive dashboard of a company in one response: the company summary,
+    headcount and active projects per department on ?date= (default
+    today), and the stage distribution and average rating of its reviews.
+
+    Built from two aggregate queries and cached under the versions of the
+    company and of its reviews, which the model signals bump on every
+    change. Archived reviews are not counted.
+    """
+
+    queryset = Company.objects.all()
+    permission_classes = [CompanyPermission]
+
+    def get(self, request, pk=None):
+        company = self.get_object()
+        try:
+            raw = request.query_params.get("date")
+            on = date.fromisoformat(raw) if raw else timezone.localdate()
+        except ValueError:
+            return Response(
+                {"error": "date must be an ISO date"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        versions = get_versions([f"company:{company.pk}", f"company-reviews:{company.pk}"])
+        key = "dashboard:{}:{}:{}:{}".format(company.pk, on.isoformat(), *versions)
+        data = cache.get(key)
+        if data is None:
+            data = self.build(company, on)
+            cache.set(key, data, settings.DASHBOARD_CACHE_TIMEOUT)
+        return Response(data)
+
+    def build(self, company, on):
+        active = Q(projects__start_date__lte=on, projects__end_date__gte=on)
+        departments = list(
+            Department.objects.filter(company=company)
+            .annotate(
+                headcount=count_subquery(Employee.objects.all(), "department"),
+                projects_count=Count("projects"),
+                active_projects=Count("projects", filter=active),
+            )
+            .order_by("name", "pk")
+            .values("id", "name", "parent", "headcount", "projects_count", "active_projects")
+        )
+        stages = [stage for stage, _ in PerformanceReview.STAGE_CHOICES]
+        reviews = PerformanceReview.objects.filter(employee__company=company).aggregate(
+            total=Count("pk"),
+            average_rating=Avg("rating"),
+            **{stage: Count("pk", filter=Q(stage=stage)) for stage in stages},
+        )
+
+        company.departments_count = len(departments)
+        company.employees_count = sum(row["headcount"] for row in departments)
+        company.projects_count = sum(row["projects_count"] for row in departments)
+        average = reviews["average_rating"]
+        return {
+            "company": CompanySerializer(company).data,
+            "date": on.isoformat(),
+            "active_projects": sum(row["active_projects"] for row in departments),
+            "departments": departments,
+            "reviews": {
+                "total": reviews["total"],
+                "average_rating": None if average is None else round(average, 2),
+                "stages": {stage: reviews[stage] for stage in stages},
+            },
+        }
+
+
 # Department Views
-class DepartmentListView(generics.ListCreateAPIView):
+class DepartmentListView(ProfiledViewMixin, ShardFanOutMixin, RoleScopedMixin, generics.ListCreateAPIView):
     """
     List all departments and create new ones (admin/manager only)
     """
 
-    queryset = Department.objects.all()
+    access_scope = "departments"
+    queryset = Department.objects.select_related("company").with_counts()
     serializer_class = DepartmentSerializer
     permission_classes = [DepartmentPermission]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ["company", "name"]
+    filterset_fields = ["company", "parent", "name"]
     search_fields = ["name"]
     ordering_fields = ["name", "company__name", "created_at"]
     ordering = ["company__name", "name"]
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
 
-        # Filter by user's company if employee
-        if user.role == "employee" and hasattr(user, "employee_profile"):
-            queryset = queryset.filter(company=user.employee_profile.company)
+class DepartmentDetailView(ProfiledViewMixin, ShardFanOutMixin, RoleScopedMixin, VersionedWriteMixin, generics.RetrieveUpdateDestroyAPIView):
+    """
+    Retrieve, update, and delete a department
+    """
 
-        return queryset
+    throttle_scope = "detail"
+    access_scope = "departments"
+    queryset = Department.objects.select_related("company").with_counts()
+    serializer_class = DepartmentSerializer
+    permission_classes = [DepartmentPermission]
 
+    def destroy(self, request, *args, **kwargs):
+        # Everything in the department is deleted by a background job.
+        department = self.get_object()
+        expected = self.if_match_version(department)
+        with transaction.atomic(using=router.db_for_write(Department, instance=department)):
+            self.claim_version(department, expected)
+            job = enqueue_deletion(department, request.user)
+        return Response(DeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
-class DepartmentDetailView(generics.RetrieveUpdateDestroyAPIView):
+
+class DepartmentChangesView(ProfiledViewMixin, RoleScopedMixin, ChangeFeedView):
     """
-    Retrieve, update, and delete a department
+    Incremental sync of departments changed or deleted since a watermark
     """
 
-    queryset = Department.objects.all()
+    access_scope = "departments"
+    tombstone_model = "department"
+    queryset = Department.objects.select_related("company").with_counts()
     serializer_class = DepartmentSerializer
     permission_classes = [DepartmentPermission]
 
 
+class DepartmentStaffingView(ProfiledViewMixin, ShardFanOutMixin, RoleScopedMixin, generics.GenericAPIView):
+    """
+    Base of the staffing calendars of a department and the departments
+    below it, over the ?start= to ?end= dates (inclusive)
+    """
+
+    access_scope = "departments"
+    queryset = Department.objects.all()
+    permission_classes = [StaffingPermission]
+
+    def get(self, request, pk=None):
+        department = self.get_object()
+        try:
+            start = date.fromisoformat(request.query_params["start"])
+            end = date.fromisoformat(request.query_params["end"])
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "start and end must be ISO dates"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if end < start:
+            return Response(
+                {"error": "end must not be before start"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return self.respond(department, start, end)
+
+
+class DepartmentAvailabilityView(DepartmentStaffingView):
+    """
+    Employees with at least ?allocation= percent (default 100) of their
+    time free on every day of the range
+    """
+
+    def respond(self, department, start, end):
+        try:
+            allocation = int(self.request.query_params.get("allocation", 100))
+        except ValueError:
+            allocation = 0
+        if not 1 <= allocation <= 100:
+            return Response(
+                {"error": "allocation must be a percentage from 1 to 100"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        calendar = staffing.department_calendar(department.pk, start, end)
+        return Response(
+            {
+                "department": department.pk,
+                "start": start,
+                "end": end,
+                "allocation": allocation,
+                "results": [
+                    {
+                        "employee": row["employee"],
+                        "name": row["name"],
+                        "department": row["department"],
+                        "available_allocation": 100 - row["peak_allocation"],
+                    }
+                    for row in calendar
+                    if row["peak_allocation"] + allocation <= 100
+                ],
+            }
+        )
+
+
+class DepartmentUtilizationView(DepartmentStaffingView):
+    """
+    Per employee: overlapping projects, peak allocation and concurrent
+    projects, and allocation averaged over the range
+    """
+
+    def respond(self, department, start, end):
+        calendar = staffing.department_calendar(department.pk, start, end)
+        return Response(
+            {
+                "department": department.pk,
+                "start": start,
+                "end": end,
+                "average_utilization": (
+                    round(sum(row["utilization"] for row in calendar) / len(calendar), 1)
+                    if calendar
+                    else None
+                ),
+                "results": calendar,
+            }
+        )
+
+
+class DepartmentCollaborationGraphView(ProfiledViewMixin, ShardFanOutMixin, RoleScopedMixin, generics.GenericAPIView):
+    """
+    Who works with whom in a department and the departments below it, as
+    adjacency lists with clusters and cross-department bridges; edges
+    with fewer than ?min_shared= (default 1) shared projects are left out
+    """
+
+    access_scope = "departments"
+    queryset = Department.objects.all()
+    permission_classes = [StaffingPermission]
+
+    def get(self, request, pk=None):
+        department = self.get_object()
+        try:
+            min_shared = max(int(request.query_params.get("min_shared", 1)), 1)
+        except ValueError:
+            return Response(
+                {"error": "min_shared must be a number"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {
+                "department": department.pk,
+                "min_shared": min_shared,
+                **collaboration.department_graph(department.pk, min_shared),
+            }
+        )
+
+
 # Employee Views
-class EmployeeListView(generics.ListCreateAPIView):
+class EmployeeListView(ProfiledViewMixin, ShardFanOutMixin, RoleScopedMixin, generics.ListCreateAPIView):
     """
     List all employees and create new ones (admin/manager only)
     """
 
-    queryset = Employee.objects.all()
+    access_scope = "employees"
+    queryset = Employee.objects.select_related("company", "department")
     serializer_class = EmployeeSerializer
     permission_classes = [EmployeePermission]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -103,31 +499,48 @@ class EmployeeListView(generics.ListCreateAPIView):
     ]
     ordering = ["company__name", "department__name", "name"]
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
 
-        # Filter by user's company if employee
-        if user.role == "employee" and hasattr(user, "employee_profile"):
-            queryset = queryset.filter(company=user.employee_profile.company)
-        # Filter by user's department if manager
-        elif user.role == "manager" and hasattr(user, "employee_profile"):
-            queryset = queryset.filter(department=user.employee_profile.department)
+class EmployeeDetailView(ProfiledViewMixin, ShardFanOutMixin, RoleScopedMixin, VersionedWriteMixin, AtomicUpdateMixin, generics.RetrieveUpdateDestroyAPIView):
+    """
+    Retrieve, update, and delete an employee
+    """
 
-        return queryset
+    throttle_scope = "detail"
+    access_scope = "employees"
+    queryset = Employee.objects.select_related("company", "department")
+    serializer_class = EmployeeSerializer
+    permission_classes = [EmployeePermission]
 
 
-class EmployeeDetailView(generics.RetrieveUpdateDestroyAPIView):
+class EmployeeCollaboratorsView(ProfiledViewMixin, ShardFanOutMixin, RoleScopedMixin, generics.GenericAPIView):
     """
-    Retrieve, update, and delete an employee
+    An employee's closest collaborators by shared projects, as
+    [id, name, department, shared_projects] rows, up to ?limit= (default 10)
     """
 
+    access_scope = "employees"
     queryset = Employee.objects.all()
-    serializer_class = EmployeeSerializer
     permission_classes = [EmployeePermission]
 
+    def get(self, request, pk=None):
+        employee = self.get_object()
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= 100:
+            return Response(
+                {"error": "limit must be from 1 to 100"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {
+                "employee": employee.pk,
+                "collaborators": collaboration.top_collaborators(employee.pk, limit),
+            }
+        )
+
 
-class EmployeeProfileView(generics.RetrieveUpdateAPIView):
+class EmployeeProfileView(ProfiledViewMixin, VersionedWriteMixin, AtomicUpdateMixin, generics.RetrieveUpdateAPIView):
     """
     Employee can view and update their own profile
     """
@@ -136,16 +549,95 @@ class EmployeeProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user.employee_profile
+        context = get_access_context(self.request.user)
+        if not context.has_profile:
+            raise Http404("No employee profile for this user")
+        return Employee.objects.select_related("company", "department").get(
+            pk=context.employee_id
+        )
+
+
+class EmployeeWorkspaceView(ProfiledViewMixin, generics.GenericAPIView):
+    """
+    The current employee's landing page in one response: profile, company
+    and department summaries, assigned projects and own reviews.
+
+    Built from a fixed number of queries and cached per employee under the
+    versions of their company and of their reviews, which the model
+    signals bump on every change.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        context = get_access_context(request.user)
+        if not context.has_profile:
+            raise Http404("No employee profile for this user")
+
+        versions = get_versions(
+            [f"company:{context.company_id}", f"employee:{context.employee_id}"]
+        )
+        key = "workspace:{}:{}:{}".format(context.employee_id, *versions)
+        data = cache.get(key)
+        if data is None:
+            data = self.build(context)
+            cache.set(key, data, settings.WORKSPACE_CACHE_TIMEOUT)
+        return Response(data)
+
+    def build(self, context):
+        employee = Employee.objects.select_related("company", "department").get(
+            pk=context.employee_id
+        )
+        company = Company.objects.with_counts().get(pk=employee.company_id)
+        department = (
+            Department.objects.with_counts()
+            .select_related("company")
+            .get(pk=employee.department_id)
+        )
+        projects = (
+            Project.objects.filter(assigned_employees=employee)
+            .with_counts()
+            .select_related("company", "department")
+            .with_assigned_ids()
+            .order_by("start_date", "id")
+        )
+        reviews = (
+            PerformanceReview.objects.filter(employee=employee)
+            .select_related("employee", "reviewer")
+        )
+        return {
+            "profile": EmployeeSerializer(employee).data,
+            "company": CompanySerializer(company).data,
+            "department": DepartmentSerializer(department).data,
+            "projects": ProjectSerializer(projects, many=True).data,
+            "reviews": PerformanceReviewSerializer(reviews, many=True).data,
+        }
+
+
+class EmployeeChangesView(ProfiledViewMixin, RoleScopedMixin, ChangeFeedView):
+    """
+    Incremental sync of employees changed or deleted since a watermark
+    """
+
+    access_scope = "employees"
+    tombstone_model = "employee"
+    queryset = Employee.objects.select_related("company", "department")
+    serializer_class = EmployeeSerializer
+    permission_classes = [EmployeePermission]
 
 
 # Project Views
-class ProjectListView(generics.ListCreateAPIView):
+class ProjectListView(ProfiledViewMixin, ShardFanOutMixin, RoleScopedMixin, generics.ListCreateAPIView):
     """
     List all projects and create new ones (admin/manager only)
     """
 
-    queryset = Project.objects.all()
+    access_scope = "projects"
+    queryset = (
+        Project.objects.select_related("company", "department")
+        .with_counts()
+        .with_assigned_ids()
+    )
     serializer_class = ProjectSerializer
     permission_classes = [ProjectPermission]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -160,82 +652,237 @@ class ProjectListView(generics.ListCreateAPIView):
     ]
     ordering = ["company__name", "department__name", "start_date"]
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
 
-        # Filter by user's company if employee
-        if user.role == "employee" and hasattr(user, "employee_profile"):
-            queryset = queryset.filter(company=user.employee_profile.company)
-        # Filter by user's department if manager
-        elif user.role == "manager" and hasattr(user, "employee_profile"):
-            queryset = queryset.filter(department=user.employee_profile.department)
+class ProjectDetailView(ProfiledViewMixin, ShardFanOutMixin, RoleScopedMixin, VersionedWriteMixin, generics.RetrieveUpdateDestroyAPIView):
+    """
+    Retrieve, update, and delete a project
+    """
 
-        return queryset
+    throttle_scope = "detail"
+    access_scope = "projects"
+    queryset = (
+        Project.objects.select_related("company", "department")
+        .with_counts()
+        .with_assigned_ids()
+    )
+    serializer_class = ProjectSerializer
+    permission_classes = [ProjectPermission]
 
 
-class ProjectDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ProjectChangesView(ProfiledViewMixin, RoleScopedMixin, ChangeFeedView):
     """
-    Retrieve, update, and delete a project
+    Incremental sync of projects changed or deleted since a watermark
     """
 
-    queryset = Project.objects.all()
+    access_scope = "projects"
+    tombstone_model = "project"
+    queryset = (
+        Project.objects.select_related("company", "department")
+        .with_counts()
+        .with_assigned_ids()
+    )
     serializer_class = ProjectSerializer
     permission_classes = [ProjectPermission]
 
 
+class ProjectAssignmentMixin(ShardFanOutMixin, RoleScopedMixin):
+    """
+    Assignments of the project in the URL
+    """
+
+    access_scope = "assignments"
+    queryset = ProjectAssignment.objects.select_related("project", "employee").order_by(
+        "start_date", "pk"
+    )
+    serializer_class = ProjectAssignmentSerializer
+    permission_classes = [ProjectAssignmentPermission]
+
+    def get_queryset(self):
+        return super().get_queryset().filter(project_id=self.kwargs["project_pk"])
+
+
+class ProjectAssignmentListView(ProfiledViewMixin, ProjectAssignmentMixin, generics.ListCreateAPIView):
+    """
+    List a project's assignments and staff employees on it (admin/manager only)
+    """
+
+    @cached_property
+    def project(self):
+        context = get_access_context(self.request.user)
+        project = get_object_or_404(
+            context.scope("projects", Project.objects.all()), pk=self.kwargs["project_pk"]
+        )
+        self.check_object_permissions(self.request, project)
+        return project
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method == "POST":
+            context["project"] = self.project
+        return context
+
+    def perform_create(self, serializer):
+        project = self.project
+        with transaction.atomic(using=router.db_for_write(ProjectAssignment, instance=project)):
+            serializer.save(project=project)
+
+
+class ProjectAssignmentDetailView(ProfiledViewMixin, ProjectAssignmentMixin, AtomicUpdateMixin, generics.RetrieveUpdateDestroyAPIView):
+    """
+    Retrieve, update, and delete an assignment
+    """
+
+    throttle_scope = "detail"
+
+    def perform_destroy(self, instance):
+        with transaction.atomic(using=router.db_for_write(ProjectAssignment, instance=instance)):
+            super().perform_destroy(instance)
+
+
 # Performance Review Views
-class PerformanceReviewListView(generics.ListCreateAPIView):
+class ArchiveFallbackMixin:
+    """
+    Read access to the archive tier for review views: the archived rows in
+    the same access scope, returned as PerformanceReview instances.
+    Archived reviews can only be retrieved.
     """
-    List all performance reviews and create new ones (admin/manager only)
+
+    def get_archive_queryset(self):
+        context = get_access_context(self.request.user)
+        return context.scope(
+            self.access_scope,
+            ArchivedPerformanceReview.objects.select_related("employee", "reviewer").annotate(
+                employee_department_id=F("employee__department_id")
+            ),
+        )
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if self.request.method not in permissions.SAFE_METHODS:
+                raise
+        review = get_object_or_404(self.get_archive_queryset(), pk=self.kwargs["pk"]).to_review()
+        self.check_object_permissions(self.request, review)
+        return review
+
+
+class PerformanceReviewListView(
+    ProfiledViewMixin,
+    ShardFanOutMixin,
+    RoleScopedMixin,
+    ArchiveFallbackMixin,
+    generics.ListCreateAPIView,
+):
     """
+    List all performance reviews and create new ones (admin/manager only).
 
-    queryset = PerformanceReview.objects.all()
+    Archived reviews are merged in only when ?created_at__gte or
+    ?created_at__lt reaches before the archive horizon.
+    """
+
+    access_scope = "reviews"
+    queryset = PerformanceReview.objects.select_related("employee", "reviewer").annotate(
+        employee_department_id=F("employee__department_id")
+    )
     serializer_class = PerformanceReviewSerializer
     permission_classes = [PerformanceReviewPermission]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ["employee", "stage", "reviewer"]
+    filterset_fields = {
+        "employee": ["exact"],
+        "stage": ["exact"],
+        "reviewer": ["exact"],
+        "created_at": ["gte", "lt"],
+    }
     search_fields = ["employee__name", "feedback", "notes"]
     ordering_fields = ["created_at", "review_date", "stage"]
     ordering = ["-created_at"]
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-
-        # Filter by user's company if employee
-        if user.role == "employee" and hasattr(user, "employee_profile"):
-            queryset = queryset.filter(employee__company=user.employee_profile.company)
-        # Filter by user's department if manager
-        elif user.role == "manager" and hasattr(user, "employee_profile"):
-            queryset = queryset.filter(
-                employee__department=user.employee_profile.department
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        filters = DjangoFilterBackend().get_filterset(request, queryset, self)
+        bounds = filters.form.cleaned_data if filters.is_valid() else {}
+        if not reaches_archive(
+            bounds.get("stage"), bounds.get("created_at__gte"), bounds.get("created_at__lt")
+        ):
+            return super().list(request, *args, **kwargs)
+
+        archived = self.filter_queryset(self.get_archive_queryset())
+        rows = self.paginate_queryset(self.merged_rows(queryset, archived))
+        hot_ids = [row["id"] for row in rows if not row["archived"]]
+        archived_ids = [row["id"] for row in rows if row["archived"]]
+        found = {
+            (False, review.pk): review
+            for review in self.shard_rows(self.get_queryset().filter(pk__in=hot_ids))
+        }
+        found.update(
+            ((True, review.pk), review.to_review())
+            for review in self.shard_rows(self.get_archive_queryset().filter(pk__in=archived_ids))
+        )
+        keys = [(bool(row["archived"]), row["id"]) for row in rows]
+        reviews = [found[key] for key in keys if key in found]
+        return self.get_paginated_response(self.get_serializer(reviews, many=True).data)
+
+    def merged_rows(self, hot, archived):
+        """
+        ``{id, ordering columns..., archived}`` rows of both tiers in the
+        requested order, for paginating before any review is loaded.
+        """
+        ordering = list(hot.query.order_by or PerformanceReview._meta.ordering)
+        columns = list(dict.fromkeys(["id", *(term.lstrip("-") for term in ordering)]))
+
+        def rows(queryset, is_archived):
+            return queryset.order_by().annotate(archived=Value(is_archived)).values(
+                *columns, "archived"
             )
 
-        return queryset
+        return rows(hot, False).union(rows(archived, True), all=True).order_by(*ordering, "-id")
 
 
-class PerformanceReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PerformanceReviewDetailView(ProfiledViewMixin, ShardFanOutMixin, RoleScopedMixin, ArchiveFallbackMixin, VersionedWriteMixin, AtomicUpdateMixin, generics.RetrieveUpdateDestroyAPIView):
     """
-    Retrieve, update, and delete a performance review
+    Retrieve, update, and delete a performance review; archived reviews
+    can only be retrieved
     """
 
-    queryset = PerformanceReview.objects.all()
+    throttle_scope = "detail"
+    access_scope = "reviews"
+    queryset = PerformanceReview.objects.select_related("employee", "reviewer").annotate(
+        employee_department_id=F("employee__department_id")
+    )
     serializer_class = PerformanceReviewSerializer
     permission_classes = [PerformanceReviewPermission]
 
 
-class PerformanceReviewTransitionView(generics.GenericAPIView):
+class PerformanceReviewChangesView(ProfiledViewMixin, RoleScopedMixin, ChangeFeedView):
+    """
+    Incremental sync of performance reviews changed or deleted since a watermark
+    """
+
+    access_scope = "reviews"
+    tombstone_model = "performancereview"
+    queryset = PerformanceReview.objects.select_related("employee", "reviewer").annotate(
+        employee_department_id=F("employee__department_id")
+    )
+    serializer_class = PerformanceReviewSerializer
+    permission_classes = [PerformanceReviewPermission]
+
+
+class PerformanceReviewTransitionView(ProfiledViewMixin, ShardFanOutMixin, RoleScopedMixin, VersionedWriteMixin, generics.GenericAPIView):
     """
     Handle stage transitions for performance reviews
     """
 
-    queryset = PerformanceReview.objects.all()
+    access_scope = "reviews"
+    queryset = PerformanceReview.objects.select_related("employee", "reviewer").annotate(
+        employee_department_id=F("employee__department_id")
+    )
     serializer_class = PerformanceReviewSerializer
     permission_classes = [PerformanceReviewPermission]
 
     def post(self, request, pk=None):
         review = self.get_object()
+        review.expected_version = self.if_match_version(review)
         new_stage = request.data.get("new_stage")
 
         if not new_stage:
@@ -252,7 +899,80 @@ class PerformanceReviewTransitionView(generics.GenericAPIView):
             )
 
         review.stage = new_stage
-        review.save()
+        with transaction.atomic(using=router.db_for_write(PerformanceReview, instance=review)):
+            try:
+                review.save()
+            except VersionConflict:
+                raise PreconditionFailed()
 
         serializer = self.get_serializer(review)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class PerformanceReviewStageMetricsView(ProfiledViewMixin, generics.GenericAPIView):
+    """
+    Time-in-stage percentiles and bottleneck stages from the maintained
+    stage duration histograms; narrow with ?company= or ?department=
+    """
+
+    permission_classes = [IsManagerUser]
+
+    def get(self, request):
+        context = get_access_context(request.user)
+        buckets = context.scope("stage_durations", StageDurationBucket.objects.all())
+        reviews = context.scope("reviews", PerformanceReview.objects.all())
+        try:
+            for param, lookup in [("company", "company_id"), ("department", "department_id")]:
+                if param in request.query_params:
+                    value = int(request.query_params[param])
+                    buckets = buckets.filter(**{lookup: value})
+                    reviews = reviews.filter(**{f"employee__{lookup}": value})
+        except ValueError:
+            return Response(
+                {"error": "company and department must be ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(stage_metrics(buckets, reviews))
+
+
+class PerformanceReviewAssignReviewersView(ProfiledViewMixin, generics.GenericAPIView):
+    """
+    Assign reviewers to every unassigned open review in scope, balancing
+    their current load; narrow with company or department in the body
+    and preview with dry_run
+    """
+
+    permission_classes = [IsManagerUser]
+
+    def post(self, request):
+        context = get_access_context(request.user)
+        reviews = context.scope("reviews", PerformanceReview.objects.all())
+        try:
+            for param, lookup in [("company", "company_id"), ("department", "department_id")]:
+                if request.data.get(param) is not None:
+                    value = int(request.data[param])
+                    reviews = reviews.filter(**{f"employee__{lookup}": value})
+                    if param == "company" and sharding.is_enabled() and context.is_admin:
+                        sharding.activate_company(value)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "company and department must be ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        dry_run = str(request.data.get("dry_run", "")).lower() in ("1", "true", "yes")
+        return Response(assign_reviewers(reviews, dry_run=dry_run))
+
+
+class DeletionJobDetailView(ProfiledViewMixin, ShardFanOutMixin, generics.RetrieveAPIView):
+    """
+    Progress of a background deletion: admins see every job, others the
+    jobs they requested
+    """
+
+    serializer_class = DeletionJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        if self.request.user.role == "admin":
+            return DeletionJob.objects.all()
+        return DeletionJob.objects.filter(requested_by=self.request.user)
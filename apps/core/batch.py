@@ -0,0 +1,155 @@
+import json
+import time
+from contextlib import ExitStack, contextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+
+from .throttling import release_concurrency
+
+DEFAULT_BATCH_SETTINGS = {
+    # Sub-requests per batch, checked before any of them runs.
+    "MAX_REQUESTS": 20,
+    # Wall time for the whole batch; a query still running when it is up
+    # is cancelled and its sub-request answered with a 504.
+    "MAX_SECONDS": 5.0,
+    "PATH_PREFIX": "/api/",
+}
+
+# SQLite virtual machine instructions between deadline checks.
+SQLITE_PROGRESS_STEPS = 10000
+
+
+def get_batch_settings():
+    return {**DEFAULT_BATCH_SETTINGS, **getattr(settings, "BATCH", {})}
+
+
+class SubRequestError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class DeadlineExceeded(DatabaseError):
+    pass
+
+
+class QueryDeadline:
+    """
+    Execute wrapper that stops queries at ``deadline`` (a
+    ``time.monotonic()`` value).
+
+    No query starts after it. On PostgreSQL each query runs under a
+    ``statement_timeout`` of the time left; on SQLite a progress handler
+    interrupts it. Installed on every configured connection for the
+    duration of ``apply()``.
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.connections = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("Batch time limit exceeded")
+        connection = context["connection"]
+        self.connections.add(connection)
+        if connection.vendor == "postgresql":
+            context["cursor"].execute(
+                "SET statement_timeout = %s", [max(1, int(remaining * 1000))]
+            )
+        elif connection.vendor == "sqlite":
+            connection.connection.set_progress_handler(self.expired, SQLITE_PROGRESS_STEPS)
+        return execute(sql, params, many, context)
+
+    def expired(self):
+        return time.monotonic() > self.deadline
+
+    def reset(self):
+        for connection in self.connections:
+            if connection.connection is None:
+                continue
+            if connection.vendor == "postgresql":
+                with connection.connection.cursor() as cursor:
+                    cursor.execute("RESET statement_timeout")
+            elif connection.vendor == "sqlite":
+                connection.connection.set_progress_handler(None, 0)
+        self.connections.clear()
+
+    @contextmanager
+    def apply(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            try:
+                yield self
+            finally:
+                self.reset()
+
+
+def build_sub_request(request, url):
+    """
+    Build a GET for ``url`` that reuses the batch request's authenticated
+    user, so DRF skips authentication and the user's cached AccessContext
+    is shared by every sub-request.
+    """
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path.startswith(
+        get_batch_settings()["PATH_PREFIX"]
+    ):
+        raise SubRequestError(400, "Only relative API paths can be batched")
+    try:
+        match = resolve(parts.path)
+    except Resolver404:
+        raise SubRequestError(404, "Not found.")
+    if match.url_name == "batch":
+        raise SubRequestError(400, "Batches cannot be nested")
+
+    sub_request = HttpRequest()
+    sub_request.method = "GET"
+    sub_request.path = sub_request.path_info = parts.path
+    sub_request.META = {
+        **request.META,
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": parts.path,
+        "QUERY_STRING": parts.query,
+        "CONTENT_LENGTH": "",
+    }
+    sub_request.GET = QueryDict(parts.query)
+    sub_request.resolver_match = match
+    sub_request.user = request.user
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    return sub_request, match
+
+
+def run_sub_request(request, url, deadline):
+    """
+    Run one GET through the URL resolver, its queries stopped at
+    ``deadline``; returns ``(status, body)``.
+    """
+    try:
+        sub_request, match = build_sub_request(request, url)
+    except SubRequestError as e:
+        return e.status, {"detail": e.detail}
+
+    try:
+        with QueryDeadline(deadline).apply():
+            response = match.func(sub_request, *match.args, **match.kwargs)
+    except DatabaseError:
+        if time.monotonic() < deadline:
+            raise
+        return 504, {"detail": "Batch time limit exceeded while this request ran."}
+    finally:
+        release_concurrency(sub_request)
+    data = getattr(response, "data", None)
+    if data is None and response.get("Content-Type", "").startswith("application/json"):
+        data = json.loads(response.content or "null")
+    elif data is None and not getattr(response, "streaming", False):
+        data = response.content.decode(response.charset or "utf-8")
+    return response.status_code, data
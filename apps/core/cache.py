@@ -0,0 +1,44 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _new_epoch():
+    # Fresh versions start from the clock, so a version key that was
+    # evicted can never come back with a value an old entry was stored under.
+    return time.time_ns()
+
+
+def get_versions(names):
+    """
+    Current version of each name, as a tuple in the same order.
+    """
+    keys = [f"version:{name}" for name in names]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_epoch(), None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return tuple(versions)
+
+
+def bump_versions(names, using=None):
+    """
+    Invalidate every entry cached under the current versions of ``names``.
+
+    Inside a transaction on database ``using`` this happens on commit, so
+    readers cannot cache the old rows again under the new version.
+    """
+    keys = {f"version:{name}" for name in names}
+
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _new_epoch(), None)
+
+    transaction.on_commit(bump, using=using)
@@ -0,0 +1,206 @@
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .loadtest import percentile
+
+User = get_user_model()
+
+READS = [
+    "/employees/profile/",
+    "/employees/workspace/",
+    "/projects/",
+    "/performance-reviews/",
+]
+WRITES = [
+    ("/profile/", lambda n: {"first_name": f"Bench{n}"}),
+    ("/employees/profile/", lambda n: {"address": f"{n} Bench street"}),
+]
+MIXES = {"read": 0.0, "mixed": 0.2, "write": 1.0}
+
+
+class Command(BaseCommand):
+    help = (
+        "Start gunicorn gthread workers on the configured SQLite database and "
+        "measure read and write throughput for read-only, mixed and write-only "
+        "traffic, optionally against the untuned defaults."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--concurrency", type=int, default=16, help="Client threads")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds per mix")
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--prefix", default="seed", help="seed_org prefix of the users")
+        parser.add_argument("--bind", default="127.0.0.1:8765")
+        parser.add_argument("--mix", action="append", choices=list(MIXES))
+        parser.add_argument(
+            "--compare", action="store_true", help="Also run with SQLITE_PROFILE=False"
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--json", action="store_true", help="Output JSON")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The default database is not SQLite")
+        if importlib.util.find_spec("gunicorn") is None:
+            raise CommandError("gunicorn is not installed")
+
+        tokens = self.issue_tokens(options)
+        mixes = options["mix"] or list(MIXES)
+        profiles = ["default", "tuned"] if options["compare"] else ["tuned"]
+        report = {}
+        for profile in profiles:
+            if profile == "default":
+                # journal_mode is stored in the database file; reset it so the
+                # untuned run really uses the rollback journal.
+                connection.ensure_connection()
+                connection.connection.execute("PRAGMA journal_mode = DELETE")
+            connection.close()
+            with self.server(options, profile == "tuned") as base_url:
+                report[profile] = {
+                    mix: self.run_mix(base_url, tokens, MIXES[mix], options) for mix in mixes
+                }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report, options)
+
+    def issue_tokens(self, options):
+        users = list(
+            User.objects.filter(
+                username__startswith=f"{options['prefix']}-", employee_profile__isnull=False
+            ).order_by("pk")[: options["users"]]
+        )
+        if not users:
+            raise CommandError("No seeded employees; run seed_org first")
+        return [str(RefreshToken.for_user(user).access_token) for user in users]
+
+    @contextmanager
+    def server(self, options, tuned):
+        process = subprocess.Popen(
+            [
+                sys.executable, "-m", "gunicorn", "Talentum.wsgi:application",
+                "--worker-class", "gthread",
+                "--workers", str(options["workers"]),
+                "--threads", str(options["threads"]),
+                "--bind", options["bind"],
+                "--log-level", "warning",
+            ],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "SQLITE_PROFILE": str(tuned)},
+        )
+        try:
+            base_url = f"http://{options['bind']}/api/v1"
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    requests.get(f"{base_url}/profile/", timeout=1)
+                    break
+                except requests.ConnectionError:
+                    if process.poll() is not None or time.monotonic() > deadline:
+                        raise CommandError("gunicorn did not start")
+                    time.sleep(0.2)
+            yield base_url
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def run_mix(self, base_url, tokens, write_ratio, options):
+        samples = defaultdict(list)
+        outcomes = defaultdict(lambda: defaultdict(int))
+        lock = threading.Lock()
+        deadline = time.monotonic() + options["duration"]
+
+        def worker(index):
+            rng = random.Random(options["seed"] + index)
+            session = requests.Session()
+            local = defaultdict(list)
+            local_outcomes = defaultdict(lambda: defaultdict(int))
+            counter = 0
+            while time.monotonic() < deadline:
+                counter += 1
+                headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+                if rng.random() < write_ratio:
+                    kind, method = "write", "PATCH"
+                    path, payload = rng.choice(WRITES)
+                    payload = payload(counter)
+                else:
+                    kind, method, payload = "read", "GET", None
+                    path = rng.choice(READS)
+                start = time.perf_counter()
+                try:
+                    status_code = session.request(
+                        method, f"{base_url}{path}", json=payload, headers=headers
+                    ).status_code
+                except requests.RequestException:
+                    status_code = None
+                local[kind].append(time.perf_counter() - start)
+                if status_code is None or status_code >= 500:
+                    local_outcomes[kind]["errors"] += 1
+                elif status_code == 429:
+                    local_outcomes[kind]["throttled"] += 1
+            with lock:
+                for kind, values in local.items():
+                    samples[kind].extend(values)
+                for kind, counts in local_outcomes.items():
+                    for outcome, count in counts.items():
+                        outcomes[kind][outcome] += count
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            list(executor.map(worker, range(options["concurrency"])))
+        elapsed = time.monotonic() - started
+
+        result = {}
+        for kind in ("read", "write"):
+            values = sorted(samples.get(kind, []))
+            if not values:
+                continue
+            result[kind] = {
+                "requests": len(values),
+                "per_second": round(len(values) / elapsed, 1),
+                "errors": outcomes[kind]["errors"],
+                "throttled": outcomes[kind]["throttled"],
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            }
+        return result
+
+    def print_report(self, report, options):
+        self.stdout.write(
+            f"gunicorn gthread: {options['workers']} workers x {options['threads']} threads, "
+            f"{options['concurrency']} client threads, {options['duration']}s per mix"
+        )
+        self.stdout.write(
+            f"{'profile':<9} {'mix':<7} {'kind':<6} {'reqs':>7} {'req/s':>8} "
+            f"{'5xx':>5} {'429':>5} {'p50':>8} {'p99':>8}"
+        )
+        for profile, mixes in report.items():
+            for mix, kinds in mixes.items():
+                for kind, stats in kinds.items():
+                    self.stdout.write(
+                        f"{profile:<9} {mix:<7} {kind:<6} {stats['requests']:>7} "
+                        f"{stats['per_second']:>8} {stats['errors']:>5} "
+                        f"{stats['throttled']:>5} {stats['p50_ms']:>8} {stats['p99_ms']:>8}"
+                    )
@@ -0,0 +1,490 @@
+import itertools
+import json
+import random
+import string
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+User = get_user_model()
+
+ROLE_MIX = {"admin": 0.05, "manager": 0.25, "employee": 0.70}
+
+TODAY = date.today()
+WINDOW = f"start={TODAY.isoformat()}&end={(TODAY + timedelta(days=90)).isoformat()}"
+LOAD_PASSWORD = "LoadTest-9f3a!"
+
+# One replayed request. {company}, {department}, ... in ``path`` are filled
+# from ids discovered during warm-up or from rows the virtual user created
+# itself, and ``payload(user, ids)`` builds the JSON body. A step is only
+# picked once every pool it uses (its placeholders, ``needs`` and
+# ``takes``) has ids. On success the id used for ``takes`` leaves that pool
+# and the value the response names joins the ``gives`` pool, so the rows a
+# run creates are transitioned and deleted by the same run.
+Step = namedtuple(
+    "Step", "weight method path payload needs takes gives", defaults=(None, (), None, None)
+)
+
+
+def register_payload(user, ids):
+    name = user.unique_name()
+    return {
+        "username": name,
+        "email": f"{name}@example.com",
+        "first_name": "Load",
+        "last_name": "Test",
+        "password": LOAD_PASSWORD,
+        "password_confirm": LOAD_PASSWORD,
+    }
+
+
+def login_payload(user, ids):
+    return {"email": user.email, "password": user.password}
+
+
+def refresh_payload(user, ids):
+    return {"refresh": ids["refresh"]}
+
+
+def logout_payload(user, ids):
+    return {"refresh_token": ids["refresh"]}
+
+
+def profile_payload(user, ids):
+    return {"first_name": "Load"}
+
+
+def batch_payload(user, ids):
+    return {
+        "requests": [
+            f"{user.api_path}/profile/",
+            f"{user.api_path}/companies/{ids['company']}/",
+            f"{user.api_path}/projects/",
+        ]
+    }
+
+
+def name_payload(user, ids):
+    return {"name": user.unique_name()}
+
+
+def department_payload(user, ids):
+    return {"company": ids["company"], "name": user.unique_name()}
+
+
+def employee_payload(user, ids):
+    name = user.unique_name()
+    return {
+        "company": ids["home_company"],
+        "department": ids["home_department"],
+        "user": ids["new_user"],
+        "name": name,
+        "email": f"{name}@example.com",
+        "mobile_number": "5550100",
+        "address": "1 Load Street",
+        "designation": "Load Tester",
+        "hired_on": TODAY.isoformat(),
+    }
+
+
+def designation_payload(user, ids):
+    return {"designation": user.rng.choice(["Load Tester", "Senior Load Tester"])}
+
+
+def project_payload(user, ids):
+    return {
+        "company": ids["home_company"],
+        "department": ids["home_department"],
+        "name": user.unique_name(),
+        "description": "Load test project",
+        "start_date": TODAY.isoformat(),
+        "end_date": (TODAY + timedelta(days=90)).isoformat(),
+    }
+
+
+def description_payload(user, ids):
+    return {"description": f"Load test project {user.rng.randint(1, 1000)}"}
+
+
+def assignment_payload(user, ids):
+    return {
+        "employee": ids["employee"],
+        "allocation": user.rng.choice([25, 50, 100]),
+        "start_date": TODAY.isoformat(),
+        "end_date": (TODAY + timedelta(days=30)).isoformat(),
+    }
+
+
+def allocation_payload(user, ids):
+    return {"allocation": user.rng.choice([25, 50, 100])}
+
+
+def review_payload(user, ids):
+    return {"employee": ids["employee"], "review_date": TODAY.isoformat()}
+
+
+def schedule_payload(user, ids):
+    return {"new_stage": "review_scheduled"}
+
+
+def notes_payload(user, ids):
+    return {"notes": f"Load test note {user.rng.randint(1, 1000)}"}
+
+
+def dry_run_payload(user, ids):
+    return {"dry_run": True}
+
+
+AUTH = [
+    Step(1, "POST", "/auth/register/", register_payload, gives="new_user"),
+    Step(1, "POST", "/auth/login/", login_payload, gives="refresh"),
+    Step(1, "POST", "/token/refresh/", refresh_payload, takes="refresh", gives="refresh"),
+    Step(1, "POST", "/auth/logout/", logout_payload, takes="refresh"),
+    Step(3, "GET", "/profile/"),
+    Step(1, "PATCH", "/profile/", profile_payload),
+    Step(1, "POST", "/batch/", batch_payload, needs=("company",)),
+]
+
+SCENARIOS = {
+    "admin": AUTH + [
+        Step(3, "GET", "/companies/"),
+        Step(2, "GET", "/companies/{company}/"),
+        Step(2, "GET", "/companies/{company}/dashboard/"),
+        Step(3, "GET", "/departments/"),
+        Step(2, "GET", "/departments/{department}/"),
+        Step(1, "GET", "/departments/changes/"),
+        Step(1, "GET", "/departments/{department}/collaboration-graph/"),
+        Step(1, "GET", f"/departments/{{department}}/availability/?{WINDOW}"),
+        Step(1, "GET", f"/departments/{{department}}/utilization/?{WINDOW}"),
+        Step(1, "POST", "/departments/", department_payload, needs=("company",), gives="new_department"),
+        Step(1, "PATCH", "/departments/{new_department}/", name_payload),
+        Step(1, "DELETE", "/departments/{new_department}/", takes="new_department", gives="job"),
+        Step(1, "GET", "/deletion-jobs/{job}/"),
+        Step(4, "GET", "/employees/"),
+        Step(2, "GET", "/employees/?search=engineer"),
+        Step(1, "GET", "/employees/changes/"),
+        Step(3, "GET", "/projects/"),
+        Step(1, "GET", "/projects/changes/"),
+        Step(3, "GET", "/performance-reviews/"),
+        Step(2, "GET", "/performance-reviews/{review}/"),
+        Step(1, "GET", "/performance-reviews/changes/"),
+        Step(1, "GET", "/performance-reviews/stage-metrics/"),
+        Step(1, "POST", "/performance-reviews/assign-reviewers/", dry_run_payload),
+    ],
+    "manager": AUTH + [
+        Step(2, "GET", "/employees/profile/"),
+        Step(1, "GET", "/employees/workspace/"),
+        Step(4, "GET", "/employees/"),
+        Step(2, "GET", "/employees/{employee}/"),
+        Step(1, "GET", "/employees/{employee}/collaborators/"),
+        Step(1, "GET", "/employees/?search=engineer"),
+        Step(
+            1, "POST", "/employees/", employee_payload,
+            needs=("home_company", "home_department"), takes="new_user", gives="new_employee",
+        ),
+        Step(1, "PATCH", "/employees/{new_employee}/", designation_payload),
+        Step(1, "DELETE", "/employees/{new_employee}/", takes="new_employee"),
+        Step(1, "GET", "/departments/{department}/"),
+        Step(1, "GET", f"/departments/{{home_department}}/availability/?{WINDOW}"),
+        Step(1, "GET", f"/departments/{{home_department}}/utilization/?{WINDOW}"),
+        Step(1, "GET", "/departments/{home_department}/collaboration-graph/"),
+        Step(3, "GET", "/projects/"),
+        Step(2, "GET", "/projects/{project}/"),
+        Step(1, "GET", "/projects/{project}/assignments/"),
+        Step(
+            1, "POST", "/projects/", project_payload,
+            needs=("home_company", "home_department"), gives="new_project",
+        ),
+        Step(1, "PATCH", "/projects/{new_project}/", description_payload),
+        Step(
+            1, "POST", "/projects/{new_project}/assignments/", assignment_payload,
+            needs=("employee",), gives="assignment",
+        ),
+        Step(1, "GET", "/projects/{assignment}/"),
+        Step(1, "PATCH", "/projects/{assignment}/", allocation_payload),
+        Step(1, "DELETE", "/projects/{assignment}/", takes="assignment"),
+        Step(1, "DELETE", "/projects/{new_project}/", takes="new_project"),
+        Step(5, "GET", "/performance-reviews/"),
+        Step(3, "GET", "/performance-reviews/?stage=under_approval"),
+        Step(2, "GET", "/performance-reviews/{review}/"),
+        Step(
+            2, "POST", "/performance-reviews/", review_payload,
+            needs=("employee",), gives="new_review",
+        ),
+        Step(
+            1, "POST", "/performance-reviews/{new_review}/transition/", schedule_payload,
+            takes="new_review", gives="scheduled_review",
+        ),
+        Step(1, "PATCH", "/performance-reviews/{scheduled_review}/", notes_payload),
+        Step(1, "DELETE", "/performance-reviews/{scheduled_review}/", takes="scheduled_review"),
+    ],
+    "employee": AUTH + [
+        Step(4, "GET", "/employees/profile/"),
+        Step(2, "GET", "/employees/workspace/"),
+        Step(2, "GET", "/companies/{company}/"),
+        Step(1, "GET", "/departments/"),
+        Step(3, "GET", "/projects/"),
+        Step(2, "GET", "/performance-reviews/"),
+    ],
+}
+
+DISCOVERY = {
+    "company": "/companies/",
+    "department": "/departments/",
+    "employee": "/employees/",
+    "project": "/projects/",
+    "review": "/performance-reviews/",
+}
+
+
+def produced(pool, body):
+    """
+    The value a successful response adds to ``pool``.
+    """
+    if pool == "new_user":
+        return body["user"]["id"]
+    if pool == "refresh":
+        return body.get("refresh") or body["tokens"]["refresh"]
+    if pool == "assignment":
+        # Assignments are nested under their project; keep both ids.
+        return f"{body['project']}/assignments/{body['id']}"
+    return body["id"]
+
+
+def step_pools(step):
+    pools = {name for _, name, _, _ in string.Formatter().parse(step.path) if name}
+    pools.update(step.needs)
+    if step.takes:
+        pools.add(step.takes)
+    return pools
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class VirtualUser:
+    def __init__(self, base_url, email, password, role):
+        self.base_url = base_url
+        self.api_path = urlsplit(base_url).path
+        self.email = email
+        self.password = password
+        self.role = role
+        self.rng = None
+        self.tag = "warmup"
+        self.names = itertools.count(1)
+        self.ids = defaultdict(list)
+        self.session = requests.Session()
+        response = self.session.post(
+            f"{base_url}/auth/login/", json={"email": email, "password": password}
+        )
+        response.raise_for_status()
+        access = response.json()["tokens"]["access"]
+        self.session.headers["Authorization"] = f"Bearer {access}"
+
+    def discover(self):
+        for key, path in DISCOVERY.items():
+            response = self.session.get(f"{self.base_url}{path}")
+            if response.ok:
+                self.ids[key] = [row["id"] for row in response.json().get("results", [])]
+        response = self.session.get(f"{self.base_url}/employees/profile/")
+        if response.ok:
+            profile = response.json()
+            # Managers write only inside their own department.
+            self.ids["home_company"] = [profile["company"]]
+            self.ids["home_department"] = [profile["department"]]
+
+    def clone(self, rng, tag):
+        """
+        A copy for one worker thread: its own session, RNG and pools of
+        created rows, sharing only the login and the discovered ids.
+        """
+        user = object.__new__(VirtualUser)
+        user.__dict__.update(self.__dict__)
+        user.rng = rng
+        user.tag = tag
+        user.names = itertools.count(1)
+        user.ids = defaultdict(list, {key: list(pool) for key, pool in self.ids.items()})
+        user.session = requests.Session()
+        user.session.headers.update(self.session.headers)
+        return user
+
+    def unique_name(self):
+        return f"load-{self.tag}-{next(self.names)}"
+
+    def next_request(self):
+        scenario = [
+            step for step in SCENARIOS[self.role]
+            if all(self.ids.get(pool) for pool in step_pools(step))
+        ]
+        step = self.rng.choices(scenario, weights=[step.weight for step in scenario])[0]
+        ids = {key: self.rng.choice(pool) for key, pool in sorted(self.ids.items()) if pool}
+        payload = step.payload(self, ids) if step.payload else None
+        return step, ids, step.path.format(**ids), payload
+
+    def record(self, step, ids, response):
+        """
+        Move created, transitioned and deleted rows between pools.
+        """
+        if step.takes:
+            self.ids[step.takes].remove(ids[step.takes])
+        if step.gives:
+            self.ids[step.gives].append(produced(step.gives, response.json()))
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a weighted admin/manager/employee mix of every /api/v1/ route, "
+        "reads and writes, against a running server and report throughput and "
+        "latency percentiles per route."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000/api/v1")
+        parser.add_argument("--prefix", default="seed", help="seed_org prefix of the users")
+        parser.add_argument("--password", default="seedpass123")
+        parser.add_argument("--users", type=int, default=20, help="Virtual users")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=30.0, help="Seconds")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--json", action="store_true", help="Output JSON")
+
+    def handle(self, *args, **options):
+        base_url = options["base_url"].rstrip("/")
+        virtual_users = self.login(base_url, options, random.Random(options["seed"]))
+        # Names of created rows must not collide with an earlier run's.
+        run = int(time.time())
+
+        results = defaultdict(list)
+        errors = defaultdict(int)
+        rejected = defaultdict(int)
+        lock = threading.Lock()
+        deadline = time.monotonic() + options["duration"]
+
+        def worker(worker_index):
+            # Every worker replays its own seeded sequence through its own
+            # copies of the users, so no session or RNG is shared between
+            # threads.
+            rng = random.Random(options["seed"] + worker_index)
+            users = [
+                user.clone(rng, f"{run}-{worker_index}-{index}")
+                for index, user in enumerate(virtual_users)
+            ]
+            local = defaultdict(list)
+            local_errors = defaultdict(int)
+            local_rejected = defaultdict(int)
+            while time.monotonic() < deadline:
+                user = rng.choice(users)
+                step, ids, url, payload = user.next_request()
+                key = f"{step.method} {step.path}"
+                start = time.perf_counter()
+                try:
+                    response = user.session.request(
+                        step.method, f"{base_url}{url}", json=payload
+                    )
+                    status_code = response.status_code
+                except requests.RequestException:
+                    status_code = None
+                local[key].append(time.perf_counter() - start)
+                # 4xx are expected when a role picks an id outside its scope.
+                if status_code is None or status_code >= 500:
+                    local_errors[key] += 1
+                elif status_code >= 400:
+                    local_rejected[key] += 1
+                else:
+                    user.record(step, ids, response)
+            with lock:
+                for key, samples in local.items():
+                    results[key].extend(samples)
+                for key, count in local_errors.items():
+                    errors[key] += count
+                for key, count in local_rejected.items():
+                    rejected[key] += count
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            list(executor.map(worker, range(options["concurrency"])))
+        elapsed = time.monotonic() - started
+
+        report = self.build_report(results, errors, rejected, elapsed, options)
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def login(self, base_url, options, rng):
+        counts = {
+            role: max(1, round(options["users"] * share)) for role, share in ROLE_MIX.items()
+        }
+        virtual_users = []
+        for role, count in counts.items():
+            emails = list(
+                User.objects.filter(
+                    role=role, username__startswith=f"{options['prefix']}-"
+                )
+                .order_by("pk")
+                .values_list("email", flat=True)[: count * 10]
+            )
+            if not emails:
+                raise CommandError(f"No seeded {role} users; run seed_org first")
+            for email in rng.sample(emails, min(count, len(emails))):
+                user = VirtualUser(base_url, email, options["password"], role)
+                user.discover()
+                virtual_users.append(user)
+        return virtual_users
+
+    def build_report(self, results, errors, rejected, elapsed, options):
+        all_samples = sorted(sample for samples in results.values() for sample in samples)
+
+        def summarize(samples, error_count, rejected_count):
+            samples = sorted(samples)
+            return {
+                "requests": len(samples),
+                "errors": error_count,
+                "rejected": rejected_count,
+                "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+                "p90_ms": round(percentile(samples, 0.90) * 1000, 2),
+                "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+                "max_ms": round((samples[-1] if samples else 0) * 1000, 2),
+            }
+
+        return {
+            "duration_s": round(elapsed, 2),
+            "concurrency": options["concurrency"],
+            "throughput_rps": round(len(all_samples) / elapsed, 1) if elapsed else 0,
+            "total": summarize(
+                all_samples, sum(errors.values()), sum(rejected.values())
+            ),
+            "routes": {
+                route: summarize(samples, errors.get(route, 0), rejected.get(route, 0))
+                for route, samples in sorted(results.items())
+            },
+        }
+
+    def print_report(self, report):
+        total = report["total"]
+        self.stdout.write(
+            f"{total['requests']:,} requests in {report['duration_s']}s at "
+            f"concurrency {report['concurrency']}: {report['throughput_rps']} req/s, "
+            f"{total['errors']} errors, {total['rejected']} rejected (4xx)"
+        )
+        self.stdout.write(
+            f"{'route':<72} {'reqs':>7} {'err':>5} {'4xx':>5} "
+            f"{'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}"
+        )
+        for route, stats in [*report["routes"].items(), ("TOTAL", total)]:
+            self.stdout.write(
+                f"{route:<72} {stats['requests']:>7} {stats['errors']:>5} "
+                f"{stats['rejected']:>5} {stats['p50_ms']:>8} {stats['p90_ms']:>8} "
+                f"{stats['p99_ms']:>8} {stats['max_ms']:>8}"
+            )
@@ -0,0 +1,87 @@
+import json
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.nplusone import get_nplusone_settings
+
+
+class Command(BaseCommand):
+    help = "Summarize repeated-query findings recorded by the N+1 detector, per view."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", help="Report file (defaults to NPLUSONE['REPORT_FILE'])")
+        parser.add_argument("--view", help="Only report this view class")
+        parser.add_argument("--json", action="store_true", help="Output JSON")
+        parser.add_argument(
+            "--clear", action="store_true", help="Truncate the report file afterwards"
+        )
+
+    def handle(self, *args, **options):
+        report_file = options["file"] or get_nplusone_settings()["REPORT_FILE"]
+        if not report_file:
+            raise CommandError("No report file configured")
+
+        try:
+            with open(report_file) as fp:
+                findings = [json.loads(line) for line in fp if line.strip()]
+        except FileNotFoundError:
+            findings = []
+
+        report = self.aggregate(findings, options["view"])
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+        if options["clear"]:
+            open(report_file, "w").close()
+
+    def aggregate(self, findings, only_view=None):
+        report = defaultdict(dict)
+        for finding in findings:
+            view = finding["view"]
+            if only_view and view != only_view:
+                continue
+            entry = report[view].setdefault(
+                finding["fingerprint"],
+                {
+                    "requests": 0,
+                    "total_queries": 0,
+                    "max_queries": 0,
+                    "paths": set(),
+                    "stack": finding["stack"],
+                },
+            )
+            entry["requests"] += 1
+            entry["total_queries"] += finding["count"]
+            entry["max_queries"] = max(entry["max_queries"], finding["count"])
+            entry["paths"].add(f"{finding['method']} {finding['path']}")
+
+        return {
+            view: sorted(
+                (
+                    {"fingerprint": fingerprint, **entry, "paths": sorted(entry["paths"])}
+                    for fingerprint, entry in shapes.items()
+                ),
+                key=lambda entry: entry["total_queries"],
+                reverse=True,
+            )
+            for view, shapes in sorted(report.items())
+        }
+
+    def print_report(self, report):
+        if not report:
+            self.stdout.write("No repeated queries recorded.")
+            return
+
+        for view, shapes in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(view))
+            for shape in shapes:
+                self.stdout.write(
+                    f"  {shape['requests']} requests, {shape['total_queries']} queries "
+                    f"(max {shape['max_queries']} per request)"
+                )
+                self.stdout.write(f"    {shape['fingerprint']}")
+                for frame in shape["stack"]:
+                    self.stdout.write(f"      {frame}")
@@ -0,0 +1,304 @@
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from .db import QueryRecorder
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+METRIC_HELP = {
+    "http_requests_total": ("counter", "Total HTTP requests by URL name, method and status."),
+    "http_request_errors_total": ("counter", "HTTP requests that returned a 5xx status."),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency in seconds."),
+    "http_request_db_queries": ("histogram", "Database queries issued per HTTP request."),
+    "profiled_request_duration_seconds": (
+        "histogram",
+        "Latency in seconds of profiled (sampled) requests by view class and role.",
+    ),
+    "profiled_request_db_queries": (
+        "histogram",
+        "Database queries per profiled (sampled) request by view class and role.",
+    ),
+}
+
+DEFAULT_METRICS_SETTINGS = {
+    "DIRECTORY": None,
+    "FLUSH_INTERVAL": 5.0,
+    "TOKEN": None,
+}
+
+
+def get_metrics_settings():
+    return {**DEFAULT_METRICS_SETTINGS, **getattr(settings, "METRICS", {})}
+
+
+class MetricsRegistry:
+    """
+    Process-local metrics that are aggregated across worker processes
+    through a shared directory.
+
+    Every thread writes into its own shard, so recording a request never
+    takes a lock. Shards are merged and written to
+    ``<DIRECTORY>/metrics-<pid>.json`` at most every ``FLUSH_INTERVAL``
+    seconds by whichever request thread notices the interval has passed.
+    ``collect()`` merges the files of all live workers and removes those of
+    processes that have exited.
+    """
+
+    def __init__(self):
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {"counters": defaultdict(float), "histograms": {}}
+            self._local.shard = shard
+            # Taken once per thread, never per request.
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, labels, amount=1):
+        self._shard()["counters"][(name, labels)] += amount
+
+    def observe(self, name, labels, value, buckets):
+        histograms = self._shard()["histograms"]
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            # Per-bucket counts (last slot is +Inf), then sum and count.
+            histogram = histograms[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+        index = len(buckets)
+        for position, bound in enumerate(buckets):
+            if value <= bound:
+                index = position
+                break
+        histogram[index] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def observe_request(self, view, method, status_code, duration, query_count):
+        self.inc("http_requests_total", (view, method, str(status_code)))
+        if status_code >= 500:
+            self.inc("http_request_errors_total", (view, method))
+        self.observe(
+            "http_request_duration_seconds", (view, method), duration, LATENCY_BUCKETS
+        )
+        self.observe(
+            "http_request_db_queries", (view, method), query_count, QUERY_COUNT_BUCKETS
+        )
+        self.maybe_flush()
+
+    def observe_profile(self, view, role, duration, query_count):
+        self.observe(
+            "profiled_request_duration_seconds", (view, role), duration, LATENCY_BUCKETS
+        )
+        self.observe(
+            "profiled_request_db_queries", (view, role), query_count, QUERY_COUNT_BUCKETS
+        )
+
+    def snapshot(self):
+        """
+        Merge all thread shards of this process.
+        """
+        counters = defaultdict(float)
+        histograms = {}
+        for shard in list(self._shards):
+            for key, value in dict(shard["counters"]).items():
+                counters[key] += value
+            for key, values in dict(shard["histograms"]).items():
+                values = list(values)
+                merged = histograms.get(key)
+                if merged is None:
+                    histograms[key] = values
+                else:
+                    histograms[key] = [a + b for a, b in zip(merged, values)]
+        return counters, histograms
+
+    def maybe_flush(self):
+        interval = get_metrics_settings()["FLUSH_INTERVAL"]
+        if time.monotonic() - self._last_flush < interval:
+            return
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._flush()
+        finally:
+            self._flush_lock.release()
+
+    def flush(self):
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        directory = get_metrics_settings()["DIRECTORY"]
+        self._last_flush = time.monotonic()
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        counters, histograms = self.snapshot()
+        payload = {
+            "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+            "histograms": [
+                [name, list(labels), values] for (name, labels), values in histograms.items()
+            ],
+        }
+        path = os.path.join(directory, f"metrics-{self.pid}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(payload, fp)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """
+        Merge the metrics of every worker process.
+
+        Falls back to this process alone when no directory is configured.
+        """
+        directory = get_metrics_settings()["DIRECTORY"]
+        if not directory:
+            return self.snapshot()
+
+        self.flush()
+        counters = defaultdict(float)
+        histograms = {}
+        for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+            if not _process_alive(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as fp:
+                    payload = json.load(fp)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in payload["counters"]:
+                counters[(name, tuple(labels))] += value
+            for name, labels, values in payload["histograms"]:
+                key = (name, tuple(labels))
+                merged = histograms.get(key)
+                histograms[key] = (
+                    values if merged is None else [a + b for a, b in zip(merged, values)]
+                )
+        return counters, histograms
+
+
+def _process_alive(path):
+    """
+    Whether the worker that wrote ``metrics-<pid>.json`` is still running.
+    """
+    try:
+        pid = int(os.path.basename(path)[len("metrics-"):-len(".json")])
+        os.kill(pid, 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        # Running, but as another user.
+        return True
+    return True
+
+
+registry = MetricsRegistry()
+
+LABEL_NAMES = {
+    "http_requests_total": ("view", "method", "status"),
+    "http_request_errors_total": ("view", "method"),
+    "http_request_duration_seconds": ("view", "method"),
+    "http_request_db_queries": ("view", "method"),
+    "profiled_request_duration_seconds": ("view", "role"),
+    "profiled_request_db_queries": ("view", "role"),
+}
+
+HISTOGRAM_BUCKETS = {
+    "http_request_duration_seconds": LATENCY_BUCKETS,
+    "http_request_db_queries": QUERY_COUNT_BUCKETS,
+    "profiled_request_duration_seconds": LATENCY_BUCKETS,
+    "profiled_request_db_queries": QUERY_COUNT_BUCKETS,
+}
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def render_text(counters, histograms):
+    """
+    Render metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for name, (metric_type, help_text) in METRIC_HELP.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        label_names = LABEL_NAMES[name]
+        if metric_type == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(label_names, labels)} {value:g}")
+            continue
+
+        buckets = HISTOGRAM_BUCKETS[name]
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ("+Inf",), values):
+                cumulative += count
+                bucket_labels = _format_labels(label_names, labels, ("le", f"{bound}"))
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            series_labels = _format_labels(label_names, labels)
+            lines.append(f"{name}_sum{series_labels} {values[-2]:g}")
+            lines.append(f"{name}_count{series_labels} {values[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Record request rate, latency, DB query count and errors per URL name.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            with recorder.record():
+                response = self.get_response(request)
+            status_code = response.status_code
+            return response
+        finally:
+            resolver_match = getattr(request, "resolver_match", None)
+            view = resolver_match.view_name if resolver_match else "unmatched"
+            registry.observe_request(
+                view,
+                request.method,
+                status_code,
+                time.perf_counter() - start,
+                recorder.count,
+            )
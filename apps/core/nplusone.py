@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import random
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .utils import get_view_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NPLUSONE_SETTINGS = {
+    "MODE": "off",
+    "THRESHOLD": 5,
+    "SAMPLE_RATE": 1.0,
+    "REPORT_FILE": None,
+    "STACK_DEPTH": 8,
+}
+
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*%s\s*,?)+\)", re.IGNORECASE)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def get_nplusone_settings():
+    return {**DEFAULT_NPLUSONE_SETTINGS, **getattr(settings, "NPLUSONE", {})}
+
+
+class NPlusOneError(Exception):
+    """
+    Raised in ``raise`` mode when a query shape repeats past the threshold.
+    """
+
+
+def fingerprint_sql(sql):
+    """
+    Normalize a query so that executions differing only in parameters match.
+    """
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    return _WHITESPACE_RE.sub(" ", sql).strip()
+
+
+def _application_stack(depth):
+    """
+    Return the innermost project frames of the current stack, skipping
+    Django, third-party packages and this module.
+    """
+    base_dir = str(settings.BASE_DIR)
+    frames = []
+    for frame in traceback.extract_stack()[:-2]:
+        filename = frame.filename
+        if not filename.startswith(base_dir) or "site-packages" in filename:
+            continue
+        if filename == __file__:
+            continue
+        relative = os.path.relpath(filename, base_dir)
+        frames.append(f"{relative}:{frame.lineno} in {frame.name}: {frame.line}")
+    return frames[-depth:]
+
+
+class QueryShapeTracker:
+    """
+    Execute wrapper counting SELECTs per fingerprint for a single request.
+    """
+
+    def __init__(self, threshold, raise_on_detect, stack_depth):
+        self.threshold = threshold
+        self.raise_on_detect = raise_on_detect
+        self.stack_depth = stack_depth
+        self.counts = Counter()
+        self.findings = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() == "SELECT":
+            fingerprint = fingerprint_sql(sql)
+            self.counts[fingerprint] += 1
+            if self.counts[fingerprint] == self.threshold:
+                stack = _application_stack(self.stack_depth)
+                if self.raise_on_detect:
+                    raise NPlusOneError(
+                        f"Query executed {self.threshold} times in one request: "
+                        f"{fingerprint}\n" + "\n".join(stack)
+                    )
+                self.findings[fingerprint] = stack
+        return execute(sql, params, many, context)
+
+    def report(self):
+        return [
+            {"fingerprint": fingerprint, "count": self.counts[fingerprint], "stack": stack}
+            for fingerprint, stack in self.findings.items()
+        ]
+
+
+class NPlusOneMiddleware:
+    """
+    Detect repeated query shapes per request.
+
+    ``MODE`` is ``off``, ``log`` (sample requests, log and append findings
+    to ``REPORT_FILE``) or ``raise`` (fail the request at the offending
+    query, meant for tests).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_nplusone_settings()
+        mode = config["MODE"]
+        if mode == "off" or (
+            mode == "log" and random.random() >= config["SAMPLE_RATE"]
+        ):
+            return self.get_response(request)
+
+        tracker = QueryShapeTracker(
+            threshold=config["THRESHOLD"],
+            raise_on_detect=mode == "raise",
+            stack_depth=config["STACK_DEPTH"],
+        )
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(tracker))
+            response = self.get_response(request)
+
+        findings = tracker.report()
+        if findings:
+            self.record(request, findings, config["REPORT_FILE"])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._nplusone_view = get_view_name(view_func)
+
+    def record(self, request, findings, report_file):
+        view = getattr(request, "_nplusone_view", "unresolved")
+        for finding in findings:
+            logger.warning(
+                "Repeated query in %s %s (%s): executed %d times\n%s\n%s",
+                request.method,
+                request.path,
+                view,
+                finding["count"],
+                finding["fingerprint"],
+                "\n".join(f"  {frame}" for frame in finding["stack"]),
+            )
+
+        if not report_file:
+            return
+        os.makedirs(os.path.dirname(report_file), exist_ok=True)
+        with open(report_file, "a") as fp:
+            for finding in findings:
+                fp.write(
+                    json.dumps(
+                        {
+                            "timestamp": time.time(),
+                            "view": view,
+                            "method": request.method,
+                            "path": request.path,
+                            **finding,
+                        }
+                    )
+                    + "\n"
+                )
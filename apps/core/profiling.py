@@ -0,0 +1,238 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from .db import QueryRecorder
+from .metrics import registry
+from .utils import get_user_role, get_view_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILING_SETTINGS = {
+    "SAMPLE_RATE": 0.01,
+    "SLOW_REQUEST_MS": 500,
+    "TOP_N": 20,
+    "MAX_LOGGED_QUERIES": 20,
+}
+
+_active_profile = ContextVar("active_profile", default=None)
+
+
+def get_profiling_settings():
+    return {**DEFAULT_PROFILING_SETTINGS, **getattr(settings, "PROFILING", {})}
+
+
+class RequestProfile:
+    """
+    Timings collected for a single sampled request.
+    """
+
+    def __init__(self):
+        self.timings = defaultdict(float)
+        self.queries = QueryRecorder(capture_sql=True)
+        self.view_name = "unresolved"
+        self.total = 0.0
+        self._active_sections = set()
+        self._render_start = None
+
+    def start_render(self):
+        self._render_start = time.perf_counter()
+
+    def finish_render(self, response):
+        if self._render_start is not None:
+            self.timings["render"] += time.perf_counter() - self._render_start
+            self._render_start = None
+        return response
+
+    def server_timing(self):
+        entries = [
+            f'db;dur={self.queries.duration * 1000:.1f};desc="{self.queries.count} queries"'
+        ]
+        for name, seconds in self.timings.items():
+            entries.append(f"{name};dur={seconds * 1000:.1f}")
+        entries.append(f"total;dur={self.total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+@contextmanager
+def profile_section(name):
+    """
+    Add the time spent in the block to the active request profile.
+
+    A no-op when the current request is not sampled. Re-entering a section
+    that is already being timed does not count the time twice.
+    """
+    profile = _active_profile.get()
+    if profile is None or name in profile._active_sections:
+        yield
+        return
+
+    profile._active_sections.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.timings[name] += time.perf_counter() - start
+        profile._active_sections.discard(name)
+
+
+class ProfileStore:
+    """
+    Per-process top-N slowest sampled requests seen so far. Aggregates per
+    (view, role) go to the metrics registry, which merges them across
+    workers for ``/metrics``.
+    """
+
+    def __init__(self, top_n):
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.slowest = []
+
+    def record(self, entry):
+        """
+        Record a sampled request. Returns True if it entered the top-N.
+        """
+        with self._lock:
+            item = (entry["duration_ms"], next(self._counter), entry)
+            if len(self.slowest) < self.top_n:
+                heapq.heappush(self.slowest, item)
+                return True
+            if item[0] > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, item)
+                return True
+            return False
+
+    def top(self):
+        with self._lock:
+            return [entry for _, _, entry in sorted(self.slowest, reverse=True)]
+
+
+profile_store = ProfileStore(top_n=get_profiling_settings()["TOP_N"])
+
+
+class RequestProfilingMiddleware:
+    """
+    Profile a sample of requests.
+
+    Sampled responses carry a ``Server-Timing`` header with DB, serializer,
+    permission and render timings. Unsampled requests pay for a single
+    ``random()`` call.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = get_profiling_settings()
+        self.sample_rate = config["SAMPLE_RATE"]
+        self.slow_request_ms = config["SLOW_REQUEST_MS"]
+        self.max_logged_queries = config["MAX_LOGGED_QUERIES"]
+
+    def __call__(self, request):
+        if not self.should_sample(request):
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _active_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            with profile.queries.record():
+                response = self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        profile.total = time.perf_counter() - start
+
+        response["Server-Timing"] = profile.server_timing()
+        self.store(request, response, profile)
+        return response
+
+    def should_sample(self, request):
+        if settings.DEBUG and "HTTP_X_PROFILE" in request.META:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _active_profile.get()
+        if profile is not None:
+            profile.view_name = get_view_name(view_func)
+
+    def process_template_response(self, request, response):
+        profile = _active_profile.get()
+        if profile is not None:
+            profile.start_render()
+            response.add_post_render_callback(profile.finish_render)
+        return response
+
+    def store(self, request, response, profile):
+        duration_ms = profile.total * 1000
+        entry = {
+            "view": profile.view_name,
+            "role": get_user_role(request),
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 1),
+            "query_count": profile.queries.count,
+            "db_ms": round(profile.queries.duration * 1000, 1),
+            "timings_ms": {
+                name: round(seconds * 1000, 1)
+                for name, seconds in profile.timings.items()
+            },
+        }
+        registry.observe_profile(
+            entry["view"], entry["role"], profile.total, entry["query_count"]
+        )
+        entered_top = profile_store.record(entry)
+
+        if entered_top and duration_ms >= self.slow_request_ms:
+            slowest_queries = sorted(
+                profile.queries.queries, key=lambda query: query[1], reverse=True
+            )[: self.max_logged_queries]
+            logger.warning(
+                "Slow request %s %s (%s, role=%s): %.1fms, %d queries\n%s",
+                entry["method"],
+                entry["path"],
+                entry["view"],
+                entry["role"],
+                duration_ms,
+                entry["query_count"],
+                "\n".join(
+                    f"  {seconds * 1000:8.2f}ms  {sql}" for sql, seconds in slowest_queries
+                ),
+                extra={"profile": entry},
+            )
+
+
+class ProfiledViewMixin:
+    """
+    Time permission checks of DRF views for the request profiler.
+    """
+
+    def check_permissions(self, request):
+        with profile_section("permissions"):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with profile_section("permissions"):
+            super().check_object_permissions(request, obj)
+
+
+class ProfiledSerializerMixin:
+    """
+    Time serializer representation for the request profiler.
+    """
+
+    def to_representation(self, instance):
+        with profile_section("serializer"):
+            return super().to_representation(instance)
@@ -0,0 +1,99 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_SETTINGS = {
+    "ENABLED": False,
+    "JOURNAL_MODE": "wal",
+    "SYNCHRONOUS": "normal",
+    "MMAP_SIZE": 256 * 1024 * 1024,
+    # Negative values are KiB rather than pages.
+    "CACHE_SIZE": -64000,
+    "BUSY_TIMEOUT_MS": 5000,
+    "WRITE_GATE": True,
+    "WRITE_GATE_TIMEOUT": 10.0,
+}
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+# One writer at a time per worker process; other processes wait on
+# SQLite's busy timeout instead.
+_write_gate = threading.Lock()
+
+
+def get_sqlite_settings():
+    return {**DEFAULT_SQLITE_SETTINGS, **getattr(settings, "SQLITE", {})}
+
+
+def configure_connection(sender, connection, **kwargs):
+    """
+    ``connection_created`` receiver applying the SQLite profile's pragmas
+    to every new SQLite connection.
+    """
+    config = get_sqlite_settings()
+    if connection.vendor != "sqlite" or not config["ENABLED"]:
+        return
+    pragmas = [
+        ("busy_timeout", int(config["BUSY_TIMEOUT_MS"])),
+        ("journal_mode", config["JOURNAL_MODE"]),
+        ("synchronous", config["SYNCHRONOUS"]),
+        ("mmap_size", int(config["MMAP_SIZE"])),
+        ("cache_size", int(config["CACHE_SIZE"])),
+    ]
+    # On the raw connection: these run once per connection and should not
+    # show up in query counts, metrics or profiles.
+    raw = connection.connection
+    for name, value in pragmas:
+        if value is not None:
+            raw.execute(f"PRAGMA {name} = {value}")
+
+
+def write_gate_enabled():
+    config = get_sqlite_settings()
+    return (
+        config["ENABLED"]
+        and config["WRITE_GATE"]
+        and connections[DEFAULT_DB_ALIAS].vendor == "sqlite"
+    )
+
+
+class SQLiteWriteGateMiddleware:
+    """
+    Run unsafe requests one at a time per process when the database is
+    SQLite, so threads queue here instead of contending for its write lock.
+
+    Views that only read despite an unsafe method (e.g. the batch endpoint)
+    opt out with ``write_gate = False``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            if getattr(request, "_write_gate_held", False):
+                request._write_gate_held = False
+                _write_gate.release()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in SAFE_METHODS or not write_gate_enabled():
+            return None
+        view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+        if not getattr(view_class, "write_gate", True):
+            return None
+        if not _write_gate.acquire(timeout=get_sqlite_settings()["WRITE_GATE_TIMEOUT"]):
+            logger.warning("Write gate timed out for %s %s", request.method, request.path)
+            response = JsonResponse(
+                {"detail": "The server is busy, please retry."}, status=503
+            )
+            response["Retry-After"] = "1"
+            return response
+        request._write_gate_held = True
+        return None
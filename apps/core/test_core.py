@@ -0,0 +1,369 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.companies.models import Company, Department, Employee, Project
+from apps.companies.views import CompanyListView
+from apps.core.metrics import registry
+from apps.core.nplusone import NPlusOneError, NPlusOneMiddleware, fingerprint_sql
+from apps.core.profiling import profile_store
+from apps.core.sqlite import _write_gate
+
+
+User = get_user_model()
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def api_client() -> APIClient:
+    return APIClient()
+
+
+@pytest.fixture
+def company() -> Company:
+    return Company.objects.create(name="Acme")
+
+
+@pytest.fixture
+def department(company: Company) -> Department:
+    return Department.objects.create(company=company, name="Engineering")
+
+
+@pytest.fixture
+def manager(company: Company, department: Department) -> User:
+    user = User.objects.create_user(
+        username="manager",
+        email="manager@example.com",
+        password="testpass123",
+        role="manager",
+    )
+    Employee.objects.create(
+        company=company,
+        department=department,
+        user=user,
+        name="Manager",
+        email="manager@acme.com",
+        mobile_number="+1234567890",
+        address="Main street",
+        designation="Engineering Manager",
+    )
+    return user
+
+
+@pytest.fixture
+def projects(company: Company, department: Department) -> list[Project]:
+    return [
+        Project.objects.create(
+            company=company,
+            department=department,
+            name=f"Project {index}",
+            description="Description",
+            start_date="2025-01-01",
+            end_date="2025-12-31",
+        )
+        for index in range(3)
+    ]
+
+
+def test_profiling_adds_server_timing_when_sampled(
+    api_client: APIClient, manager: User, projects: list[Project], settings
+):
+    settings.PROFILING = {"SAMPLE_RATE": 1.0, "SLOW_REQUEST_MS": 0}
+    settings.METRICS = {"DIRECTORY": None}
+    profile_store.reset()
+    key = ("profiled_request_duration_seconds", ("ProjectListView", "manager"))
+    before = registry.snapshot()[1].get(key, [0])[-1]
+    api_client.force_authenticate(manager)
+
+    response = api_client.get(reverse("project-list"))
+
+    assert response.status_code == status.HTTP_200_OK
+    timing = response["Server-Timing"]
+    assert timing.startswith("db;dur=")
+    assert "serializer;dur=" in timing
+    assert "permissions;dur=" in timing
+    assert "render;dur=" in timing
+    assert "total;dur=" in timing
+
+    assert registry.snapshot()[1][key][-1] == before + 1
+    body = api_client.get(reverse("metrics")).content.decode()
+    assert 'profiled_request_db_queries_count{view="ProjectListView",role="manager"}' in body
+    slowest = profile_store.top()[0]
+    assert slowest["view"] == "ProjectListView"
+    assert slowest["query_count"] > 0
+
+
+def test_profiling_skips_unsampled_requests(
+    api_client: APIClient, manager: User, settings
+):
+    settings.PROFILING = {"SAMPLE_RATE": 0.0}
+    api_client.force_authenticate(manager)
+
+    response = api_client.get(reverse("project-list"))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert "Server-Timing" not in response
+
+
+def test_metrics_endpoint_merges_worker_files(
+    api_client: APIClient, manager: User, settings, tmp_path
+):
+    settings.METRICS = {"DIRECTORY": str(tmp_path), "FLUSH_INTERVAL": 0}
+    # Another worker, still running, and one that has exited.
+    exited = subprocess.Popen([sys.executable, "-c", ""])
+    exited.wait()
+    (tmp_path / f"metrics-{exited.pid}.json").write_text(
+        json.dumps(
+            {"counters": [["http_requests_total", ["project-list", "GET", "200"], 100]],
+             "histograms": []}
+        )
+    )
+    (tmp_path / f"metrics-{os.getppid()}.json").write_text(
+        json.dumps(
+            {
+                "counters": [
+                    ["http_requests_total", ["project-list", "GET", "200"], 4]
+                ],
+                "histograms": [],
+            }
+        )
+    )
+    api_client.force_authenticate(manager)
+    before = registry.snapshot()[0][("http_requests_total", ("project-list", "GET", "200"))]
+
+    api_client.get(reverse("project-list"))
+    response = api_client.get(reverse("metrics"))
+
+    assert response.status_code == status.HTTP_200_OK
+    body = response.content.decode()
+    expected = before + 1 + 4
+    assert (
+        f'http_requests_total{{view="project-list",method="GET",status="200"}} {expected:g}'
+        in body
+    )
+    assert 'http_request_duration_seconds_bucket{view="project-list",method="GET",le="+Inf"}' in body
+    assert 'http_request_db_queries_count{view="project-list",method="GET"}' in body
+    assert not (tmp_path / f"metrics-{exited.pid}.json").exists()
+
+
+def test_metrics_endpoint_requires_token_when_configured(api_client: APIClient, settings):
+    settings.METRICS = {"DIRECTORY": None, "TOKEN": "secret"}
+
+    assert api_client.get(reverse("metrics")).status_code == status.HTTP_403_FORBIDDEN
+    api_client.credentials(HTTP_AUTHORIZATION="Bearer secret")
+    assert api_client.get(reverse("metrics")).status_code == status.HTTP_200_OK
+
+
+def test_fingerprint_normalizes_parameters():
+    first = fingerprint_sql(
+        "SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'a' LIMIT 21"
+    )
+    second = fingerprint_sql("SELECT * FROM t WHERE id IN (%s) AND name = 'b' LIMIT 5")
+
+    assert first == second == "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?"
+
+
+def load_companies_one_by_one(request):
+    for company in Company.objects.all():
+        Company.objects.get(pk=company.pk)
+    return HttpResponse("ok")
+
+
+def test_nplusone_raise_mode_fails_repeated_queries(settings):
+    settings.NPLUSONE = {"MODE": "raise", "THRESHOLD": 2}
+    Company.objects.bulk_create([Company(name=f"Company {index}") for index in range(3)])
+    middleware = NPlusOneMiddleware(load_companies_one_by_one)
+
+    with pytest.raises(NPlusOneError):
+        middleware(RequestFactory().get("/"))
+
+
+def test_nplusone_log_mode_records_per_view_report(settings, tmp_path, capsys):
+    report_file = tmp_path / "nplusone.jsonl"
+    settings.NPLUSONE = {
+        "MODE": "log",
+        "THRESHOLD": 2,
+        "SAMPLE_RATE": 1.0,
+        "REPORT_FILE": str(report_file),
+    }
+    Company.objects.bulk_create([Company(name=f"Company {index}") for index in range(3)])
+    middleware = NPlusOneMiddleware(load_companies_one_by_one)
+    request = RequestFactory().get("/companies/")
+    middleware.process_view(request, load_companies_one_by_one, (), {})
+
+    response = middleware(request)
+
+    assert response.status_code == status.HTTP_200_OK
+    findings = [json.loads(line) for line in report_file.read_text().splitlines()]
+    assert findings[0]["view"] == "load_companies_one_by_one"
+    assert findings[0]["count"] == 3
+    assert any("test_core.py" in frame for frame in findings[0]["stack"])
+
+    call_command("nplusone_report", file=str(report_file), json=True)
+    report = json.loads(capsys.readouterr().out)
+    assert report["load_companies_one_by_one"][0]["requests"] == 1
+    assert report["load_companies_one_by_one"][0]["max_queries"] == 3
+
+
+def test_batch_runs_gets_with_one_authentication(
+    api_client: APIClient, manager: User, company: Company, projects: list[Project]
+):
+    token = RefreshToken.for_user(manager).access_token
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    paths = [
+        "/api/v1/profile/",
+        "/api/v1/employees/profile/",
+        "/api/v1/projects/?ordering=name",
+        f"/api/v1/companies/{company.pk}/",
+        "/api/v1/missing/",
+        "/admin/",
+    ]
+
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.post(reverse("batch"), {"requests": paths}, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.data["responses"]
+    assert [result["status"] for result in results] == [200, 200, 200, 200, 404, 400]
+    assert results[1]["body"]["name"] == "Manager"
+    assert [p["name"] for p in results[2]["body"]["results"]] == [p.name for p in projects]
+    user_lookups = [q for q in queries.captured_queries if 'FROM "accounts_user"' in q["sql"]]
+    assert len(user_lookups) == 1
+
+
+def test_batch_enforces_request_limit(api_client: APIClient, manager: User, settings):
+    settings.BATCH = {"MAX_REQUESTS": 2}
+    api_client.force_authenticate(manager)
+
+    response = api_client.post(
+        reverse("batch"), {"requests": ["/api/v1/profile/"] * 3}, format="json"
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_batch_cancels_a_query_running_past_the_time_limit(
+    api_client: APIClient, manager: User, company: Company, settings, monkeypatch
+):
+    settings.BATCH = {"MAX_SECONDS": 0.5}
+    list_queryset = CompanyListView.get_queryset
+
+    def slow_queryset(view):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n LIMIT 1000000000) "
+                "SELECT COUNT(*) FROM n"
+            )
+        return list_queryset(view)
+
+    monkeypatch.setattr(CompanyListView, "get_queryset", slow_queryset)
+    api_client.force_authenticate(manager)
+
+    response = api_client.post(
+        reverse("batch"), {"requests": ["/api/v1/companies/", "/api/v1/profile/"]}, format="json"
+    )
+
+    assert [result["status"] for result in response.data["responses"]] == [504, 504]
+    # The connection is usable again once the batch is over.
+    assert Company.objects.filter(pk=company.pk).exists()
+
+
+@pytest.fixture
+def throttle_rates(settings):
+    cache.clear()
+
+    def configure(**rates):
+        settings.REST_FRAMEWORK = {
+            **settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": rates
+        }
+
+    yield configure
+    cache.clear()
+
+
+def test_rate_throttle_rejects_with_retry_after(
+    api_client: APIClient, manager: User, company: Company, throttle_rates
+):
+    throttle_rates(detail="2/min")
+    api_client.force_authenticate(manager)
+    url = reverse("company-detail", args=[company.pk])
+
+    statuses = [api_client.get(url).status_code for _ in range(3)]
+    throttled = api_client.get(url)
+
+    assert statuses == [200, 200, 429]
+    assert 1 <= int(throttled["Retry-After"]) <= 60
+    # Only the allowed requests are in the window.
+    window = int(time.time() // 60)
+    assert sum(
+        cache.get(f"throttle:detail:{manager.pk}:{w}", 0) for w in (window - 1, window)
+    ) == 2
+    # Other scopes keep their own budget.
+    assert api_client.get(reverse("employee-list")).status_code == status.HTTP_200_OK
+
+
+def test_concurrency_cap_applies_to_search_and_releases_slots(
+    api_client: APIClient, manager: User, settings, throttle_rates
+):
+    throttle_rates()
+    settings.THROTTLING = {"CONCURRENCY": {"search": 1}}
+    api_client.force_authenticate(manager)
+    key = f"inflight:search:{manager.pk}"
+
+    assert api_client.get(reverse("employee-list"), {"search": "x"}).status_code == 200
+    assert cache.get(key) == 0
+
+    cache.set(key, 1)  # another search still running
+    assert api_client.get(reverse("employee-list"), {"search": "x"}).status_code == 429
+    assert api_client.get(reverse("employee-list")).status_code == status.HTTP_200_OK
+    assert cache.get(key) == 1
+
+
+def test_sqlite_profile_applies_pragmas_to_new_connections(settings):
+    settings.SQLITE = {"ENABLED": True, "BUSY_TIMEOUT_MS": 1234, "CACHE_SIZE": -2000}
+    new_connection = connections.create_connection(DEFAULT_DB_ALIAS)
+    try:
+        with new_connection.cursor() as cursor:
+            pragmas = {}
+            for name in ("busy_timeout", "synchronous", "cache_size"):
+                cursor.execute(f"PRAGMA {name}")
+                pragmas[name] = cursor.fetchone()[0]
+    finally:
+        new_connection.close()
+
+    assert pragmas == {"busy_timeout": 1234, "synchronous": 1, "cache_size": -2000}
+
+
+def test_write_gate_queues_unsafe_requests_only(api_client: APIClient, manager: User, settings):
+    settings.SQLITE = {"ENABLED": True, "WRITE_GATE_TIMEOUT": 0.05}
+    api_client.force_authenticate(manager)
+
+    with _write_gate:  # another thread is writing
+        busy = api_client.patch(reverse("accounts:profile"), {"first_name": "Blocked"})
+        read = api_client.get(reverse("accounts:profile"))
+        batch = api_client.post(
+            reverse("batch"), {"requests": ["/api/v1/profile/"]}, format="json"
+        )
+    write = api_client.patch(reverse("accounts:profile"), {"first_name": "Written"})
+
+    assert (busy.status_code, busy["Retry-After"]) == (503, "1")
+    assert (read.status_code, batch.status_code) == (200, 200)
+    assert write.status_code == status.HTTP_200_OK
+    assert not _write_gate.locked()
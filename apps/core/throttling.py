@@ -0,0 +1,162 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+DEFAULT_THROTTLING_SETTINGS = {
+    "CACHE": "default",
+    "CONCURRENCY": {},
+    # Safety expiry for in-flight counters, in case a worker dies mid-request.
+    "CONCURRENCY_TIMEOUT": 300,
+}
+
+
+def get_throttling_settings():
+    return {**DEFAULT_THROTTLING_SETTINGS, **getattr(settings, "THROTTLING", {})}
+
+
+def get_cache():
+    return caches[get_throttling_settings()["CACHE"]]
+
+
+def get_throttle_scope(request, view):
+    """
+    The view's ``throttle_scope``, except that searching a view with
+    ``search_fields`` always counts as ``search``; views without a scope
+    fall back to ``user`` or ``anon``.
+    """
+    if getattr(view, "search_fields", None) and request.query_params.get(
+        api_settings.SEARCH_PARAM
+    ):
+        return "search"
+    scope = getattr(view, "throttle_scope", None)
+    if scope:
+        return scope
+    return "user" if request.user and request.user.is_authenticated else "anon"
+
+
+def incr(cache, key, timeout):
+    """
+    Atomically increment ``key``, creating it with ``timeout`` if missing.
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout):
+            return 1
+        return cache.incr(key)
+
+
+class RateThrottle(SimpleRateThrottle):
+    """
+    Limit requests per user (or client IP) and throttle scope, with rates
+    from ``DEFAULT_THROTTLE_RATES``.
+
+    A sliding-window counter: the current fixed window's count plus the
+    previous window's, weighted by how much of it the sliding window still
+    covers. Each request is one atomic ``incr`` and one ``get`` on the
+    shared cache, so concurrent workers never lose updates; a rejected
+    request gives its increment back, so only allowed requests count.
+    """
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def allow_request(self, request, view):
+        scope = get_throttle_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        limit, period = self.parse_rate(rate)
+
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        now = time.time()
+        window, elapsed = divmod(now, period)
+        prefix = f"throttle:{scope}:{ident}:"
+
+        cache = get_cache()
+        key = f"{prefix}{int(window)}"
+        count = incr(cache, key, period * 2)
+        previous = cache.get(f"{prefix}{int(window) - 1}", 0)
+        if previous * (1 - elapsed / period) + count <= limit:
+            return True
+        release(cache, key)
+
+        if count > limit or not previous:
+            self.wait_seconds = period - elapsed
+        else:
+            # When the previous window's share decays enough to fit.
+            self.wait_seconds = period * (1 - (limit - count) / previous) - elapsed
+        return False
+
+    def wait(self):
+        return max(math.ceil(self.wait_seconds), 1) if self.wait_seconds is not None else None
+
+
+class ConcurrencyThrottle(BaseThrottle):
+    """
+    Cap in-flight requests per user (or client IP) and throttle scope, as
+    configured in ``THROTTLING["CONCURRENCY"]``.
+
+    Slots are released by ConcurrencyReleaseMiddleware when the response
+    is ready.
+    """
+
+    def allow_request(self, request, view):
+        scope = get_throttle_scope(request, view)
+        limit = get_throttling_settings()["CONCURRENCY"].get(scope)
+        if not limit:
+            return True
+
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        key = f"inflight:{scope}:{ident}"
+        cache = get_cache()
+        if incr(cache, key, get_throttling_settings()["CONCURRENCY_TIMEOUT"]) > limit:
+            release(cache, key)
+            return False
+        django_request = request._request
+        django_request._inflight_keys = getattr(django_request, "_inflight_keys", []) + [key]
+        return True
+
+    def wait(self):
+        return 1
+
+
+def release(cache, key):
+    try:
+        cache.decr(key)
+    except ValueError:
+        # Expired while the request ran.
+        pass
+
+
+def release_concurrency(request):
+    """
+    Give back the concurrency slots taken while handling ``request``.
+    """
+    keys = getattr(request, "_inflight_keys", None)
+    if keys:
+        cache = get_cache()
+        for key in keys:
+            release(cache, key)
+        request._inflight_keys = []
+
+
+class ConcurrencyReleaseMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            release_concurrency(request)
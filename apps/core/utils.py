@@ -0,0 +1,23 @@
+def get_view_name(view_func):
+    """
+    Return the class name for class-based views, or the function name otherwise.
+    """
+    view_class = getattr(view_func, "view_class", None) or getattr(
+        view_func, "cls", None
+    )
+    if view_class is not None:
+        return view_class.__name__
+    return getattr(view_func, "__name__", "unknown")
+
+
+def get_user_role(request):
+    """
+    Return the role of the user attached to the request, or ``anonymous``.
+
+    DRF copies the authenticated user back onto the Django request, so this
+    works in middleware once the view has run.
+    """
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return "anonymous"
+    return getattr(user, "role", "unknown")
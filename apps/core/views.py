@@ -0,0 +1,70 @@
+import time
+
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .batch import get_batch_settings, run_sub_request
+from .metrics import get_metrics_settings, registry, render_text
+
+
+def metrics_view(request):
+    """
+    Expose aggregated metrics in the Prometheus text exposition format.
+    """
+    token = get_metrics_settings()["TOKEN"]
+    if token:
+        header = request.META.get("HTTP_AUTHORIZATION", "")
+        if not constant_time_compare(header, f"Bearer {token}"):
+            return HttpResponseForbidden()
+
+    counters, histograms = registry.collect()
+    return HttpResponse(
+        render_text(counters, histograms),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+class BatchView(APIView):
+    """
+    Run several API GETs in one round trip.
+
+    Accepts ``{"requests": ["/api/v1/profile/", ...]}`` and returns
+    ``{"responses": [{"path", "status", "body"}, ...]}`` in the same order.
+    Authentication runs once for the whole batch. At most MAX_REQUESTS
+    paths are accepted; a sub-request still running, or not started, when
+    the MAX_SECONDS budget runs out is answered with a 504.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "batch"
+    # Only runs GETs, so it does not queue for the SQLite write gate.
+    write_gate = False
+
+    def post(self, request):
+        conf = get_batch_settings()
+        urls = request.data.get("requests") if isinstance(request.data, dict) else None
+        if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+            return Response(
+                {"error": "requests must be a list of paths"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(urls) > conf["MAX_REQUESTS"]:
+            return Response(
+                {"error": f"At most {conf['MAX_REQUESTS']} requests per batch"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        deadline = time.monotonic() + conf["MAX_SECONDS"]
+        responses = []
+        for url in urls:
+            if time.monotonic() > deadline:
+                code, body = status.HTTP_504_GATEWAY_TIMEOUT, {
+                    "detail": "Batch time limit exceeded before this request ran."
+                }
+            else:
+                code, body = run_sub_request(request, url, deadline)
+            responses.append({"path": url, "status": code, "body": body})
+        return Response({"responses": responses})